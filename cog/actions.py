@@ -6,6 +6,7 @@ All actions have async execute methods.
 from __future__ import absolute_import, print_function
 import asyncio
 import datetime
+import itertools
 import logging
 import re
 import string
@@ -16,9 +17,14 @@ import discord
 import googleapiclient.errors
 
 import cogdb
+import cogdb.breaker
 import cogdb.eddb
+import cogdb.fort
+import cogdb.names
 import cogdb.query
 import cogdb.side
+import cogdb.ticks
+import cog.executors
 import cog.inara
 import cog.jobs
 import cog.tbl
@@ -29,13 +35,24 @@ async def bot_shutdown(bot, delay=60):  # pragma: no cover
     """
     Shutdown the bot. Gives background jobs grace window to finish  unless empty.
     """
+    try:
+        await asyncio.wait_for(asyncio.gather(
+            *[writer.drain() for writer in cog.jobs.WRITERS.values()]), delay)
+    except asyncio.TimeoutError:
+        logging.getLogger('cog.actions').error("Sheet writes failed to drain in time.")
+    except cog.exc.FailedJob:
+        logging.getLogger('cog.actions').exception("Sheet writes failed to drain.")
+
     try:
         cog.jobs.POOL.close()
         await bot.loop.run_in_executor(None, cog.jobs.POOL.join, delay)
     except TimeoutError:
         logging.getLogger('cog.actions').error("Pool failed to close in time. Terminating.")
         cog.jobs.POOL.stop()
+    await bot.loop.run_in_executor(None, cog.jobs.close_workers)
 
+    await cogdb.side.async_close()
+    cog.executors.shutdown(wait=False)
     await bot.logout()
 
 
@@ -88,12 +105,10 @@ def check_sheet(scanner_name, stype):
                                           type=getattr(cogdb.schema.ESheetType, stype),
                                           start_row=get_scanner(scanner_name).user_row)
 
-            job = cog.jobs.Job(
-                partial(get_scanner(scanner_name).update_sheet_user,
-                        sheet.row, sheet.cry, sheet.name))
-            job.set_ident_from_msg(self.msg, 'Adding user to sheet')
-            job.add_fail_callback([self.bot, self.msg])
-            await cog.jobs.background_start(job)
+            queue_cells(scanner_name,
+                        get_scanner(scanner_name).sheet_user_cells(sheet.row, sheet.cry,
+                                                                   sheet.name),
+                        [self.bot, self.msg])
 
             notice = 'Automatically added {} to {} sheet. See !user command to change.'.format(
                 self.duser.pref_name, stype)
@@ -113,7 +128,7 @@ class Action(object):
         self.bot = kwargs['bot']
         self.msg = kwargs['msg']
         self.log = logging.getLogger('cog.actions')
-        self.session = cogdb.Session()
+        self.session = kwargs.get('session') or cogdb.Session()
         self.__duser = None
 
     @property
@@ -329,6 +344,12 @@ class Admin(Action):
 
         return response
 
+    async def stats(self):
+        """ Show runtime metrics of the bot. """
+        return "\n".join([cog.executors.summary(), cog.jobs.write_summary(),
+                          cog.jobs.worker_summary(), cogdb.pool_summary(),
+                          cogdb.breaker.summary()])
+
     async def scan(self):
         """ Schedule all sheets for update. """
         self.bot.sched.schedule_all()
@@ -367,8 +388,7 @@ class Admin(Action):
 
             for name in scanners:
                 init_scanner(name)
-                # FIXME: Feels icky reaching into code like so
-                self.bot.sched.wraps[name].scanner = cog.actions.get_scanner(name)
+                await self.bot.sched.replace(name, cog.actions.get_scanner(name))
 
             scanners.update(ignore)
             cog.util.update_config(scanners, 'scanners')
@@ -410,9 +430,7 @@ class BGS(Action):
         control_name = cogdb.query.complete_control_name(system_name, True)
         self.log.info('BGS - Looking for age around: %s', control_name)
 
-        systems = cogdb.side.exploited_systems_by_age(cogdb.SideSession(), control_name)
-        systems = await self.bot.loop.run_in_executor(None, cogdb.side.exploited_systems_by_age,
-                                                      cogdb.SideSession(), control_name)
+        systems = await cogdb.side.async_exploited_systems_by_age(control_name)
         lines = [['Control', 'System', 'Age']]
         lines += [[system.control, system.system, system.age] for system in systems]
         return cog.tbl.wrap_markdown(cog.tbl.format_table(lines, header=True))
@@ -420,8 +438,8 @@ class BGS(Action):
     async def dash(self, control_name):
         """ Handle dash subcmd. """
         control_name = cogdb.query.complete_control_name(control_name, True)
-        control, systems, net_inf, facts_count = await self.bot.loop.run_in_executor(
-            None, cogdb.side.dash_overview, cogdb.SideSession(), control_name)
+        control, systems, net_inf, facts_count = await cog.executors.REMOTE_DB.run(
+            cogdb.session_call, cogdb.SideSession, cogdb.side.dash_overview, control_name)
 
         lines = [['Age', 'System', 'Control Faction', 'Gov', 'Inf', 'Net', 'N', 'Pop']]
         cnt = {
@@ -473,38 +491,30 @@ class BGS(Action):
             controls = cogdb.side.WATCH_BUBBLES
         else:
             controls = process_system_args(system_name.split(' '))
-        eddb_session = cogdb.EDDBSession()
-        side_session = cogdb.SideSession()
+        control_points, bubbles = await cog.executors.REMOTE_DB.run(
+            cogdb.session_call, cogdb.SideSession, cogdb.side.edmc_points, controls)
+        names = sorted(bubbles)
+        routes = await solve_routes([control_points] + [bubbles[name] for name in names])
+        bubble_routes = dict(zip(names, routes[1:]))
 
         resp = "__**EDMC Route**__\nIf no systems listed under control, up to date."
         resp += "\n\n__Bubbles By Proximity__\n"
-        if len(controls) > 2:
-            _, route = await self.bot.loop.run_in_executor(None, cogdb.eddb.find_best_route,
-                                                           eddb_session, controls)
-            controls = [sys.name for sys in route]
-        resp += "\n".join([sys for sys in controls])
-
-        for control in controls:
+        resp += "\n".join(routes[0][1])
+        for control in routes[0][1]:
             resp += "\n\n__{}__\n".format(string.capwords(control))
-            systems = await self.bot.loop.run_in_executor(None, cogdb.side.get_edmc_systems,
-                                                          side_session, [control])
-            if len(systems) > 2:
-                _, systems = await self.bot.loop.run_in_executor(None, cogdb.eddb.find_best_route,
-                                                                 eddb_session,
-                                                                 [system.name for system in systems])
-            resp += "\n".join([sys.name for sys in systems])
+            resp += "\n".join(bubble_routes[control][1])
 
         return resp
 
     async def exp(self, system_name):
         """ Handle exp subcmd. """
-        side_session = cogdb.SideSession()
-        centre = await self.bot.loop.run_in_executor(None, cogdb.side.get_systems,
-                                                     side_session, [system_name])
+        system_name = await resolve_side_name(system_name)
+        centre = await cog.executors.REMOTE_DB.run(
+            cogdb.session_call, cogdb.SideSession, cogdb.side.get_systems, [system_name])
         centre = centre[0]
 
-        factions = await self.bot.loop.run_in_executor(None, cogdb.side.get_factions_in_system,
-                                                       side_session, centre.name)
+        factions = await cog.executors.REMOTE_DB.run(
+            cogdb.session_call, cogdb.SideSession, cogdb.side.get_factions_in_system, centre.name)
         prompt = "Please select a faction to expand with:\n"
         for ind, name in enumerate([fact.name for fact in factions]):
             prompt += "\n({}) {}".format(ind, name)
@@ -517,8 +527,9 @@ class BGS(Action):
             if ind not in range(len(factions)):
                 raise ValueError
 
-            cands = await self.bot.loop.run_in_executor(None, cogdb.side.expansion_candidates,
-                                                        side_session, centre, factions[ind])
+            cands = await cog.executors.REMOTE_DB.run(
+                cogdb.session_call, cogdb.SideSession, cogdb.side.expansion_candidates,
+                centre, factions[ind])
             resp = "**Would Expand To**\n\n{}, {}\n\n".format(centre.name, factions[ind].name)
             return resp + cog.tbl.wrap_markdown(cog.tbl.format_table(cands, header=True))
         except ValueError:
@@ -532,8 +543,8 @@ class BGS(Action):
 
     async def expto(self, system_name):
         """ Handle expto subcmd. """
-        matches = await self.bot.loop.run_in_executor(None, cogdb.side.expand_to_candidates,
-                                                      cogdb.SideSession(), system_name)
+        matches = await cog.executors.REMOTE_DB.run(
+            cogdb.session_call, cogdb.SideSession, cogdb.side.expand_to_candidates, system_name)
         header = "**Nearby Expansion Candidates**\n\n"
         return header + cog.tbl.wrap_markdown(cog.tbl.format_table(matches, header=True))
 
@@ -541,23 +552,24 @@ class BGS(Action):
         """ Handle faction subcmd. """
         names = []
         if self.args.faction:
-            names = process_system_args(self.args.faction)
-        return await self.bot.loop.run_in_executor(None, cogdb.side.monitor_factions,
-                                                   cogdb.SideSession(), names)
+            for name in process_system_args(self.args.faction):
+                names += [await resolve_side_name(name, cogdb.names.FACTION)]
+        return await cog.executors.REMOTE_DB.run(
+            cogdb.session_call, cogdb.SideSession, cogdb.side.monitor_factions, names)
 
     async def find(self, system_name):
         """ Handle find subcmd. """
-        matches = await self.bot.loop.run_in_executor(None, cogdb.side.find_favorable,
-                                                      cogdb.SideSession(), system_name,
-                                                      self.args.max)
+        matches = await cog.executors.REMOTE_DB.run(
+            cogdb.session_call, cogdb.SideSession, cogdb.side.find_favorable, system_name,
+            self.args.max)
         header = "**Favorable Factions**\n\n"
         return header + cog.tbl.wrap_markdown(cog.tbl.format_table(matches, header=True))
 
     async def inf(self, system_name):
         """ Handle influence subcmd. """
         self.log.info('BGS - Looking for influence like: %s', system_name)
-        infs = await self.bot.loop.run_in_executor(None, cogdb.side.influence_in_system,
-                                                   cogdb.SideSession(), system_name)
+        system_name = await resolve_side_name(system_name)
+        infs = await cogdb.side.async_influence_in_system(system_name)
 
         if not infs:
             raise cog.exc.InvalidCommandArgs("Invalid system name or system is not tracked in db.")
@@ -568,16 +580,16 @@ class BGS(Action):
 
     async def report(self, system_name):
         """ Handle influence subcmd. """
-        session = cogdb.SideSession()
-        system_ids = await self.bot.loop.run_in_executor(None, cogdb.side.get_monitor_systems,
-                                                         session, cogdb.side.WATCH_BUBBLES)
+        system_ids = await cog.executors.REMOTE_DB.run(
+            cogdb.session_call, cogdb.SideSession, cogdb.side.get_monitor_systems,
+            cogdb.side.WATCH_BUBBLES)
         report = await asyncio.gather(
-            self.bot.loop.run_in_executor(None, cogdb.side.control_dictators,
-                                          cogdb.SideSession(), system_ids),
-            self.bot.loop.run_in_executor(None, cogdb.side.moving_dictators,
-                                          cogdb.SideSession(), system_ids),
-            self.bot.loop.run_in_executor(None, cogdb.side.monitor_events,
-                                          cogdb.SideSession(), system_ids))
+            cog.executors.REMOTE_DB.run(cogdb.session_call, cogdb.SideSession,
+                                        cogdb.side.control_dictators, system_ids),
+            cog.executors.REMOTE_DB.run(cogdb.session_call, cogdb.SideSession,
+                                        cogdb.side.moving_dictators, system_ids),
+            cog.executors.REMOTE_DB.run(cogdb.session_call, cogdb.SideSession,
+                                        cogdb.side.monitor_events, system_ids))
         report = "\n".join(report)
 
         title = "BGS Report {}".format(datetime.datetime.utcnow())
@@ -588,8 +600,9 @@ class BGS(Action):
     async def sys(self, system_name):
         """ Handle sys subcmd. """
         self.log.info('BGS - Looking for overview like: %s', system_name)
-        system, factions = await self.bot.loop.run_in_executor(None, cogdb.side.system_overview,
-                                                               cogdb.SideSession(), system_name)
+        system_name = await resolve_side_name(system_name)
+        system, factions = await cog.executors.REMOTE_DB.run(
+            cogdb.session_call, cogdb.SideSession, cogdb.side.system_overview, system_name)
 
         if not system:
             raise cog.exc.InvalidCommandArgs("System **{}** not found. Spelling?".format(system_name))
@@ -615,6 +628,43 @@ If we should contact Gears or Sidewinder""".format(system_name)
         header = "**{}**: {:,}\n\n".format(system.name, system.population)
         return header + '```autohotkey\n' + '\n'.join(lines) + '```\n'
 
+    async def trend(self, system_name):
+        """ Handle trend subcmd. """
+        if not system_name:
+            controls = cogdb.side.WATCH_BUBBLES
+        else:
+            controls = process_system_args(system_name.split(' '))
+        self.log.info('BGS - Trends for: %s', controls)
+        rows = await cog.executors.REMOTE_DB.run(
+            cogdb.session_call, cogdb.SideSession, cogdb.side.trend_overview, controls)
+        if not rows:
+            raise cog.exc.InvalidCommandArgs("No tracked systems around: **{}**".format(
+                ', '.join(controls)))
+
+        now = datetime.datetime.utcnow()
+        tables = []
+        for control, control_rows in itertools.groupby(rows, key=lambda x: x[0]):
+            lines = [['System', 'Faction', 'Inf', 'Vel', 'Acc', 'Flip']]
+            for _, system_rows in itertools.groupby(control_rows, key=lambda x: x[1]):
+                for _, system, faction, inf, vel, acc, cross in list(system_rows)[:2]:
+                    flip = '-'
+                    if cross <= 30:
+                        flip = (now + datetime.timedelta(days=float(cross))).strftime('%d/%m')
+                    lines += [[system[-12:], faction[:20], '{:.1f}'.format(inf),
+                               '{:+.2f}'.format(vel), '{:+.2f}'.format(acc), flip]]
+
+            tables += ['**{}**'.format(control) +
+                       cog.tbl.wrap_markdown(cog.tbl.format_table(lines, header=True))]
+
+        explain = """
+**Vel**: Influence change per day, fitted over the last 7 days.
+**Acc**: Change of Vel per day.
+**Flip**: Projected date the top two factions swap at current Vel, if within 30 days.
+Only the top two factions of each system are shown.
+        """
+
+        return '\n'.join(tables) + explain
+
     async def execute(self):
         try:
             func = getattr(self, self.args.subcmd)
@@ -635,8 +685,7 @@ class Dist(Action):
         if len(system_names) < 2:
             raise cog.exc.InvalidCommandArgs("At least **2** systems required.")
 
-        dists = await self.bot.loop.run_in_executor(None, cogdb.side.compute_dists,
-                                                    cogdb.SideSession(), system_names)
+        dists = await cogdb.side.async_compute_dists(system_names)
 
         response = 'Distances From: **{}**\n\n'.format(system_names[0].capitalize())
         lines = [[key, '{:.2f}ly'.format(dists[key])] for key in sorted(dists)]
@@ -664,7 +713,7 @@ class Drop(Action):
         ]
 
         try:
-            merits = list(reversed(sorted(system.merits)))
+            merits = cogdb.query.fort_get_drops(self.session, system)
             top = merits[0]
             lines += ['Bonus for highest contribution:']
             for merit in merits:
@@ -699,14 +748,14 @@ class Drop(Action):
         self.log.info('DROP %s - After drop, Drop: %s\nSystem: %s.',
                       self.duser.display_name, drop, system)
         self.session.commit()
+        if self.args.set:
+            cogdb.fort.refresh_systems([system.name])
 
-        job = cog.jobs.Job(
-            partial(sync_drop,
-                    [drop.system.sheet_col, drop.user.row, drop.amount],
-                    [drop.system.sheet_col, drop.system.fort_status, drop.system.um_status]))
-        job.set_ident_from_msg(self.msg, 'Adding drop to fort sheet')
-        job.add_fail_callback([self.bot, self.msg])
-        await cog.jobs.background_start(job)
+        scanner = get_scanner('hudson_cattle')
+        cells = scanner.drop_cells(drop.system.sheet_col, drop.user.row, drop.amount)
+        cells.update(scanner.system_cells(drop.system.sheet_col, drop.system.fort_status,
+                                          drop.system.um_status))
+        queue_cells('hudson_cattle', cells, [self.bot, self.msg])
 
         self.log.info('DROP %s - Sucessfully dropped %d at %s.',
                       self.duser.display_name, self.args.amount, system.name)
@@ -726,9 +775,8 @@ class Fort(Action):
         """ Show systems with 'left' remaining. """
         lines = ['__Systems Missing {} Supplies__'.format(left)]
 
-        for system in cogdb.query.fort_get_systems(self.session):
-            if not system.is_fortified and not system.skip and system.missing <= left:
-                lines.append(system.display(miss=True))
+        for system in cogdb.query.fort_get_missing(self.session, left):
+            lines.append(system.display(miss=True))
 
         return '\n'.join(lines)
 
@@ -756,7 +804,8 @@ class Fort(Action):
         system = cogdb.query.fort_find_system(self.session, system_names[0])
 
         merits = [['CMDR Name', 'Merits']]
-        merits += [[merit.user.name, merit.amount] for merit in reversed(sorted(system.merits))]
+        merits += [[merit.user.name, merit.amount] for merit in
+                   cogdb.query.fort_get_drops(self.session, system)]
         merit_table = '\n' + cog.tbl.wrap_markdown(cog.tbl.format_table(merits, header=True))
         return system.display_details() + merit_table
 
@@ -773,13 +822,12 @@ class Fort(Action):
             system = cogdb.query.fort_find_system(self.session, system_name)
             system.set_status(self.args.set)
             self.session.commit()
+            cogdb.fort.refresh_systems([system.name])
 
-            job = cog.jobs.Job(
-                partial(get_scanner("hudson_cattle").update_system,
-                        system.sheet_col, system.fort_status, system.um_status))
-            job.set_ident_from_msg(self.msg, 'Updating fort system')
-            job.add_fail_callback([self.bot, self.msg])
-            await cog.jobs.background_start(job)
+            queue_cells('hudson_cattle',
+                        get_scanner('hudson_cattle').system_cells(
+                            system.sheet_col, system.fort_status, system.um_status),
+                        [self.bot, self.msg])
             response = system.display()
 
         elif self.args.miss:
@@ -908,13 +956,11 @@ class Hold(Action):
         if self.args.set:
             system.set_status(self.args.set)
 
-            job = cog.jobs.Job(
-                partial(get_scanner("hudson_undermine").update_system,
-                        system.sheet_col, system.progress_us,
-                        system.progress_them, system.map_offset))
-            job.set_ident_from_msg(self.msg, 'Updating undermining system')
-            job.add_fail_callback([self.bot, self.msg])
-            await cog.jobs.background_start(job)
+            queue_cells('hudson_undermine',
+                        get_scanner('hudson_undermine').system_cells(
+                            system.sheet_col, system.progress_us,
+                            system.progress_them, system.map_offset),
+                        [self.bot, self.msg])
 
         self.log.info('Hold %s - After update, hold: %s\nSystem: %s.',
                       self.duser.display_name, hold, system)
@@ -951,11 +997,16 @@ class Hold(Action):
 
         self.session.commit()
 
-        holds = [[hold.system.sheet_col, hold.user.row, hold.held, hold.redeemed] for hold in holds]
-        job = cog.jobs.Job(partial(sync_holds, holds), timeout=30)
-        job.set_ident_from_msg(self.msg, 'Updating undermining holds')
-        job.add_fail_callback([self.bot, self.msg])
-        await cog.jobs.background_start(job)
+        scanner = get_scanner('hudson_undermine')
+        cells = {}
+        if self.args.redeem:
+            # Rewrite the whole row as one range, systems without a hold are blank on the sheet
+            for system in cogdb.query.um_get_systems(self.session, exclude_finished=False):
+                cells.update(scanner.hold_cells(system.sheet_col, self.undermine.row, '', ''))
+        for hold in holds:
+            cells.update(scanner.hold_cells(hold.system.sheet_col, hold.user.row,
+                                            hold.held, hold.redeemed))
+        queue_cells('hudson_undermine', cells, [self.bot, self.msg])
 
         await self.bot.send_message(self.msg.channel, response)
 
@@ -977,9 +1028,8 @@ class KOS(Action):
             msg = 'KOS list refreshed from sheet.'
 
         elif self.args.subcmd == 'search':
-            session = cogdb.Session()
             msg = 'Searching for "{}" against known CMDRs\n\n'.format(self.args.term)
-            cmdrs = cogdb.query.kos_search_cmdr(session, self.args.term)
+            cmdrs = cogdb.query.kos_search_cmdr(self.session, self.args.term)
             if cmdrs:
                 cmdrs = [[x.cmdr, x.faction, x.danger, x.friendly]
                          for x in cmdrs]
@@ -1026,8 +1076,9 @@ class Repair(Action):
         if self.args.distance > 30:
             raise cog.exc.InvalidCommandArgs("Searching beyond **30**ly would produce too long a list.")
 
-        stations = cogdb.eddb.get_shipyard_stations(cogdb.EDDBSession(), ' '.join(self.args.system),
-                                                    self.args.distance, self.args.arrival)
+        stations = await cog.executors.LOCAL_DB.run(
+            cogdb.session_call, cogdb.EDDBSession, cogdb.eddb.get_shipyard_stations,
+            ' '.join(self.args.system), self.args.distance, self.args.arrival)
 
         if stations:
             stations = [["System", "Distance", "Station", "Arrival"]] + stations[:25]
@@ -1046,7 +1097,6 @@ class Route(Action):
     async def execute(self):
         # TODO: Add ability to fix endpoint. That is solve route but then add distance to jump back.
         # TODO: Probably allow dupes.
-        session = cogdb.EDDBSession()
         self.args.system = [arg.lower() for arg in self.args.system]
         system_names = process_system_args(self.args.system)
 
@@ -1057,11 +1107,11 @@ class Route(Action):
             raise cog.exc.InvalidCommandArgs("Don't duplicate system names.")
 
         if self.args.optimum:
-            result = await self.bot.loop.run_in_executor(
-                None, cogdb.eddb.find_best_route, session, system_names)
+            result = await solve_best_route(system_names)
         else:
-            result = await self.bot.loop.run_in_executor(
-                None, cogdb.eddb.find_route, session, system_names[0], system_names[1:])
+            result = await cog.executors.LOCAL_DB.run(
+                cogdb.session_call, cogdb.EDDBSession, cogdb.eddb.find_route,
+                system_names[0], system_names[1:])
 
         lines = ["__Route Plotted__", "Total Distance: **{}**ly".format(round(result[0])), ""]
         lines += [sys.name for sys in result[1]]
@@ -1107,8 +1157,6 @@ class Scout(Action):
         return systems
 
     async def execute(self):
-        session = cogdb.EDDBSession()
-
         if not self.args.round and not self.args.custom:
             raise cog.exc.InvalidCommandArgs("Select a --round or provide a --custom list.")
 
@@ -1118,8 +1166,7 @@ class Scout(Action):
             systems = SCOUT_RND[self.args.round]
             systems = await self.interact_revise(systems)
 
-        result = await self.bot.loop.run_in_executor(
-            None, cogdb.eddb.find_best_route, session, systems)
+        result = await solve_best_route(systems)
         system_list = "\n".join([":Exploration: " + sys.name for sys in result[1]])
 
         now = datetime.datetime.utcnow()
@@ -1165,8 +1212,10 @@ class Time(Action):
             weekly_tick += datetime.timedelta(days=1)
 
         try:
-            tick = await self.bot.loop.run_in_executor(
-                None, cogdb.side.next_bgs_tick, cogdb.SideSession(), now)
+            if cogdb.ticks.SCHEDULE.loaded:
+                tick = cogdb.side.format_bgs_tick(now, cogdb.ticks.SCHEDULE.next_tick(now))
+            else:
+                tick = await cogdb.side.async_next_bgs_tick(now)
         except (cog.exc.NoMoreTargets, cog.exc.RemoteError) as exc:
             tick = exc.reply()
         lines = [
@@ -1184,19 +1233,18 @@ class Trigger(Action):
     Calculate the estimated triggers relative Hudson.
     """
     async def execute(self):
-        side_session = cogdb.SideSession()
         self.args.power = " ".join(self.args.power).lower()
         power = cogdb.side.get_power_hq(self.args.power)
-        pow_hq = cogdb.side.get_systems(side_session, [power[1]])[0]
+        pow_hq, systems = await asyncio.gather(
+            cogdb.side.async_get_systems([power[1]]),
+            cogdb.side.async_get_systems(process_system_args(self.args.system)))
+        pow_hq = pow_hq[0]
         lines = [
             "__Predicted Triggers__",
             "Power: {}".format(power[0]),
             "Power HQ: {}\n".format(power[1])
         ]
 
-        systems = await self.bot.loop.run_in_executor(
-            None, cogdb.side.get_systems, side_session,
-            process_system_args(self.args.system))
         for system in systems:
             lines += [
                 cog.tbl.wrap_markdown(cog.tbl.format_table([
@@ -1241,13 +1289,11 @@ class UM(Action):
             if self.args.set or self.args.offset:
                 self.session.commit()
 
-                job = cog.jobs.Job(
-                    partial(get_scanner("hudson_undermine").update_system,
-                            system.sheet_col, system.progress_us,
-                            system.progress_them, system.map_offset))
-                job.set_ident_from_msg(self.msg, 'Updating undermining system status')
-                job.add_fail_callback([self.bot, self.msg])
-                await cog.jobs.background_start(job)
+                queue_cells('hudson_undermine',
+                            get_scanner('hudson_undermine').system_cells(
+                                system.sheet_col, system.progress_us,
+                                system.progress_them, system.map_offset),
+                            [self.bot, self.msg])
 
             response = system.display()
 
@@ -1275,21 +1321,17 @@ class User(Action):
         if args.name or args.cry:
             if self.cattle:
                 sheet = self.cattle
-                job = cog.jobs.Job(
-                    partial(get_scanner("hudson_cattle").update_sheet_user,
-                            sheet.row, sheet.cry, sheet.name))
-                job.set_ident_from_msg(self.msg, 'Updating cattle name/cry')
-                job.add_fail_callback([self.bot, self.msg])
-                await cog.jobs.background_start(job)
+                queue_cells('hudson_cattle',
+                            get_scanner('hudson_cattle').sheet_user_cells(
+                                sheet.row, sheet.cry, sheet.name),
+                            [self.bot, self.msg])
 
             if self.undermine:
                 sheet = self.undermine
-                job = cog.jobs.Job(
-                    partial(get_scanner("hudson_undermine").update_sheet_user,
-                            sheet.row, sheet.cry, sheet.name))
-                job.set_ident_from_msg(self.msg, 'Updating undermining name/cry')
-                job.add_fail_callback([self.bot, self.msg])
-                await cog.jobs.background_start(job)
+                queue_cells('hudson_undermine',
+                            get_scanner('hudson_undermine').sheet_user_cells(
+                                sheet.row, sheet.cry, sheet.name),
+                            [self.bot, self.msg])
 
         lines = [
             '__{}__'.format(self.msg.author.display_name),
@@ -1370,19 +1412,79 @@ def process_system_args(args):
     return system_names.split(',')
 
 
-def sync_drop(drop_args, system_args):
-    """ Executes in another process. """
-    scanner = get_scanner("hudson_cattle")
-    scanner.update_drop(*drop_args)
-    scanner.update_system(*system_args)
+async def resolve_side_name(name, kind=cogdb.names.SYSTEM):
+    """
+    Resolve a partial name to a system or faction of the side db.
+    The name index is built on the remote executor if not yet present.
 
+    Raises:
+        NoMatch - No name matched, similar names are suggested.
+        MoreThanOneMatch - Too many names matched.
+    """
+    if not cogdb.names.get(kind):
+        await cog.executors.REMOTE_DB.run(
+            cogdb.session_call, cogdb.SideSession, cogdb.names.ensure_side)
+
+    return cogdb.names.get(kind).resolve(name)
+
+
+async def solve_best_route(system_names):
+    """
+    Find the best route through system_names.
+    Systems are looked up on the local db executor, the route is solved in the cpu pool.
+
+    Returns:
+        [total_distance, [System, System, ...]]
+    """
+    systems = await cog.executors.LOCAL_DB.run(
+        cogdb.session_call, cogdb.EDDBSession, cogdb.eddb.get_systems, system_names)
+    total, names = await cog.executors.CPU.run(cogdb.eddb.best_route_points,
+                                               cogdb.eddb.route_points(systems))
+    by_name = {system.name: system for system in systems}
+
+    return [total, [by_name[name] for name in names]]
+
+
+async def solve_routes(routes):
+    """
+    Solve many routes of points concurrently in the cpu pool.
+    Routes are packed into one job per worker, largest first onto the least loaded,
+    so the whole takes about as long as the slowest route.
+
+    Returns:
+        [[total_distance, [name, name, ...]], ...] in order of routes
+    """
+    workers = cog.executors.CPU.workers
+    loads = [[0, []] for _ in range(min(workers, len(routes)))]
+    for ind in sorted(range(len(routes)), key=lambda ind: -len(routes[ind])):
+        load = min(loads, key=lambda load: load[0])
+        load[0] += len(routes[ind]) ** 3
+        load[1] += [ind]
+
+    jobs = [load[1] for load in loads if load[1]]
+    results = await asyncio.gather(*[
+        cog.executors.CPU.run(cogdb.eddb.best_routes_points, [routes[ind] for ind in job])
+        for job in jobs])
+
+    solved = [None] * len(routes)
+    for job, result in zip(jobs, results):
+        for ind, route in zip(job, result):
+            solved[ind] = route
+
+    return solved
+
+
+def queue_cells(name, cells, fail_cb=None):
+    """
+    Queue cells for the sheet of scanner name, they are written behind in batches
+    by the worker of the scanner. See cog.jobs.WriteBehind.
+    """
+    writer = cog.jobs.WRITERS.get(name)
+    if not writer:
+        writer = cog.jobs.WriteBehind(name, partial(cog.jobs.call_resident, name, 'write_cells'))
+        cog.jobs.WRITERS[name] = writer
 
-def sync_holds(holds):
-    """ Executes in another process. """
-    # TODO: Expand the holds to a continuous rectangle and one update.
-    scanner = get_scanner("hudson_undermine")
-    for hold in holds:
-        scanner.update_hold(*hold)
+    writer.put(cells, fail_cb)
 
 
 def init_scanner(name):
@@ -43,13 +43,18 @@ finally:
 
 import cog.actions
 import cog.exc
+import cog.executors
 import cog.inara
 import cog.jobs
 import cog.parse
 import cog.scheduler
 import cog.sheets
 import cog.util
+import cogdb
 import cogdb.query
+import cogdb.side_sync
+import cogdb.ticks
+import cogdb.timeseries
 
 
 class EmojiResolver(object):
@@ -173,11 +178,15 @@ class CogBot(discord.Client):
             self.sched.register('hudson_undermine', cog.actions.get_scanner('hudson_undermine'),
                                 ['Hold', 'UM', 'User'])
             self.sched.schedule_all()
+            cogdb.ticks.SCHEDULE.subscribe(cogdb.timeseries.STORE.expire)
 
             asyncio.ensure_future(asyncio.gather(
                 presence_task(self),
                 cog.jobs.pool_monitor_task(),
+                cog.jobs.write_behind_task(),
                 simple_heartbeat(),
+                side_sync_task(),
+                tick_schedule_task(),
             ))
             await asyncio.sleep(0.2)
 
@@ -325,9 +334,10 @@ class CogBot(discord.Client):
             await self.send_message(msg.channel, '{} Resuming your command: **{}**'.format(
                 msg.author.mention, msg.content))
 
-        cogdb.query.check_perms(msg, args)
-        cls = getattr(cog.actions, args.cmd)
-        await cls(**kwargs).execute()
+        with cogdb.session_scope() as session:
+            cogdb.query.check_perms(session, msg, args)
+            cls = getattr(cog.actions, args.cmd)
+            await cls(session=session, **kwargs).execute()
 
     async def send_long_message(self, destination, content=None, *, tts=False, embed=None):
         """
@@ -443,6 +453,46 @@ async def presence_task(bot, delay=180):
         await asyncio.sleep(delay)
 
 
+async def side_sync_task(delay=300):
+    """
+    Keep the local side replica current, sync every delay seconds.
+    """
+    log = logging.getLogger('cog.bot')
+    print('Side sync task started')
+    while True:
+        try:
+            await cog.executors.REMOTE_DB.run(cogdb.side_sync.sync_replica)
+        except (cog.exc.RemoteError, cog.exc.BotBusy) as exc:
+            log.error('SYNC - Failed to sync side replica: %s', str(exc))
+        except Exception:  # pylint: disable=broad-except
+            # Errors writing the replica must not end the task, the next sync retries
+            log.exception('SYNC - Unexpected error syncing side replica.')
+
+        await asyncio.sleep(delay)
+
+
+async def tick_schedule_task(retry=60):
+    """
+    Keep the BGS tick schedule loaded and notify its subscribers when ticks pass.
+    Sleeps until the next tick or refresh, retry seconds if the load failed.
+    """
+    log = logging.getLogger('cog.bot')
+    schedule = cogdb.ticks.SCHEDULE
+    print('Tick schedule task started')
+    while True:
+        if schedule.stale:
+            try:
+                await cog.executors.REMOTE_DB.run(
+                    cogdb.session_call, cogdb.SideSession, schedule.load)
+            except (cog.exc.RemoteError, cog.exc.BotBusy) as exc:
+                log.error('TICKS - Failed to load tick schedule: %s', str(exc))
+                await asyncio.sleep(retry)
+                continue
+
+        await schedule.notify()
+        await asyncio.sleep(schedule.sleep_for(datetime.datetime.utcnow()))
+
+
 async def simple_heartbeat(delay=30):
     hfile = os.path.join(tempfile.gettempdir(), 'hbeat' + os.environ.get('COG_TOKEN', 'dev'))
     print(hfile)
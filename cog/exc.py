@@ -90,15 +90,19 @@ class MoreThanOneMatch(UserException):
 
 class NoMatch(UserException):
     """
-    No match was found for sequence.
+    No match was found for sequence, optionally with similar names to suggest.
     """
-    def __init__(self, sequence, obj_type):
+    def __init__(self, sequence, obj_type, suggestions=None):
         super().__init__()
         self.sequence = sequence
         self.obj_type = obj_type
+        self.suggestions = suggestions if suggestions else []
 
     def reply(self):
-        return "No matches for '{}' in {}s.".format(self.sequence, self.obj_type)
+        msg = "No matches for '{}' in {}s.".format(self.sequence, self.obj_type)
+        if self.suggestions:
+            msg += "\nDid you mean: " + ", ".join(self.suggestions) + "?"
+        return msg
 
 
 class CmdAborted(UserException):
@@ -116,6 +120,15 @@ class InternalException(CogException):
         super().__init__(msg, lvl)
 
 
+class BotBusy(InternalException):
+    """
+    An executor is saturated, work is rejected rather than queued.
+    """
+    def __init__(self, name):
+        super().__init__("Bot is busy, please try again shortly.", 'warning')
+        self.name = name
+
+
 class ColOverflow(InternalException):
     """ Raise when a column has reached end, increment next column.  """
     def __init__(self):
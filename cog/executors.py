@@ -0,0 +1,182 @@
+"""
+Named executors for blocking work, one per class of workload.
+
+Executors are bounded, once every worker is busy and the queue is full new
+work is rejected right away instead of waiting behind the backlog.
+
+    REMOTE_DB - Threads for queries to remote databases (i.e. side).
+    LOCAL_DB - Threads for queries to local databases (main, eddb).
+    SHEETS - Threads for light calls to the Google APIs, i.e. sheet version checks.
+    CPU - Processes for cpu bound work like route solving. Functions and args must pickle.
+
+Sizes come from the optional 'executors' section of config, see DEFAULTS for format.
+"""
+from __future__ import absolute_import, print_function
+import asyncio
+import concurrent.futures
+import logging
+import time
+
+import cog.exc
+import cog.tbl
+import cog.util
+
+
+DEFAULTS = {
+    'remote_db': {'workers': 8, 'queue': 32},
+    'local_db': {'workers': 8, 'queue': 32},
+    'sheets': {'workers': 2, 'queue': 8},
+    'cpu': {'workers': 2, 'queue': 8},
+}
+
+
+def timed_call(func, *args):
+    """
+    Run func with args, bracket the call with timestamps.
+    Module level so it pickles for process pools.
+
+    Returns: (start, result, end)
+    """
+    start = time.time()
+    result = func(*args)
+    return start, result, time.time()
+
+
+class Executor(object):
+    """
+    A named, bounded and instrumented wrapper around a concurrent.futures pool.
+
+    Only touch from the event loop thread, counters are not locked.
+    """
+    def __init__(self, name, pool_cls, workers, queue):
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self.pool = pool_cls(max_workers=workers)
+        self.pending = 0
+        self.peak = 0
+        self.done = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+
+    def __repr__(self):
+        keys = ['name', 'workers', 'queue', 'pending', 'peak', 'done', 'failed', 'rejected']
+        kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
+
+        return "{}({})".format(self.__class__.__name__, ', '.join(kwargs))
+
+    @property
+    def capacity(self):
+        """ Maximum jobs running or queued at once. """
+        return self.workers + self.queue
+
+    @property
+    def saturation(self):
+        """ Fraction of workers currently busy. """
+        return min(self.pending, self.workers) / self.workers
+
+    @property
+    def queued(self):
+        """ Number of jobs waiting on a worker. """
+        return max(0, self.pending - self.workers)
+
+    def record(self, wait, run):
+        """ Record timings of a finished job. """
+        self.done += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.run_total += run
+        self.run_max = max(self.run_max, run)
+
+    async def run(self, func, *args):
+        """
+        Run func with args on this executor and await the result.
+
+        Raises:
+            BotBusy - Executor is saturated and queue full, rejected immediately.
+        """
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            logging.getLogger('cog.executors').warning(
+                'EXEC %s - Rejected %s, %d pending.', self.name, func.__name__, self.pending)
+            raise cog.exc.BotBusy(self.name)
+
+        self.pending += 1
+        self.peak = max(self.peak, self.pending)
+        submitted = time.time()
+        try:
+            start, result, end = await asyncio.get_event_loop().run_in_executor(
+                self.pool, timed_call, func, *args)
+            self.record(max(0.0, start - submitted), end - start)
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        """
+        Returns: A list of values for a summary table, see STATS_HEADER.
+        """
+        done = self.done if self.done else 1
+        return [
+            self.name,
+            '{}/{}'.format(min(self.pending, self.workers), self.workers),
+            '{}/{}'.format(self.queued, self.queue),
+            self.peak,
+            self.done,
+            self.failed,
+            self.rejected,
+            '{:.3f}'.format(self.wait_total / done),
+            '{:.3f}'.format(self.wait_max),
+            '{:.3f}'.format(self.run_total / done),
+            '{:.3f}'.format(self.run_max),
+        ]
+
+    def shutdown(self, wait=True):
+        """ Shutdown the underlying pool. """
+        self.pool.shutdown(wait=wait)
+
+
+def get_sizes(name):
+    """
+    Returns: (workers, queue) for executor name, config overrides DEFAULTS.
+    """
+    sizes = DEFAULTS[name].copy()
+    try:
+        sizes.update(cog.util.get_config('executors', name))
+    except (KeyError, TypeError, cog.exc.MissingConfigFile):
+        pass
+
+    return sizes['workers'], sizes['queue']
+
+
+def summary():
+    """
+    Summarize the metrics of all executors.
+
+    Returns: A formatted table ready to send.
+    """
+    lines = [STATS_HEADER] + [executor.stats() for executor in EXECUTORS]
+    return "__Executors__ (times in seconds)\n" + \
+        cog.tbl.wrap_markdown(cog.tbl.format_table(lines, header=True))
+
+
+def shutdown(wait=True):
+    """ Shutdown all executors. """
+    for executor in EXECUTORS:
+        executor.shutdown(wait)
+
+
+STATS_HEADER = ['Name', 'Busy', 'Queued', 'Peak', 'Done', 'Failed', 'Reject',
+                'Avg Wait', 'Max Wait', 'Avg Run', 'Max Run']
+REMOTE_DB = Executor('remote_db', concurrent.futures.ThreadPoolExecutor, *get_sizes('remote_db'))
+LOCAL_DB = Executor('local_db', concurrent.futures.ThreadPoolExecutor, *get_sizes('local_db'))
+SHEETS = Executor('sheets', concurrent.futures.ThreadPoolExecutor, *get_sizes('sheets'))
+CPU = Executor('cpu', concurrent.futures.ProcessPoolExecutor, *get_sizes('cpu'))
+EXECUTORS = [REMOTE_DB, LOCAL_DB, SHEETS, CPU]
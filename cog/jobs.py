@@ -18,17 +18,17 @@ Examples of things that won't pickle:
   - weakref dicts
   - sqlalchemy objects: the raw data is accesible but the session is invalid and relationships
                         will no longer work.
+
+Jobs run in a fresh process of POOL by default. A Job for a registered Worker instead runs
+in the long lived process of that worker, objects resident there stay warm between jobs.
 """
 # TODO: Cleanup module, not quite happy with it.
 # TODO: Add lots of unit tests.
-# TODO: Rework synchronization process for sheets to push information:
-#         Change to spawning one process per sheet hooked.
-#         Each process has queue to dump in requests.
-#         Every 60 seconds flatten and flush queue to sheet. Then start a job with current queue.
-#         Scheduled reads might still be an issue. Apply same idea in reverse?
 from __future__ import absolute_import, print_function
 import asyncio
+import collections
 import concurrent.futures
+import functools
 import logging
 import time
 
@@ -36,6 +36,7 @@ import pebble
 import pebble.concurrent
 
 import cog.exc
+import cog.tbl
 
 
 LIVE_JOBS = []
@@ -43,6 +44,14 @@ MAX_WORKERS = 20
 POOL = pebble.ProcessPool(max_workers=MAX_WORKERS, max_tasks=1)
 RUN = True
 TIME_FMT = "%d/%m %H:%M:%S"
+WRITE_DELAY = 5
+WRITE_HEADER = ['Name', 'Depth', 'Peak', 'Writes', 'Flushes', 'Cells',
+                'Last Latency', 'Max Latency']
+WRITERS = {}
+WORKER_HEADER = ['Name', 'Jobs', 'Restarts', 'Last Latency', 'Max Latency', 'Uptime']
+WORKERS = {}
+# Objects kept in a worker process, set by worker_init in that process only
+RESIDENT = {}
 
 
 class Job(object):
@@ -53,8 +62,9 @@ class Job(object):
     Most importantly, it is totally isolated from main async process.
     There is no communication once started. It is assumed it has all it needs to complete.
     """
-    def __init__(self, func, *, ident=None, attempts=3, timeout=15):
+    def __init__(self, func, *, ident=None, attempts=3, timeout=15, worker=None):
         self.func = func
+        self.worker = worker
         self.ident = ident if ident else "Job " + time.strftime(TIME_FMT, time.gmtime())
         self.future = None
         self.attempts = attempts
@@ -64,7 +74,7 @@ class Job(object):
         self.fail_cbs = []
 
     def __repr__(self):
-        keys = ['func', 'ident', 'future', 'attempts', 'timeout']
+        keys = ['func', 'ident', 'future', 'attempts', 'timeout', 'worker']
         kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
         kwargs += ['{}={!r}'.format('start_time',
                                     time.strftime(TIME_FMT,
@@ -95,6 +105,7 @@ class Job(object):
     def start(self):
         """
         Schedule the function for execution on the process.
+        Jobs for a registered worker run there, all others on POOL.
         On every start decrement the attempts by 1.
 
         Raises:
@@ -106,7 +117,7 @@ class Job(object):
 
         self.attempts -= 1
         self.start_time = time.time()
-        self.future = POOL.schedule(self.func)
+        self.future = get_pool(self.worker).schedule(self.func)
         logging.getLogger('cog.jobs').info('Scheduling %s, %d attempts left. Timeout: %ds',
                                            self.ident, self.attempts, self.timeout)
 
@@ -153,6 +164,363 @@ class Job(object):
         self.fail_cbs.append(tup)
 
 
+class Worker(object):
+    """
+    A long lived process dedicated to the jobs of one sheet.
+
+    The process is a pebble pool of one that is never recycled, jobs queue up and run
+    in order. Objects built by jobs, like a sheet client and its connection, stay warm.
+    A job timed out is killed with its process, pebble then starts a fresh one.
+    Should the pool itself fail, check restarts it.
+
+    Args:
+        name: The name of the worker, i.e. the scanner hudson_cattle.
+        resident: An object kept in the worker process, see call_resident.
+    """
+    def __init__(self, name, resident=None):
+        self.name = name
+        self.resident = resident
+        self.pool = None
+        self.started = 0
+        self.jobs = 0
+        self.restarts = 0
+        self.latency = 0.0
+        self.latency_max = 0.0
+        self.start()
+
+    def __repr__(self):
+        keys = ['name', 'resident', 'jobs', 'restarts']
+        kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
+
+        return "{}({})".format(self.__class__.__name__, ', '.join(kwargs))
+
+    def start(self):
+        """
+        Create the pool, its process starts with the first job scheduled.
+        """
+        self.pool = pebble.ProcessPool(max_workers=1, initializer=worker_init,
+                                       initargs=(self.name, self.resident))
+        self.started = time.time()
+
+    def stop(self):
+        """
+        Stop the pool, a running job is killed. Blocking, run it in an executor.
+        """
+        stop_pool(self.pool)
+
+    async def restart(self):
+        """
+        Replace a failed pool with a new one, the failed one is stopped in an executor.
+        """
+        logging.getLogger('cog.jobs').warning('WORKER %s - Pool failed, restarting.', self.name)
+        old_pool = self.pool
+        self.restarts += 1
+        self.start()
+        await asyncio.get_event_loop().run_in_executor(None, stop_pool, old_pool)
+
+    async def check(self):
+        """
+        Health check, restart the pool if it no longer accepts jobs.
+
+        Returns: True if the pool was healthy.
+        """
+        try:
+            self.pool.schedule(do_nothing)
+            return True
+        except RuntimeError:
+            await self.restart()
+            return False
+
+    def schedule(self, func):
+        """
+        Schedule func on the worker process, same interface as pebble.ProcessPool.
+
+        Returns: The future of the job.
+        """
+        future = self.pool.schedule(func)
+        self.jobs += 1
+        future.add_done_callback(functools.partial(self.job_done, time.time()))
+
+        return future
+
+    def job_done(self, start, _):
+        """ Record the latency of a finished job, including any wait in queue. """
+        self.latency = time.time() - start
+        self.latency_max = max(self.latency_max, self.latency)
+
+    def stats(self):
+        """
+        Returns: A list of values for a summary table, see WORKER_HEADER.
+        """
+        return [self.name, self.jobs, self.restarts, '{:.3f}'.format(self.latency),
+                '{:.3f}'.format(self.latency_max), '{:.0f}'.format(time.time() - self.started)]
+
+
+class WriteBehind(object):
+    """
+    Queue the cell updates bound for one sheet, flushed together every few seconds.
+
+    Repeated writes to a cell collapse, the last value written wins.
+    A flush is a single Job writing every pending cell in one batch update.
+    Only one flush per sheet is in flight at a time so updates land in order.
+
+    Args:
+        name: The name of the sheet's scanner, i.e. hudson_cattle.
+        func: A picklable func(cells) writing a dict of A1 cell -> value to the sheet.
+    """
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self.pending = collections.OrderedDict()
+        self.fail_cbs = []
+        self.job = None
+        self.peak = 0
+        self.writes = 0
+        self.flushes = 0
+        self.flushed = 0
+        self.latency = 0.0
+        self.latency_max = 0.0
+
+    def __repr__(self):
+        keys = ['name', 'depth', 'peak', 'writes', 'flushes', 'flushed']
+        kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
+
+        return "{}({})".format(self.__class__.__name__, ', '.join(kwargs))
+
+    @property
+    def depth(self):
+        """ Number of cells waiting to be flushed. """
+        return len(self.pending)
+
+    @property
+    def in_flight(self):
+        """ True while a flush job is running. """
+        return self.job is not None and self.job in LIVE_JOBS
+
+    def put(self, cells, fail_cb=None):
+        """
+        Queue cells to write on next flush.
+
+        Args:
+            cells: A dict of A1 cell -> value, i.e. {'F11': 400}.
+            fail_cb: A (bot, msg) tuple to warn should the flush carrying these cells fail.
+        """
+        self.pending.update(cells)
+        self.writes += len(cells)
+        self.peak = max(self.peak, len(self.pending))
+        if fail_cb:
+            self.fail_cbs.append(fail_cb)
+
+    async def flush(self):
+        """
+        Start a job writing all pending cells. Nothing is done if no cells are pending
+        or the previous flush is still in flight.
+
+        Returns: The Job started, None if none started.
+
+        Raises:
+            FailedJob - The pool could not start the job, cells remain pending.
+        """
+        if not self.pending or self.in_flight:
+            return None
+
+        cells, self.pending = self.pending, collections.OrderedDict()
+        fail_cbs, self.fail_cbs = self.fail_cbs, []
+        job = Job(functools.partial(self.func, cells), worker=self.name,
+                  ident='Write behind {} cells to {}'.format(len(cells), self.name))
+        job.add_done_callback(functools.partial(self.flush_done, time.time()))
+        for tup in fail_cbs:
+            job.add_fail_callback(tup)
+
+        try:
+            await background_start(job)
+        except cog.exc.FailedJob:
+            for cell, value in cells.items():
+                self.pending.setdefault(cell, value)
+            self.fail_cbs = fail_cbs + self.fail_cbs
+            raise
+
+        self.job = job
+        self.flushes += 1
+        self.flushed += len(cells)
+        logging.getLogger('cog.jobs').info('WRITE %s - Flushing %d cells, %d writes so far.',
+                                           self.name, len(cells), self.writes)
+
+        return job
+
+    def flush_done(self, start, _):
+        """ Record the latency of a finished flush. """
+        self.latency = time.time() - start
+        self.latency_max = max(self.latency_max, self.latency)
+
+    async def drain(self, delay=0.5):
+        """
+        Flush all pending cells and wait until they are written or the flush failed.
+        """
+        while self.pending or self.in_flight:
+            await self.flush()
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        """
+        Returns: A list of values for a summary table, see WRITE_HEADER.
+        """
+        return [self.name, self.depth, self.peak, self.writes, self.flushes, self.flushed,
+                '{:.3f}'.format(self.latency), '{:.3f}'.format(self.latency_max)]
+
+
+async def write_behind_task(delay=WRITE_DELAY):
+    """
+    Regularly flush the write behind queue of every sheet.
+
+    Args:
+        delay: Flush on this delay (seconds).
+    """
+    print("Write behind task running with delay:", delay)
+    while RUN:
+        await asyncio.sleep(delay)
+        for writer in list(WRITERS.values()):
+            try:
+                await writer.flush()
+            except cog.exc.FailedJob:
+                logging.getLogger('cog.jobs').exception('WRITE %s - Flush failed to start.',
+                                                        writer.name)
+
+
+def write_summary():
+    """
+    Summarize the write behind queues.
+
+    Returns: A formatted table ready to send.
+    """
+    lines = [WRITE_HEADER] + [writer.stats() for writer in WRITERS.values()]
+    return "__Sheet Writes__ (times in seconds)\n" + \
+        cog.tbl.wrap_markdown(cog.tbl.format_table(lines, header=True))
+
+
+def register_worker(name, resident=None):
+    """
+    Start a worker process for jobs with worker=name.
+    To swap the worker of a registered name use replace_worker.
+
+    Returns: The Worker.
+    """
+    WORKERS[name] = Worker(name, resident)
+
+    return WORKERS[name]
+
+
+async def replace_worker(name, resident=None):
+    """
+    Start a new worker process for jobs with worker=name, i.e. when its sheet changed.
+    The previous worker is stopped in an executor, a running job is killed.
+
+    Returns: The new Worker.
+    """
+    old = WORKERS.get(name)
+    worker = register_worker(name, resident)
+    if old:
+        await asyncio.get_event_loop().run_in_executor(None, old.stop)
+
+    return worker
+
+
+def get_pool(name=None):
+    """
+    Returns: The pool of the worker name if registered, otherwise POOL.
+    """
+    try:
+        return WORKERS[name]
+    except KeyError:
+        return POOL
+
+
+def close_workers():
+    """
+    Stop all workers.
+    """
+    for worker in WORKERS.values():
+        worker.stop()
+    WORKERS.clear()
+
+
+def worker_summary():
+    """
+    Summarize the worker processes.
+
+    Returns: A formatted table ready to send.
+    """
+    lines = [WORKER_HEADER] + [worker.stats() for worker in WORKERS.values()]
+    return "__Sheet Workers__ (times in seconds)\n" + \
+        cog.tbl.wrap_markdown(cog.tbl.format_table(lines, header=True))
+
+
+def stop_pool(pool):
+    """
+    Stop a pebble pool and wait for its processes. Blocking, run it in an executor.
+    """
+    pool.close()
+    pool.stop()
+    pool.join()
+
+
+def worker_init(name, resident):
+    """
+    Executes in the worker process on start, keep the resident object there.
+    """
+    RESIDENT[name] = resident
+
+
+def call_resident(name, method, *args):
+    """
+    Executes in the worker process, call method of the object resident there.
+    """
+    return getattr(RESIDENT[name], method)(*args)
+
+
+async def check_pools():
+    """
+    Health check POOL and the workers, restart any pool no longer accepting jobs.
+    Failed pools are stopped in an executor.
+    """
+    global POOL
+    try:
+        POOL.schedule(do_nothing)
+    except RuntimeError:  # Pool is in error, restart it
+        old_pool = POOL
+        POOL = pebble.ProcessPool(max_workers=MAX_WORKERS, max_tasks=1)
+        await asyncio.get_event_loop().run_in_executor(None, stop_pool, old_pool)
+
+    for worker in list(WORKERS.values()):
+        await worker.check()
+
+
+def check_jobs():
+    """
+    Check every live job once, finish those done and reschedule those timed out.
+    """
+    log = logging.getLogger('cog.jobs')
+    for job in LIVE_JOBS:
+        try:
+            job.future.result(0.01)  # Force raising exception
+            if job.future.done():
+                log.info('Job Finished %s, time taken: %s',
+                         job.ident, time.time() - job.start_time)
+                LIVE_JOBS.remove(job)
+                job.finish()
+        except concurrent.futures.CancelledError:  # Job got cancelled
+            LIVE_JOBS.remove(job)
+        except Exception as exc:  # If amy exception, it failed, try again.
+            if not isinstance(exc, concurrent.futures.TimeoutError):
+                msg = "Exception raised during process execution!"
+                log.exception(msg + "\n" + str(exc))
+            try:
+                job.check_timeout()
+            except cog.exc.FailedJob:
+                LIVE_JOBS.remove(job)
+                job.finish()
+
+
 async def pool_monitor_task(delay=2):
     """
     Simply regularly check in progress jobs for timeout.
@@ -164,7 +532,6 @@ async def pool_monitor_task(delay=2):
     """
     print("Pool monitor task running with delay:", delay)
     log = logging.getLogger('cog.jobs')
-    global POOL
 
     while RUN:
         if LIVE_JOBS:
@@ -174,33 +541,8 @@ async def pool_monitor_task(delay=2):
             if num_jobs >= MAX_WORKERS:
                 log.warning("Max workers reached. Currently %d/%d", num_jobs, MAX_WORKERS)
 
-        try:
-            POOL.schedule(do_nothing)
-        except RuntimeError:  # Pool is in error, restart it
-            POOL.close()
-            POOL.stop()
-            POOL.join()
-            POOL = pebble.ProcessPool(max_workers=MAX_WORKERS, max_tasks=1)
-
-        for job in LIVE_JOBS:
-            try:
-                job.future.result(0.01)  # Force raising exception
-                if job.future.done():
-                    log.info('Job Finished %s, time taken: %s',
-                             job.ident, time.time() - job.start_time)
-                    LIVE_JOBS.remove(job)
-                    job.finish()
-            except concurrent.futures.CancelledError:  # Job got cancelled
-                LIVE_JOBS.remove(job)
-            except Exception as exc:  # If amy exception, it failed, try again.
-                if not isinstance(exc, concurrent.futures.TimeoutError):
-                    msg = "Exception raised during process execution!"
-                    log.exception(msg + "\n" + str(exc))
-                try:
-                    job.check_timeout()
-                except cog.exc.FailedJob:
-                    LIVE_JOBS.remove(job)
-                    job.finish()
+        await check_pools()
+        check_jobs()
 
         await asyncio.sleep(delay)
 
@@ -85,6 +85,8 @@ def subs_admin(subs, prefix):
         Shutdown this bot after short delay.
 {prefix}admin scan
         Pull and parse the latest sheet information.
+{prefix}admin stats
+        Show runtime metrics like executor saturation and wait times.
 {prefix}admin info @User
         Information about the mentioned User, DMed to admin.
     """.format(prefix=prefix)
@@ -105,6 +107,7 @@ def subs_admin(subs, prefix):
     admin_subs.add_parser('dump', help='Dump the db to console.')
     admin_subs.add_parser('halt', help='Stop accepting commands and halt bot.')
     admin_subs.add_parser('scan', help='Scan the sheets for updates.')
+    admin_subs.add_parser('stats', help='Show runtime metrics.')
     admin_sub = admin_subs.add_parser('info', help='Get info about discord users.')
     admin_sub.add_argument('user', nargs='?', help='The user to get info on.')
     admin_sub = admin_subs.add_parser('active', help='Get a report on user activity.')
@@ -143,6 +146,10 @@ def subs_bgs(subs, prefix):
         Show an overall report for one or more bubbles.
 {prefix}bgs sys Frey
         Show a system overview and all factions.
+{prefix}bgs trend
+        Show influence trends and projected control flips for default bubbles.
+{prefix}bgs trend Rana, Frey
+        Show influence trends and projected control flips for Rana and Frey bubbles.
     """.format(prefix=prefix)
     sub = subs.add_parser(prefix + 'bgs', description=desc, formatter_class=RawHelp)
     sub.set_defaults(cmd='BGS', system=[])
@@ -169,6 +176,8 @@ def subs_bgs(subs, prefix):
     bgs_sub.add_argument('system', nargs='*', default=[], help='The system to lookup.')
     bgs_sub = bgs_subs.add_parser('sys', help='Get a complete system overview.')
     bgs_sub.add_argument('system', nargs='+', help='The system to lookup.')
+    bgs_sub = bgs_subs.add_parser('trend', help='Show influence trends of bubbles.')
+    bgs_sub.add_argument('system', nargs='*', help='The control systems to lookup.')
 
 
 @register_parser
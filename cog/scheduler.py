@@ -3,6 +3,8 @@ Implements a very simple scheduler for updating the sheets when they change.
 
   - Uses rpc logic that wakes up scheduler on loop. Subscribes to POSTs.
   - Updater logic to schedule and cancel updates. Uses cog.jobs for execution.
+  - Sheets unchanged since their last scan are skipped, commands unblock at once.
+  - Each scanner scans in a worker process of its own, the sheet client stays warm.
   - Scheduler registers scanners and commands to block during update.
 """
 from __future__ import absolute_import, print_function
@@ -16,6 +18,8 @@ import time
 import aiozmq
 import aiozmq.rpc
 
+import cog.exc
+import cog.executors
 import cog.jobs
 import cog.util
 
@@ -63,9 +67,31 @@ class Scheduler(aiozmq.rpc.AttrHandler):
 
     def register(self, name, scanner, cmds):
         """
-        Register scanner to be updated.
+        Register scanner to be updated, its jobs run in a worker process of its own.
         """
         self.wraps[name] = WrapScanner(name, scanner, cmds)
+        cog.jobs.register_worker(name, scanner)
+
+    async def replace(self, name, scanner):
+        """
+        Replace the scanner of a registered name, i.e. when the cycle moves it to a new tab.
+        Cells queued for the old sheet are written first, scans in progress are cancelled.
+        The worker process is replaced so its jobs run against the new scanner.
+        """
+        try:
+            writer = cog.jobs.WRITERS.get(name)
+            if writer:
+                await writer.drain()
+        except cog.exc.FailedJob:
+            logging.getLogger('cog.scheduler').exception(
+                'Writes to %s not drained before replace.', name)
+
+        wrap = self.wraps[name]
+        if wrap.is_scheduled:
+            wrap.cancel()
+            scan_done_cb(wrap, None)
+        wrap.scanner = scanner
+        await cog.jobs.replace_worker(name, scanner)
 
     def schedule(self, name):
         """
@@ -158,26 +184,50 @@ class WrapScanner(object):
         Handle both scheduling this new job and cancelling old one.
         """
         self.event.clear()
-        self.job = cog.jobs.Job(self.scanner.scan, attempts=6, timeout=30)
+        self.job = cog.jobs.Job(functools.partial(cog.jobs.call_resident, self.name, 'scan'),
+                                attempts=6, timeout=30, worker=self.name)
         self.job.ident = "Scheduled update for " + self.name
         self.job.add_done_callback(functools.partial(scan_done_cb, self))
         # job.add_fail_callback(cog.jobs.warn_user_callback(bot, msg, job))
 
-        self.future = asyncio.ensure_future(
-            delay_call(delay, cog.jobs.background_start, self.job))
+        self.future = asyncio.ensure_future(scan_if_changed(self, delay))
         expected = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
         logging.getLogger('cog.scheduler').info(
             'Update for %s scheduled for %s', self.name, expected)
 
 
-async def delay_call(delay, coro, *args, **kwargs):
-    """ Simply delay then invoke a coroutine. """
-    await asyncio.sleep(delay)
-    await coro(*args, **kwargs)
+async def scan_if_changed(wrap, delay):
+    """
+    Check the version of the sheet first, if unchanged since the last scan skip it
+    and unblock the commands immediately. Otherwise delay then start the scan job.
+    Cells queued for the sheet are written before it is scanned.
+    """
+    try:
+        unchanged = await cog.executors.SHEETS.run(wrap.scanner.unchanged)
+    except cog.exc.BotBusy:
+        unchanged = False
 
+    if unchanged:
+        logging.getLogger('cog.scheduler').info('Skipped update for %s, sheet unchanged.',
+                                                wrap.name)
+        scan_done_cb(wrap, None)
+        return
 
-def scan_done_cb(wrap, _):
-    """ When finished reset wrap. """
+    await asyncio.sleep(delay)
+    try:
+        writer = cog.jobs.WRITERS.get(wrap.name)
+        if writer:
+            await writer.drain()
+    except cog.exc.FailedJob:
+        logging.getLogger('cog.scheduler').exception('Writes to %s not drained before scan.',
+                                                     wrap.name)
+    await cog.jobs.background_start(wrap.job)
+
+
+def scan_done_cb(wrap, changes):
+    """ When finished reset wrap, changes is None when the scan was skipped. """
+    if changes is not None:
+        wrap.scanner.scanned(changes)
     wrap.job = None
     wrap.future = None
     wrap.event.set()
@@ -5,8 +5,13 @@ Tutorial and reference available at:
     https://developers.google.com/sheets/api/quickstart/python
 """
 from __future__ import absolute_import, print_function
+import functools
+import json
 import logging
 import os
+import re
+import threading
+import time
 
 import argparse
 import httplib2
@@ -21,8 +26,24 @@ import cog.exc
 
 
 APPLICATION_NAME = 'CogBot'
-# Requires read and write access to user's account
-REQ_SCOPE = 'https://www.googleapis.com/auth/spreadsheets'
+# Requires read and write access to user's sheets, drive metadata for the version of files
+REQ_SCOPE = ['https://www.googleapis.com/auth/spreadsheets',
+             'https://www.googleapis.com/auth/drive.metadata.readonly']
+ORD_A = ord('A')
+DISCOVERY_URLS = {
+    ('drive', 'v3'): 'https://www.googleapis.com/discovery/v1/apis/drive/v3/rest',
+    ('sheets', 'v4'): 'https://sheets.googleapis.com/$discovery/rest?version=v4',
+}
+# Seconds a discovery document on disk is used before fetching it again
+DISCOVERY_TTL = 7 * 24 * 60 * 60
+# Caches of this process, see authorize, discovery_document and build_service
+AUTHORIZED = {}
+DOCUMENTS = {}
+SERVICES = {}
+RANGE_RE = re.compile(r'!?([A-Z]+)([0-9]+):([A-Z]+)([0-9]*)$')
+CELL_RE = re.compile(r'([A-Z]+)([0-9]+)$')
+# A range in a batch update costs about as much as writing this many more values
+RANGE_COST = 8
 
 
 class ColCnt(object):
@@ -80,87 +101,54 @@ class ColCnt(object):
 class Column(object):
     """
     Model a column in an excel sheet of form A-Z, AA, AB ... AZ, BA ....
+
+    The column is held as its zero based index, moving is plain arithmetic.
     """
     def __init__(self, init_col='A'):
         """
         Access the current column string by using str().
 
-        IMPORTANT: Counters are stored backwards, lease significant counter at index 0.
-
         Args:
             init_col: A string representing an excel column of A-Z, AA, AB, etc ...
         """
-        self.counters = []
-
-        for char in init_col:
-            self.counters.insert(0, ColCnt(char))
+        self.index = column_to_index(init_col)
 
     def __repr__(self):
-        return "Column({}={!r})".format('counters', self.counters)
+        return "Column({}={!r})".format('index', self.index)
 
     def __str__(self):
-        msg = ''
-
-        for counter in self.counters:
-            msg = str(counter) + msg
+        return index_to_column(self.index)
 
-        return msg
+    @property
+    def counters(self):
+        """
+        The ColCnt of every character, least significant counter at index 0.
+        """
+        return [ColCnt(char) for char in reversed(str(self))]
 
     def next(self):
         """
-        Add exactly 1 to the column counters.
+        Add exactly 1 to the column.
 
         Returns: The new column string.
         """
-        add_counter = True
-        for counter in self.counters:
-            try:
-                counter.next()
-                add_counter = False
-                break
-            except cog.exc.ColOverflow:
-                pass
-
-        if add_counter:
-            self.counters.append(ColCnt('A'))
-
-        return self.__str__()
+        return self.offset(1)
 
     def prev(self):
         """
-        Subtract exactly 1 from the column counters.
+        Subtract exactly 1 from the column.
 
         Returns: The new column string.
         """
-        sub_counter = True
-        for counter in self.counters:
-            try:
-                counter.prev()
-                sub_counter = False
-                break
-            except cog.exc.ColOverflow:
-                pass
-
-        if sub_counter:
-            self.counters = self.counters[:-1]
-
-        return self.__str__()
+        return self.offset(-1)
 
     def offset(self, offset):
         """
-        Increment counters by offset.
+        Move the column by offset, negative moves left.
 
         Returns: The new column string.
         """
-        if offset > 0:
-            call = self.next
-        else:
-            call = self.prev
-            offset = offset * -1
-
-        while offset:
-            call()
-            offset -= 1
+        self.index += offset
 
         return self.__str__()
 
@@ -184,18 +172,24 @@ class GSheet(object):
     def __init__(self, sheet, json_secret, sheet_token):
         """
         Args:
-            sheet_id: The id of the google sheet to interact with.
+            sheet: The config of the sheet, its id and page.
+                   An optional endpoint points at a stand-in server, i.e. tests/fake_sheets.py,
+                   no authorization is used and discovery documents come from the server.
             json_secret: Path to the secret json api for client.
             sheet_token: Path to store token authorizing api.
         """
         self.sheet_id = sheet['id']
         self.page = "'{}'".format(sheet['page'])
-        self.credentials = get_credentials(json_secret, sheet_token)
-        http = self.credentials.authorize(httplib2.Http())
-        discovery_url = ('https://sheets.googleapis.com/$discovery/rest?'
-                         'version=v4')
-        self.service = discovery.build('sheets', 'v4', http=http,
-                                       discoveryServiceUrl=discovery_url)
+        self.endpoint = sheet.get('endpoint')
+        if self.endpoint:
+            self.cache_dir = None
+            key = (self.endpoint, os.getpid(), threading.get_ident())
+            self.credentials, self.http = AUTHORIZED.setdefault(key, (None, httplib2.Http()))
+        else:
+            self.cache_dir = os.path.dirname(sheet_token)
+            self.credentials, self.http = authorize(json_secret, sheet_token)
+        self.service = build_service('sheets', 'v4', self.http, self.cache_dir, self.endpoint)
+        self._drive = None
 
     @property
     def values(self):
@@ -204,6 +198,27 @@ class GSheet(object):
         """
         return self.service.spreadsheets().values()  # pylint: disable=no-member
 
+    @property
+    def drive(self):
+        """
+        Return on demand drive service, only used for file metadata.
+        """
+        if not self._drive:
+            self._drive = build_service('drive', 'v3', self.http, self.cache_dir,
+                                        self.endpoint)
+
+        return self._drive
+
+    def version(self):
+        """
+        A cheap metadata request, no cells are fetched.
+
+        Returns: The version of the whole spreadsheet, it increases on every change.
+        """
+        files = self.drive.files()  # pylint: disable=no-member
+        result = files.get(fileId=self.sheet_id, fields='version').execute()
+        return int(result['version'])
+
     def get(self, cell_range, dim='ROWS'):
         """
         Args:
@@ -293,18 +308,290 @@ class GSheet(object):
         return self.get('!A:ZZ', dim=dim)
 
 
+@functools.lru_cache(maxsize=None)
 def column_to_index(col_str):
     """
-    Convert a column string to an index in sheet cells.
+    Convert a column string to an index in sheet cells, i.e. A is 0 and AA is 26.
     """
-    cnt = 0
-    column = cog.sheets.Column('A')
+    index = 0
+    for char in col_str:
+        index = index * 26 + ord(char) - ORD_A + 1
+
+    return index - 1
+
+
+@functools.lru_cache(maxsize=None)
+def index_to_column(index):
+    """
+    Convert an index in sheet cells to its column string, inverse of column_to_index.
+    """
+    col_str = ''
+    index += 1
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        col_str = chr(ORD_A + rem) + col_str
+
+    return col_str
+
+
+def parse_range(cell_range):
+    """
+    Parse an A1 range with a first cell, i.e. '!D1:AB10' or '!A11:B'.
+
+    Returns: (first_col, first_row, last_col, last_row) as inclusive zero based indices.
+             last_row is None when the range runs to the end of the sheet.
+
+    Raises:
+        ValueError - The range has no first cell.
+    """
+    match = RANGE_RE.match(cell_range)
+    if not match:
+        raise ValueError('Not a bounded A1 range: ' + cell_range)
+    col1, row1, col2, row2 = match.groups()
+    last_row = int(row2) - 1 if row2 else None
+
+    return (column_to_index(col1), int(row1) - 1, column_to_index(col2), last_row)
+
+
+def merge_ranges(cell_ranges, values):
+    """
+    Merge the values of ranges fetched by column into a single column major grid,
+    laid out as if the whole sheet had been fetched. Cells outside the ranges are empty.
+
+    Args:
+        cell_ranges: The A1 ranges requested, ranges sharing a column ordered top down.
+        values: The values returned for each range with dim='COLUMNS'.
+    """
+    cells = []
+    for cell_range, cols in zip(cell_ranges, values):
+        first_col, first_row = parse_range(cell_range)[:2]
+        for col_ind, col in enumerate(cols, first_col):
+            if not col:
+                continue
+
+            while len(cells) <= col_ind:
+                cells.append([])
+            column = cells[col_ind]
+            column.extend([''] * (first_row - len(column)))
+            column[first_row:first_row + len(col)] = col
+
+    return cells
+
+
+def parse_cell(cell):
+    """
+    Parse an A1 cell, i.e. 'F11'.
+
+    Returns: (col, row) as zero based indices.
+
+    Raises:
+        ValueError - Not an A1 cell.
+    """
+    match = CELL_RE.match(cell)
+    if not match:
+        raise ValueError('Not an A1 cell: ' + cell)
+
+    return (column_to_index(match.group(1)), int(match.group(2)) - 1)
 
-    while str(column) != col_str:
-        column.next()
-        cnt += 1
 
-    return cnt
+def written_cells(written, row, first_col, end_col):
+    """
+    Returns: The values written of row between first_col and end_col exclusive,
+             None if any of them was not written.
+    """
+    try:
+        return [written[(col, row)] for col in range(first_col, end_col)]
+    except (KeyError, TypeError):
+        return None
+
+
+def plan_writes(cells, written=None, range_cost=RANGE_COST):
+    """
+    Plan the writes of cells as few rectangular ranges for a single batch_update.
+
+    Cells on a row are joined into one range when every cell of the gap between them
+    was written by the bot and writing it back is cheaper than another range.
+    Gaps are never filled from a scan, that would revert edits made since by hand.
+    Ranges of adjacent rows spanning the same columns are then stacked into rectangles.
+
+    Args:
+        cells: A dict of A1 cell -> value to write, i.e. {'F11': 400}.
+        written: A dict of (col, row) -> value of cells written before, zero based.
+        range_cost: Fill gaps of at most this many cells.
+
+    Returns: (cell_ranges, n_vals) to pass to GSheet.batch_update with dim='ROWS'.
+
+    Raises:
+        ValueError - A cell is not in A1 notation.
+    """
+    rows = {}
+    for cell, value in cells.items():
+        col, row = parse_cell(cell)
+        rows.setdefault(row, {})[col] = value
+
+    spans = []
+    for row in sorted(rows):
+        values = rows[row]
+        last_col = None
+        for col in sorted(values):
+            gap = None
+            if last_col is not None:
+                gap = written_cells(written, row, last_col + 1, col)
+
+            if gap is None or len(gap) > range_cost:
+                spans.append((col, row, []))
+            else:
+                spans[-1][2].extend(gap)
+            spans[-1][2].append(values[col])
+            last_col = col
+
+    rects, stacks = [], {}
+    for col, row, values in spans:
+        rect = stacks.get((col, len(values)))
+        if rect and rect[2] == row - 1:
+            rect[2] = row
+            rect[3].append(values)
+        else:
+            rect = [col, row, row, [values]]
+            stacks[(col, len(values))] = rect
+            rects.append(rect)
+
+    cell_ranges, n_vals = [], []
+    for col, first_row, last_row, values in rects:
+        cell_ranges.append('!{}{}:{}{}'.format(index_to_column(col), first_row + 1,
+                                               index_to_column(col + len(values[0]) - 1),
+                                               last_row + 1))
+        n_vals.append(values)
+
+    return (cell_ranges, n_vals)
+
+
+def authorize(json_secret, sheets_token):
+    """
+    Share the credentials and an authorized http within a process.
+    An httplib2.Http is not thread safe nor can its connections cross a fork,
+    each thread of each process gets its own.
+
+    Returns: (credentials, http)
+    """
+    key = (json_secret, sheets_token, os.getpid(), threading.get_ident())
+    try:
+        return AUTHORIZED[key]
+    except KeyError:
+        credentials = get_credentials(json_secret, sheets_token)
+        AUTHORIZED[key] = (credentials, credentials.authorize(httplib2.Http()))
+        return AUTHORIZED[key]
+
+
+def read_discovery_cache(fname):
+    """
+    Read a discovery document cached on disk.
+
+    Returns: (doc, fresh), doc is None if unreadable, fresh if younger than DISCOVERY_TTL.
+    """
+    try:
+        with open(fname) as fin:
+            doc = fin.read()
+        return doc, time.time() - os.path.getmtime(fname) < DISCOVERY_TTL
+    except (IOError, OSError):
+        return None, False
+
+
+def write_discovery_cache(fname, doc):
+    """
+    Cache a discovery document on disk, replaced atomically. Failures are only logged.
+    """
+    log = logging.getLogger('cog.sheets')
+    try:
+        with open(fname + '.tmp', 'w') as fout:
+            fout.write(doc)
+        os.replace(fname + '.tmp', fname)
+        log.info('SHEETS - Cached discovery document %s.', fname)
+    except (IOError, OSError) as exc:
+        log.warning('SHEETS - Unable to cache discovery document %s: %s', fname, exc)
+
+
+def fetch_discovery(api, version, http, endpoint=None):
+    """
+    Fetch the discovery document of an api.
+
+    Args:
+        endpoint: Fetch from this stand-in server rather than Google.
+
+    Returns: The document as a string, checked to be valid json.
+
+    Raises:
+        HttpLib2Error, IOError, OSError - The request failed.
+        ValueError - Error status or the document was not json.
+    """
+    url = DISCOVERY_URLS[(api, version)]
+    if endpoint:
+        url = '{}discovery/{}/{}'.format(endpoint, api, version)
+
+    resp, content = http.request(url)
+    if resp.status >= 400:
+        raise ValueError('HTTP status {}'.format(resp.status))
+    content = content.decode()
+    json.loads(content)
+
+    return content
+
+
+def discovery_document(api, version, http, cache_dir, endpoint=None):
+    """
+    The discovery document of an api, kept in memory and on disk in cache_dir.
+    A copy on disk older than DISCOVERY_TTL is fetched again, should that fail
+    the old copy is used. Without a cache_dir documents are only kept in memory.
+
+    Args:
+        endpoint: Fetch from this stand-in server rather than Google.
+
+    Returns: The document as a string.
+
+    Raises:
+        RemoteError - The document could not be fetched and there is no copy.
+    """
+    key = (api, version, endpoint)
+    try:
+        return DOCUMENTS[key]
+    except KeyError:
+        pass
+
+    doc, fresh, fname = None, False, None
+    if cache_dir:
+        fname = os.path.join(cache_dir, 'discovery_{}_{}.json'.format(api, version))
+        doc, fresh = read_discovery_cache(fname)
+
+    if not fresh:
+        try:
+            doc = fetch_discovery(api, version, http, endpoint)
+        except (httplib2.HttpLib2Error, ValueError, IOError, OSError) as exc:
+            if not doc:
+                raise cog.exc.RemoteError('Discovery of {} {} failed: {}'.format(
+                    api, version, exc))
+            logging.getLogger('cog.sheets').warning(
+                'SHEETS - Using stale discovery document %s: %s', fname, exc)
+        else:
+            if fname:
+                write_discovery_cache(fname, doc)
+
+    DOCUMENTS[key] = doc
+    return doc
+
+
+def build_service(api, version, http, cache_dir, endpoint=None):
+    """
+    Build a service for the api from the cached discovery document,
+    services are shared by all users of the same http.
+    """
+    key = (api, version, id(http))
+    try:
+        return SERVICES[key][1]
+    except KeyError:
+        doc = discovery_document(api, version, http, cache_dir, endpoint)
+        # Keep a reference to http, its id is never reused while cached
+        SERVICES[key] = (http, discovery.build_from_document(doc, http=http))
+        return SERVICES[key][1]
 
 
 def get_credentials(json_secret, sheets_token):  # pragma: no cover
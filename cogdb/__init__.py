@@ -12,21 +12,159 @@ Relationship backrefs:
     http://docs.sqlalchemy.org/en/latest/orm/backref.html#relationships-backref
 """
 from __future__ import absolute_import, print_function
+import contextlib
 import logging
 import os
 import sys
+import threading
+import time
 
 import sqlalchemy
 import sqlalchemy.event
 import sqlalchemy.exc
+import sqlalchemy.ext.baked
 import sqlalchemy.orm
+import sqlalchemy.pool
 
+import cog.exc
+import cog.tbl
 import cog.util
+import cogdb.breaker
 
 # Old engine, just in case
 # engine = sqlalchemy.create_engine('sqlite://', echo=False)
 
 MYSQL_SPEC = 'mysql+pymysql://{user}:{pass}@{host}/{db}?charset=utf8mb4'
+POOL_DEFAULTS = {
+    'main': {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 10, 'pool_recycle': 3600},
+    'eddb': {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 10, 'pool_recycle': 3600},
+    'side': {'pool_size': 4, 'max_overflow': 4, 'pool_timeout': 15, 'pool_recycle': 3600},
+    'side_local': {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 10, 'pool_recycle': 3600},
+}
+# Timeouts in seconds, pymysql otherwise waits on a dead remote indefinitely
+CONNECT_ARGS = {
+    'side': {'connect_timeout': 5, 'read_timeout': 30, 'write_timeout': 30},
+}
+ENGINES = {}
+# Cache of compiled queries shared by hot paths, see sqlalchemy.ext.baked
+BAKERY = sqlalchemy.ext.baked.bakery(size=500)
+
+
+class MeteredQueuePool(sqlalchemy.pool.QueuePool):
+    """
+    A QueuePool that records checkouts, timeouts and the time spent waiting on a connection.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        """ Every checkout path of the pool gets a connection record here. """
+        start = time.time()
+        try:
+            conn = super()._do_get()
+        except sqlalchemy.exc.TimeoutError:
+            with self.metrics_lock:
+                self.timeouts += 1
+            raise
+
+        wait = time.time() - start
+        with self.metrics_lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+        return conn
+
+    def stats(self, name):
+        """
+        Returns: A list of values for a summary table, see POOL_HEADER.
+        """
+        checkouts = self.checkouts if self.checkouts else 1
+        return [
+            name,
+            self.size(),
+            self.checkedout(),
+            max(0, self.overflow()),
+            self.checkouts,
+            self.timeouts,
+            '{:.3f}'.format(self.wait_total / checkouts),
+            '{:.3f}'.format(self.wait_max),
+        ]
+
+
+def get_pool_config(name):
+    """
+    Returns: The create_engine pool kwargs for engine name, config overrides POOL_DEFAULTS.
+    """
+    kwargs = POOL_DEFAULTS[name].copy()
+    try:
+        kwargs.update(cog.util.get_config('pools', name))
+    except (KeyError, TypeError, cog.exc.MissingConfigFile):
+        pass
+
+    return kwargs
+
+
+def make_engine(name, creds):
+    """
+    Create a metered engine for the database in creds, pool configured by name.
+    """
+    eng = sqlalchemy.create_engine(MYSQL_SPEC.format(**creds), echo=False,
+                                   poolclass=MeteredQueuePool,
+                                   connect_args=CONNECT_ARGS.get(name, {}),
+                                   **get_pool_config(name))
+    ENGINES[name] = eng
+    return eng
+
+
+@contextlib.contextmanager
+def session_scope(session_maker=None):
+    """
+    Provide a session for the duration of a with block.
+    The session is rolled back on any exception and always closed.
+    Committing remains up to the caller.
+
+    Args:
+        session_maker: The sessionmaker to use, default Session.
+    """
+    session = session_maker() if session_maker else Session()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def session_call(session_maker, func, *args):
+    """
+    Call func with a new session from session_maker and args, the session is closed after.
+    Intended to be run on an executor.
+    """
+    with session_scope(session_maker) as session:
+        return func(session, *args)
+
+
+def pool_summary():
+    """
+    Summarize the connection pools of all engines.
+
+    Returns: A formatted table ready to send.
+    """
+    lines = [POOL_HEADER] + [eng.pool.stats(name) for name, eng in sorted(ENGINES.items())
+                             if isinstance(eng.pool, MeteredQueuePool)]
+    return "__DB Pools__ (times in seconds)\n" + \
+        cog.tbl.wrap_markdown(cog.tbl.format_table(lines, header=True))
+
+
+POOL_HEADER = ['Name', 'Size', 'Out', 'Overflow', 'Checkouts', 'Timeouts',
+               'Avg Wait', 'Max Wait']
 CREDS = cog.util.get_config('dbs', 'main')
 
 TEST_DB = False
@@ -36,20 +174,37 @@ if 'pytest' in sys.modules:
 else:
     CREDS['db'] = os.environ.get('COG_TOKEN', 'dev')
 
-engine = sqlalchemy.create_engine(MYSQL_SPEC.format(**CREDS), echo=False, pool_recycle=3600)
+engine = make_engine('main', CREDS)
 Session = sqlalchemy.orm.sessionmaker(bind=engine)
 logging.getLogger('cogdb').info('Main Engine: %s', engine)
 print('Main Engine Selected: ', engine)
 
 # Local eddb server
 CREDS['db'] = "eddb"
-eddb_engine = sqlalchemy.create_engine(MYSQL_SPEC.format(**CREDS), echo=False)
+eddb_engine = make_engine('eddb', CREDS)
 EDDBSession = sqlalchemy.orm.sessionmaker(bind=eddb_engine)
 
 # Remote server tracking bgs
 CREDS = cog.util.get_config('dbs', 'side')
-side_engine = sqlalchemy.create_engine(MYSQL_SPEC.format(**CREDS), echo=False, pool_recycle=3600)
-SideSession = sqlalchemy.orm.sessionmaker(bind=side_engine)
+side_engine = make_engine('side', CREDS)
+SideRemoteSession = sqlalchemy.orm.sessionmaker(bind=side_engine)
+
+
+def probe_side():
+    """ Cheapest possible query against remote. """
+    with side_engine.connect() as conn:
+        conn.execute(sqlalchemy.select([sqlalchemy.literal(1)]))
+
+
+side_breaker = cogdb.breaker.CircuitBreaker('side', probe_side)
+
+# Local replica of remote, kept current by cogdb.side_sync. Queries read here by default.
+# Tests query the remote directly as the test replica is never synced.
+CREDS = cog.util.get_config('dbs', 'main')
+CREDS['db'] = "side"
+side_local_engine = make_engine('side_local', CREDS)
+SideLocalSession = sqlalchemy.orm.sessionmaker(bind=side_local_engine)
+SideSession = SideRemoteSession if TEST_DB else SideLocalSession
 
 CREDS = None
 
@@ -0,0 +1,177 @@
+"""
+Circuit breaker for remote databases.
+
+A breaker starts closed, calls pass through and are retried with jittered backoff
+on connection errors. After threshold consecutive failed calls it opens, every call
+fails fast with RemoteError until reset seconds pass. Then it is half open, the next
+call first runs a cheap probe. If the probe succeeds the breaker closes, else it reopens.
+"""
+from __future__ import absolute_import, print_function
+import logging
+import random
+import threading
+import time
+
+import pymysql
+import sqlalchemy.exc as sqla_exe
+
+import cog.exc
+import cog.tbl
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+TRANSIENT = (sqla_exe.OperationalError, sqla_exe.DisconnectionError, sqla_exe.TimeoutError,
+             pymysql.err.OperationalError)
+BREAKERS = []
+
+
+class CircuitBreaker(object):
+    """
+    Guard calls to a remote resource, thread safe.
+
+    Args:
+        name: Name for logs and metrics.
+        probe: Callable taking no args, raises on failure. Used when half open.
+        threshold: Consecutive failed calls before opening.
+        reset: Seconds to stay open before probing.
+        retries: Retries of a call after the first failure.
+        backoff: Base seconds of backoff, doubled every retry with full jitter.
+    """
+    def __init__(self, name, probe, threshold=3, reset=30, retries=2, backoff=0.25):
+        self.name = name
+        self.probe = probe
+        self.threshold = threshold
+        self.reset = reset
+        self.retries = retries
+        self.backoff = backoff
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.calls = 0
+        self.retried = 0
+        self.rejected = 0
+        self.trips = 0
+        BREAKERS.append(self)
+
+    def __repr__(self):
+        keys = ['name', 'state', 'failures', 'threshold', 'reset', 'retries', 'backoff']
+        kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
+
+        return "{}({})".format(self.__class__.__name__, ', '.join(kwargs))
+
+    def error(self):
+        """ The error raised when failing fast. """
+        return cog.exc.RemoteError("Sidewinder's DB is unreachable, try again later.")
+
+    def trip(self):
+        """ Open the breaker. Lock must be held. """
+        if self.state != OPEN:
+            self.trips += 1
+            logging.getLogger('cogdb.breaker').error(
+                'BREAKER %s - Opened after %d failures.', self.name, self.failures)
+        self.state = OPEN
+        self.opened_at = time.time()
+
+    def success(self):
+        """ Record a successful call, closes the breaker. """
+        with self.lock:
+            if self.state != CLOSED:
+                logging.getLogger('cogdb.breaker').info('BREAKER %s - Closed.', self.name)
+            self.state = CLOSED
+            self.failures = 0
+
+    def failure(self):
+        """ Record a failed call, opens the breaker past threshold. """
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                self.trip()
+
+    def allow(self):
+        """
+        Check the breaker before a call, probing the remote if due.
+
+        Raises:
+            RemoteError - The breaker is open.
+        """
+        with self.lock:
+            self.calls += 1
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.time() - self.opened_at < self.reset:
+                self.rejected += 1
+                raise self.error()
+            if self.state == HALF_OPEN:
+                self.rejected += 1
+                raise self.error()
+            self.state = HALF_OPEN
+
+        try:
+            self.probe()
+        except Exception as exc:  # pylint: disable=broad-except
+            # Any probe failure must reopen, else the breaker stays half open for good
+            logging.getLogger('cogdb.breaker').warning(
+                'BREAKER %s - Probe failed: %s', self.name, exc)
+            self.failure()
+            with self.lock:
+                self.rejected += 1
+            raise self.error()
+        self.success()
+
+    def delay(self, attempt):
+        """ Seconds to wait before retry attempt, full jitter. """
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def call(self, func, *args, on_retry=None, retries=None, **kwargs):
+        """
+        Call func with args through the breaker.
+
+        Args:
+            on_retry: Optional callable run before every retry, i.e. to rollback a session.
+            retries: Override the retries of this breaker.
+
+        Raises:
+            RemoteError - The breaker is open or the call failed every attempt.
+        """
+        self.allow()
+        retries = self.retries if retries is None else retries
+        attempt = 0
+        while True:
+            try:
+                result = func(*args, **kwargs)
+                self.success()
+                return result
+            except TRANSIENT:
+                if attempt >= retries:
+                    self.failure()
+                    raise cog.exc.RemoteError("Lost connection to Sidewinder's DB.")
+
+            with self.lock:
+                self.retried += 1
+            time.sleep(self.delay(attempt))
+            attempt += 1
+            if on_retry:
+                on_retry()
+
+    def stats(self):
+        """
+        Returns: A list of values for a summary table, see STATS_HEADER.
+        """
+        return [self.name, self.state, '{}/{}'.format(self.failures, self.threshold),
+                self.calls, self.retried, self.rejected, self.trips]
+
+
+def summary():
+    """
+    Summarize the state of all breakers.
+
+    Returns: A formatted table ready to send.
+    """
+    lines = [STATS_HEADER] + [breaker.stats() for breaker in BREAKERS]
+    return "__Breakers__\n" + cog.tbl.wrap_markdown(cog.tbl.format_table(lines, header=True))
+
+
+STATS_HEADER = ['Name', 'State', 'Failures', 'Calls', 'Retried', 'Rejected', 'Trips']
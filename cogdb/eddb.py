@@ -1068,6 +1068,59 @@ def find_best_route(session, systems):
     return best
 
 
+def route_points(systems):
+    """
+    Reduce Systems to plain points for best_route_points.
+
+    Returns:
+        [[name, x, y, z], ...]
+    """
+    return [[sys.name, float(sys.x), float(sys.y), float(sys.z)] for sys in systems]
+
+
+def best_route_points(points):
+    """
+    Same algorithm as find_best_route, but over plain points from route_points.
+    No database access, safe to run in a process pool.
+
+    Returns:
+        [total_distance, [name, name, ...]]
+    """
+    def dist(left, right):
+        """ Distance between two points. """
+        return math.sqrt((left[1] - right[1]) ** 2 + (left[2] - right[2]) ** 2 +
+                         (left[3] - right[3]) ** 2)
+
+    best = []
+    for start in points:
+        rest = [point for point in points if point is not start]
+        course = [start[0]]
+        total_dist = 0
+        current = start
+        while rest:
+            choice = min(rest, key=lambda point: dist(current, point))
+            total_dist += dist(current, choice)
+            course += [choice[0]]
+            rest.remove(choice)
+            current = choice
+
+        if not best or total_dist < best[0]:
+            best = [total_dist, course]
+
+    return best
+
+
+def best_routes_points(routes):
+    """
+    Solve several routes with best_route_points in one call, to batch pool jobs.
+    An empty route has no distance.
+
+    Returns:
+        [[total_distance, [name, name, ...]], ...] in order of routes
+    """
+    return [best_route_points(points) if points else [0, []] for points in routes]
+
+
 def dump_db(session, classes):
     """
     Dump db to a file.
@@ -0,0 +1,263 @@
+"""
+In memory state of the fort sheet, i.e. the fort systems, prep systems, the merits
+dropped at them and the manual fort order.
+
+The state is loaded once in a session of its own, the Systems carry their summed
+merits and are detached so reading them needs no query. Changes swap in a new FortState:
+    - A drop or status change reloads only the systems touched.
+    - Setting the fort order reloads only the order.
+    - A scan of the fort sheet invalidates the state, the next read reloads it.
+States are never modified once built, readers need no lock.
+To modify a System query it in your own session, see cogdb.query.fort_find_system.
+"""
+from __future__ import absolute_import, print_function
+import logging
+
+import cog.exc
+import cogdb
+from cogdb.schema import FortOrder, System
+
+DEFER_MISSING = 750
+# Order of systems in the sheet, preps last
+SYSTEM_ORDER = (System.type == 'prep', System.sheet_order)
+STATES = {}
+
+
+class FortState(object):
+    """
+    Answer the fort questions of the bot from memory.
+
+    Args:
+        systems: All Systems and PrepSystems in sheet order, their merits summed.
+        order: The names of the systems in the manual fort order.
+    """
+    def __init__(self, systems, order):
+        self.systems = [system for system in systems if system.type != 'prep']
+        self.preps = [system for system in systems if system.type == 'prep']
+        self.order = order
+        self.by_name = {system.name: system for system in systems}
+
+    def __repr__(self):
+        keys = ['order']
+        kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
+        kwargs += ['systems={!r}'.format(len(self.systems)), 'preps={!r}'.format(len(self.preps))]
+
+        return "{}({})".format(self.__class__.__name__, ', '.join(kwargs))
+
+    def replace(self, systems=None, order=None):
+        """
+        Returns: A new FortState with the systems of the same name and the order swapped in.
+        """
+        new = {system.name: system for system in systems} if systems else {}
+        return FortState([new.get(system.name, system) for system in self.systems + self.preps],
+                         self.order if order is None else order)
+
+    def mediums(self):
+        """
+        Returns: Unfortified systems designated for small/medium ships, preps last.
+        """
+        return [med for med in self.systems + self.preps if "S/M" in med.notes and not
+                med.is_fortified and not med.skip and not med.missing < DEFER_MISSING]
+
+    def fort_systems(self, mediums=True):
+        """
+        Returns: The Systems in sheet order, PrepSystems are not included.
+
+        Args:
+            mediums: If False, exclude all systems designated for small/medium ships.
+        """
+        if mediums:
+            return list(self.systems)
+
+        med_names = {med.name for med in self.mediums()}
+        return [system for system in self.systems if system.name not in med_names]
+
+    def current_index(self):
+        """
+        Returns: The index of the first unfortified system, not skipped or deferred.
+
+        Raises:
+            NoMoreTargets - No more targets left OR a serious problem with data.
+        """
+        for ind, system in enumerate(self.systems):
+            if system.is_fortified or system.skip or system.missing < DEFER_MISSING:
+                continue
+
+            return ind
+
+        raise cog.exc.NoMoreTargets('No more fort targets at this time.')
+
+    def ordered(self):
+        """
+        The systems of the manual fort order, finished systems left out.
+
+        Returns: (systems, finished), finished are the names to remove from the order.
+        """
+        systems, finished = [], []
+        for name in self.order:
+            system = self.by_name.get(name)
+            if system is None:
+                continue
+            if system.is_fortified or system.missing < DEFER_MISSING:
+                finished += [name]
+            else:
+                systems += [system]
+
+        return systems, finished
+
+    def by_state(self):
+        """
+        Returns: A dictionary of the systems in each state, see fort_get_systems_by_state.
+        """
+        states = {
+            'cancelled': [],
+            'fortified': [],
+            'left': [],
+            'undermined': [],
+            'skipped': [],
+        }
+
+        for system in self.systems:
+            if system.is_fortified and system.is_undermined:
+                states['cancelled'].append(system)
+            if system.is_undermined:
+                states['undermined'].append(system)
+            if system.is_fortified:
+                states['fortified'].append(system)
+            if not system.is_fortified and not system.skip:
+                states['left'].append(system)
+            if system.skip:
+                states['skipped'].append(system)
+
+        return states
+
+    def targets(self):
+        """
+        Returns: The Systems to fortify now, see fort_get_targets.
+        """
+        systems = self.ordered()[0]
+        if systems:
+            return systems[:1]
+
+        targets = [self.systems[self.current_index()]]
+        mediums = self.mediums()
+        if mediums and mediums[0].name != targets[0].name:
+            targets.append(mediums[0])
+
+        return targets + self.preps
+
+    def next_targets(self, count=1):
+        """
+        Returns: The next count Systems to fortify after the targets.
+        """
+        systems = self.ordered()[0]
+        start = 1
+        if not systems:
+            systems = self.systems
+            start = self.current_index() + 1
+
+        targets = []
+        for system in systems[start:]:
+            if system.is_fortified or system.skip or system.missing < DEFER_MISSING:
+                continue
+
+            targets.append(system)
+            count = count - 1
+
+            if count == 0:
+                break
+
+        return targets
+
+    def deferred(self):
+        """
+        Returns: The unfortified Systems missing less than DEFER_MISSING.
+        """
+        return [system for system in self.systems
+                if system.missing < DEFER_MISSING and not system.is_fortified]
+
+    def missing(self, left):
+        """
+        Returns: The Systems left to fortify, not skipped, missing at most left supplies.
+        """
+        return [system for system in self.systems
+                if not system.is_fortified and not system.skip and system.missing <= left]
+
+
+def load_systems(names=None):
+    """
+    Load Systems with their summed merits in a session of its own and detach them.
+
+    Args:
+        names: Only load the systems with these names, by default all.
+
+    Returns: The Systems in sheet order, preps last.
+    """
+    session = cogdb.Session()
+    try:
+        query = session.query(System).order_by(*SYSTEM_ORDER)
+        if names is not None:
+            query = query.filter(System.name.in_(names))
+        systems = query.all()
+        session.expunge_all()
+    finally:
+        session.close()
+
+    return systems
+
+
+def load_order():
+    """
+    Returns: The names of the systems in the manual fort order.
+    """
+    session = cogdb.Session()
+    try:
+        return [row[0] for row in
+                session.query(FortOrder.system_name).order_by(FortOrder.order)]
+    finally:
+        session.close()
+
+
+def get():
+    """
+    Returns: The current FortState, loaded from the database if needed.
+    """
+    state = STATES.get('fort')
+    if state is None:
+        state = STATES['fort'] = FortState(load_systems(), load_order())
+        logging.getLogger('cogdb.fort').info('FORT - Loaded %r', state)
+
+    return state
+
+
+def invalidate():
+    """
+    Drop the current FortState, the next read reloads it.
+    """
+    STATES.pop('fort', None)
+
+
+def refresh_systems(names):
+    """
+    Reload the systems with names into the current FortState, if loaded.
+    Systems the state does not hold invalidate it instead.
+    """
+    state = STATES.get('fort')
+    if state is None:
+        return
+
+    systems = load_systems(names)
+    if len(systems) != len(set(names)) or any(system.name not in state.by_name
+                                              for system in systems):
+        invalidate()
+    else:
+        STATES['fort'] = state.replace(systems=systems)
+
+
+def refresh_order():
+    """
+    Reload the manual fort order into the current FortState, if loaded.
+    """
+    state = STATES.get('fort')
+    if state is not None:
+        STATES['fort'] = state.replace(order=load_order())
@@ -0,0 +1,226 @@
+"""
+In memory index of names the bot resolves, i.e. fort systems, undermining systems,
+systems and factions of Sidewinder's db.
+
+Names are normalized to lower case without spaces, the same way substr_match compares.
+Every key is split into trigrams, a needle only has to be verified against the names
+holding all of its trigrams. Matches are ranked exact, prefix then substring.
+When nothing contains the needle, names sharing the most trigrams are suggested.
+
+Indexes are immutable once built, a rebuild swaps in a new one. Readers need no lock.
+"""
+from __future__ import absolute_import, print_function
+import collections
+import logging
+
+import cog.exc
+import cogdb.schema
+import cogdb.side
+
+
+FORT = 'fort'
+UM = 'um'
+SYSTEM = 'system'
+FACTION = 'faction'
+GRAM = 3
+SIMILARITY = 0.3
+RARE = 20
+SHOWN = 10
+INDEXES = {}
+SHEET_SYSTEMS = {FORT: cogdb.schema.System, UM: cogdb.schema.SystemUM}
+
+
+def normalize(name):
+    """ Returns: The key of name, lower case with no spaces. """
+    return name.lower().replace(' ', '')
+
+
+def grams(key, size=GRAM):
+    """
+    Returns: The set of substrings of key with length size, key itself if shorter.
+    """
+    if len(key) <= size:
+        return {key}
+
+    return {key[ind:ind + size] for ind in range(len(key) - size + 1)}
+
+
+class NameIndex(object):
+    """
+    Trigram index over a list of names.
+
+    Args:
+        names: An iterable of names, duplicates are dropped.
+        kind: The kind of object named, used in replies.
+    """
+    def __init__(self, names, kind='name'):
+        self.kind = kind
+        self.names = sorted(set(names))
+        self.keys = [normalize(name) for name in self.names]
+        self.exact = collections.defaultdict(list)
+        postings = collections.defaultdict(list)
+        for ind, key in enumerate(self.keys):
+            self.exact[key].append(ind)
+            for gram in grams(key):
+                postings[gram].append(ind)
+        self.postings = {gram: frozenset(inds) for gram, inds in postings.items()}
+
+    def __repr__(self):
+        keys = ['kind']
+        kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
+        kwargs += ['names={!r}'.format(len(self.names))]
+
+        return "{}({})".format(self.__class__.__name__, ', '.join(kwargs))
+
+    def __len__(self):
+        return len(self.names)
+
+    def candidates(self, key):
+        """
+        Returns: Indices of all names containing key.
+        """
+        if len(key) < GRAM:
+            return [ind for ind, name_key in enumerate(self.keys) if key in name_key]
+
+        found = None
+        for posting in sorted((self.postings.get(gram, frozenset()) for gram in grams(key)),
+                              key=len):
+            found = posting if found is None else found & posting
+            if not found:
+                return []
+
+        return [ind for ind in found if key in self.keys[ind]]
+
+    def rank(self, key, inds):
+        """
+        Returns: inds sorted exact, prefix then substring matches, shorter names first.
+        """
+        def score(ind):
+            name_key = self.keys[ind]
+            match = 0 if name_key == key else (1 if name_key.startswith(key) else 2)
+            return (match, len(name_key), self.names[ind])
+
+        return sorted(inds, key=score)
+
+    def find(self, needle):
+        """
+        Find all names containing needle, ignoring case and spaces.
+
+        Returns: The names ranked, see rank.
+        """
+        key = normalize(needle)
+        if not key:
+            return []
+
+        return [self.names[ind] for ind in self.rank(key, self.candidates(key))]
+
+    def similar(self, needle, limit=5):
+        """
+        Find names sharing the most trigrams with needle, for typos.
+        Candidates come from the rarer trigrams of needle, common ones would match most names.
+
+        Returns: Up to limit names with a Dice similarity of at least SIMILARITY, best first.
+        """
+        needle_grams = grams(normalize(needle))
+        postings = [self.postings[gram] for gram in needle_grams if gram in self.postings]
+        rare = [posting for posting in postings if len(posting) <= len(self.names) // RARE]
+        found = frozenset().union(*(rare if rare else postings))
+
+        scores = []
+        for ind in found:
+            key_grams = grams(self.keys[ind])
+            score = 2.0 * len(needle_grams & key_grams) / (len(needle_grams) + len(key_grams))
+            if score >= SIMILARITY:
+                scores += [(-score, self.names[ind])]
+
+        return [name for _, name in sorted(scores)[:limit]]
+
+    def suggest(self, needle, limit=5):
+        """
+        Returns: Up to limit ranked names containing needle, else similar names.
+        """
+        return self.find(needle)[:limit] or self.similar(needle, limit)
+
+    def resolve(self, needle):
+        """
+        Resolve needle to a single name. An exact match wins over longer names.
+
+        Raises:
+            NoMatch - No name contains needle, similar names are suggested.
+            MoreThanOneMatch - Several names contain needle, the best SHOWN are listed.
+        """
+        key = normalize(needle)
+        if len(self.exact.get(key, [])) == 1:
+            return self.names[self.exact[key][0]]
+
+        matches = self.find(needle)
+        if len(matches) == 1:
+            return matches[0]
+        elif not matches:
+            raise cog.exc.NoMatch(needle, self.kind, self.similar(needle))
+        else:
+            raise cog.exc.MoreThanOneMatch(needle, matches[:SHOWN])
+
+
+def update(kind, names):
+    """
+    Replace the index of kind with one built from names.
+    """
+    INDEXES[kind] = NameIndex(names, kind)
+    logging.getLogger('cogdb.names').info('NAMES - Indexed %d %s names.',
+                                          len(INDEXES[kind]), kind)
+
+
+def get(kind):
+    """
+    Returns: The NameIndex of kind, None if not yet built.
+    """
+    return INDEXES.get(kind)
+
+
+def update_sheet(session, kind):
+    """
+    Rebuild the index of kind, FORT or UM, from the systems of its sheet in the main db.
+    """
+    update(kind, [row[0] for row in session.query(SHEET_SYSTEMS[kind].name)])
+
+
+def ensure_sheet(session, kind):
+    """
+    Build the index of kind, FORT or UM, if not yet built.
+    """
+    if kind not in INDEXES:
+        update_sheet(session, kind)
+
+
+@cogdb.side.wrap_exceptions
+def update_side(session):
+    """
+    Rebuild the system and faction indexes from a side session.
+    """
+    update(SYSTEM, [row[0] for row in session.query(cogdb.side.System.name) if row[0]])
+    update(FACTION, [row[0] for row in session.query(cogdb.side.Faction.name) if row[0]])
+
+
+def ensure_side(session):
+    """
+    Build the system and faction indexes if not yet built.
+    """
+    if SYSTEM not in INDEXES or FACTION not in INDEXES:
+        update_side(session)
+
+
+def suggest(needle, kinds=None, limit=5):
+    """
+    Suggest names across kinds, for autocomplete.
+
+    Returns: Up to limit ranked names, best match of every kind first.
+    """
+    kinds = kinds if kinds else sorted(INDEXES.keys())
+    found = [INDEXES[kind].suggest(needle, limit) for kind in kinds if kind in INDEXES]
+
+    names = []
+    for group in zip(*[group + [None] * (limit - len(group)) for group in found]):
+        names += [name for name in group if name and name not in names]
+
+    return names[:limit]
@@ -2,40 +2,56 @@
 Module should handle logic related to querying/manipulating tables from a high level.
 """
 from __future__ import absolute_import, print_function
+import collections
+import json
 import logging
+import operator
 import os
 import sys
 import tempfile
+import time
 
+import sqlalchemy as sqla
 import sqlalchemy.exc as sqla_exc
+import sqlalchemy.orm as sqla_orm
 import sqlalchemy.orm.exc as sqla_oexc
 
 import cog.exc
 import cog.sheets
-from cog.util import substr_match
+import cog.util
 import cogdb
+import cogdb.fort
+import cogdb.names
 from cogdb.schema import (DUser, System, PrepSystem, SystemUM, SheetRow, SheetCattle, SheetUM,
                           Drop, Hold, EFaction, ESheetType, kwargs_fort_system, kwargs_um_system,
-                          Admin, ChannelPerm, RolePerm, FortOrder, KOS)
+                          Admin, ChannelPerm, RolePerm, FortOrder, KOS, SheetRecord)
 from cogdb.side import HUDSON_CONTROLS, WINTERS_CONTROLS
 
 
-DEFER_MISSING = 750
+# Order of systems in the sheets, ids change as scans add and remove systems
+UM_ORDER = (sqla.func.length(SystemUM.sheet_col), SystemUM.sheet_col)
+# Spare columns and rows fetched past the extent of the last scan
+SCAN_MARGIN = (4, 50)
+# ORM class -> columns of its row values, see value_columns
+VALUE_COLUMNS = {}
 
 
 def fuzzy_find(needle, stack, obj_attr='zzzz', ignore_case=True):
     """
     Searches for needle in whole stack and gathers matches. Returns match if only 1.
+    Spaces are ignored, like substr_match.
 
     Raise separate exceptions for NoMatch and MoreThanOneMatch.
     """
+    key = needle.replace(' ', '')
+    if ignore_case:
+        key = key.lower()
+
     matches = []
     for obj in stack:
-        try:
-            if substr_match(needle, getattr(obj, obj_attr, obj), ignore_case=ignore_case):
-                matches.append(obj)
-        except cog.exc.NoMatch:
-            pass
+        line = getattr(obj, obj_attr, obj).replace(' ', '')
+        if key in (line.lower() if ignore_case else line):
+            matches.append(obj)
 
     num_matches = len(matches)
     if num_matches == 1:
@@ -68,8 +84,10 @@ def get_duser(session, discord_id):
     Raises:
         NoMatch - No possible match found.
     """
+    query = cogdb.BAKERY(lambda session: session.query(DUser))
+    query += lambda q: q.filter(DUser.id == sqla.bindparam('discord_id'))
     try:
-        return session.query(DUser).filter_by(id=discord_id).one()
+        return query(session).params(discord_id=discord_id).one()
     except sqla_oexc.NoResultFound:
         raise cog.exc.NoMatch(discord_id, 'DUser')
 
@@ -169,33 +187,26 @@ def fort_get_medium_systems(session):
     """
     Return unfortified systems designated for small/medium ships.
     """
-    mediums = session.query(System).all()
-    unforted = [med for med in mediums if "S/M" in med.notes and not med.is_fortified and not
-                med.skip and not med.missing < DEFER_MISSING]
-    return unforted
+    return cogdb.fort.get().mediums()
 
 
 def fort_get_systems(session, mediums=True):
     """
     Return a list of all Systems. PrepSystems are not included.
+    Systems of all fort_get_* helpers come from the fort state, detached from session.
 
     args:
         mediums: If false, exclude all systems designated for j
                  Determined by "S/M" being in notes.
     """
-    query = session.query(System).filter(System.type != 'prep')
-    if not mediums:
-        med_names = [med.name for med in fort_get_medium_systems(session)]
-        query = query.filter(System.name.notin_(med_names))
-
-    return query.all()
+    return cogdb.fort.get().fort_systems(mediums)
 
 
 def fort_get_preps(session):
     """
     Return a list of all PrepSystems.
     """
-    return session.query(PrepSystem).all()
+    return list(cogdb.fort.get().preps)
 
 
 def fort_find_current_index(session):
@@ -205,18 +216,12 @@ def fort_find_current_index(session):
     Raises:
         NoMoreTargets - No more targets left OR a serious problem with data.
     """
-    for ind, system in enumerate(fort_get_systems(session)):
-        if system.is_fortified or system.skip or system.missing < DEFER_MISSING:
-            continue
-
-        return ind
-
-    raise cog.exc.NoMoreTargets('No more fort targets at this time.')
+    return cogdb.fort.get().current_index()
 
 
 def fort_find_system(session, system_name, search_all=True):
     """
-    Return the System with System.name that matches.
+    Return the System with System.name that matches, it belongs to session.
     If search_all True, search all systems.
     If search_all False, search from current target forward.
 
@@ -224,12 +229,21 @@ def fort_find_system(session, system_name, search_all=True):
         NoMatch - No possible match found.
         MoreThanOneMatch - Too many matches possible, ask user to resubmit.
     """
+    query = cogdb.BAKERY(lambda session: session.query(System))
+    query += lambda q: q.filter(System.name == sqla.bindparam('name'))
     try:
-        return session.query(System).filter_by(name=system_name).one()
+        return query(session).params(name=system_name).one()
     except (sqla_oexc.NoResultFound, sqla_oexc.MultipleResultsFound):
         index = 0 if search_all else fort_find_current_index(session)
         systems = fort_get_systems(session)[index:] + fort_get_preps(session)
-        return fuzzy_find(system_name, systems, 'name')
+        try:
+            found = fuzzy_find(system_name, systems, 'name')
+        except cog.exc.NoMatch as exc:
+            cogdb.names.ensure_sheet(session, cogdb.names.FORT)
+            exc.suggestions = cogdb.names.suggest(system_name, [cogdb.names.FORT])
+            raise
+
+        return query(session).params(name=found.name).one()
 
 
 def fort_get_systems_by_state(session):
@@ -241,29 +255,7 @@ def fort_get_systems_by_state(session):
         undermined: Has been undermined and not fortified.
         cancelled: Has been both fortified and undermined.
     """
-    log = logging.getLogger('cogdb.query')
-    states = {
-        'cancelled': [],
-        'fortified': [],
-        'left': [],
-        'undermined': [],
-        'skipped': [],
-    }
-
-    for system in fort_get_systems(session):
-        log.info('STATE - %s', system)
-        if system.is_fortified and system.is_undermined:
-            states['cancelled'].append(system)
-        if system.is_undermined:
-            states['undermined'].append(system)
-        if system.is_fortified:
-            states['fortified'].append(system)
-        if not system.is_fortified and not system.skip:
-            states['left'].append(system)
-        if system.skip:
-            states['skipped'].append(system)
-
-    return states
+    return cogdb.fort.get().by_state()
 
 
 def fort_get_targets(session):
@@ -274,53 +266,37 @@ def fort_get_targets(session):
     - Second System if prsent is Othime, only when not fortified.
     - All Systems after are prep targets.
     """
-    targets = fort_order_get(session)
-    if targets:
-        return targets[:1]
-
-    current = fort_find_current_index(session)
-    systems = fort_get_systems(session)
-    targets = [systems[current]]
-
-    mediums = fort_get_medium_systems(session)
-    if mediums and mediums[0].name != targets[0].name:
-        targets.append(mediums[0])
-
-    targets += fort_get_preps(session)
-
-    return targets
+    return cogdb.fort.get().targets()
 
 
 def fort_get_next_targets(session, count=1):
     """
     Return next 'count' fort targets.
     """
-    systems = fort_order_get(session)
-    start = 1
-    if not systems:
-        systems = fort_get_systems(session)
-        start = fort_find_current_index(session) + 1
+    return cogdb.fort.get().next_targets(count)
 
-    targets = []
-    for system in systems[start:]:
-        if system.is_fortified or system.skip or system.missing < DEFER_MISSING:
-            continue
 
-        targets.append(system)
-        count = count - 1
+def fort_get_deferred_targets(session):
+    """
+    Return all deferred targets under deferal amount.
+    """
+    return cogdb.fort.get().deferred()
 
-        if count == 0:
-            break
 
-    return targets
+def fort_get_missing(session, left):
+    """
+    Return all systems left to fortify that are missing at most 'left' supplies.
+    """
+    return cogdb.fort.get().missing(left)
 
 
-def fort_get_deferred_targets(session):
+def fort_get_drops(session, system):
     """
-    Return all deferred targets under deferal amount.
+    Return the Drops at system with their users loaded, most merits first.
     """
-    return [system for system in fort_get_systems(session)
-            if system.missing < DEFER_MISSING and not system.is_fortified]
+    drops = session.query(Drop).options(sqla_orm.joinedload(Drop.user)).\
+        filter(Drop.system_id == system.id).all()
+    return list(reversed(sorted(drops)))
 
 
 def fort_add_drop(session, *, user, system, amount):
@@ -350,12 +326,13 @@ def fort_add_drop(session, *, user, system, amount):
     drop.amount = max(0, drop.amount + amount)
     system.fort_status = system.fort_status + amount
     session.commit()
+    cogdb.fort.refresh_systems([system.name])
     log.info('ADD_DROP - After: Drop %s, System %s', drop, system)
 
     return drop
 
 
-def fort_order_get(_):
+def fort_order_get(session):
     """
     Get the order of systems to fort.
 
@@ -363,16 +340,15 @@ def fort_order_get(_):
 
     Returns: [] if no systems set, else a list of System objects.
     """
-    systems = []
-    dsession = cogdb.Session()  # Isolate deletions, feels a bit off though
-    for fort_order in dsession.query(FortOrder).order_by(FortOrder.order):
-        system = dsession.query(System).filter_by(name=fort_order.system_name).one()
-        if system.is_fortified or system.missing < DEFER_MISSING:
-            dsession.delete(fort_order)
-        else:
-            systems += [system]
+    systems, finished = cogdb.fort.get().ordered()
+    if finished:
+        with cogdb.session_scope() as dsession:  # Isolate deletions from caller's session
+            dsession.query(FortOrder).\
+                filter(FortOrder.system_name.in_(finished)).\
+                delete(synchronize_session=False)
+            dsession.commit()
+        cogdb.fort.refresh_order()
 
-    dsession.commit()
     return systems
 
 
@@ -394,6 +370,8 @@ def fort_order_set(session, system_names):
     except cog.exc.NoMatch:
         session.rollback()
         raise cog.exc.InvalidCommandArgs("System '{}' not found in fort systems.".format(system_name))
+    finally:
+        cogdb.fort.refresh_order()
 
 
 def fort_order_drop(session, systems):
@@ -409,6 +387,164 @@ def fort_order_drop(session, systems):
             pass
 
     session.commit()
+    cogdb.fort.refresh_order()
+
+
+def column_props(mapper):
+    """
+    Returns: The column properties of mapper backed by a table column, computed ones skipped.
+    """
+    return [prop for prop in mapper.column_attrs
+            if isinstance(prop.columns[0], sqla.Column)]  # Not computed, i.e. merits_sum
+
+
+def value_columns(cls):
+    """
+    Returns: A list of (key, scalar default, is string) for every column of ORM class cls.
+             Mappers never change, computed once per class.
+    """
+    try:
+        return VALUE_COLUMNS[cls]
+    except KeyError:
+        pass
+
+    found = []
+    for prop in column_props(sqla.inspect(cls)):
+        column = prop.columns[0]
+        default = None
+        if column.default is not None and column.default.is_scalar:
+            default = column.default.arg
+        found += [(prop.key, default, isinstance(column.type, sqla.String))]
+    VALUE_COLUMNS[cls] = found
+
+    return found
+
+
+def identity_clause(mapper):
+    """
+    Returns: The clause selecting the rows of mapper in a table shared by single
+             table inheritance, None if the table is not shared.
+    """
+    if not mapper.single:
+        return None
+
+    identities = [sub.polymorphic_identity for sub in mapper.self_and_descendants]
+    return mapper.polymorphic_on.in_(identities)
+
+
+def row_values(obj):
+    """
+    Returns: A dict of the column values of an ORM object as the db would store them.
+             Unset scalar defaults are filled in and string columns hold strings.
+    """
+    values = {}
+    for key, default, is_string in value_columns(obj.__class__):
+        value = getattr(obj, key)
+        if value is None:
+            value = default
+        if value is not None and is_string:
+            value = str(value)
+        values[key] = value
+
+    return values
+
+
+def bulk_delete(session, cls):
+    """
+    Delete all rows of cls with a single DELETE, bypassing the ORM.
+    A class sharing its table with other classes only deletes its own rows.
+    """
+    mapper = sqla.inspect(cls)
+    delete = mapper.local_table.delete()
+    clause = identity_clause(mapper)
+    if clause is not None:
+        delete = delete.where(clause)
+    session.execute(delete)
+
+
+def table_rows(session, cls):
+    """
+    Read all rows of cls with a single SELECT of its columns, bypassing the ORM.
+    A class sharing its table with other classes only reads its own rows.
+
+    Returns: A list of dicts of column values, keyed like row_values.
+    """
+    mapper = sqla.inspect(cls)
+    props = column_props(mapper)
+    select = sqla.select([prop.columns[0] for prop in props])
+    clause = identity_clause(mapper)
+    if clause is not None:
+        select = select.where(clause)
+
+    keys = [prop.key for prop in props]
+    return [dict(zip(keys, row)) for row in session.execute(select).fetchall()]
+
+
+def bulk_insert(session, objs):
+    """
+    Insert ORM objects with one executemany INSERT per table, bypassing the ORM.
+    The objects are not added to the session.
+    """
+    tables = collections.OrderedDict()
+    for obj in objs:
+        tables.setdefault(sqla.inspect(obj).mapper.local_table, []).append(row_values(obj))
+
+    for table, rows in tables.items():
+        session.execute(table.insert(), rows)
+
+
+def get_sheet_record(session, sheet_id, page):
+    """
+    Returns: The SheetRecord of the sheet tab, None if never scanned.
+    """
+    return session.query(SheetRecord).get((sheet_id, page))
+
+
+def diff_rows(session, cls, parsed, key):
+    """
+    Plan the changes that bring the rows of cls in line with parsed rows, matched by key.
+    A new row keeps its parsed id unless taken in the table, then the next free id is used.
+    Current rows are read with table_rows, no ORM objects are built.
+
+    Args:
+        session: The session to query current rows.
+        cls: The ORM class, current rows are all those queried by it.
+        parsed: The row values of the objects parsed from the sheet, see row_values.
+                Every row is modified in place to take the id it will have.
+        key: Function returning the natural key of row values.
+
+    Returns: (ids, inserts, updates, deletes)
+        ids: Dict of natural key -> id of every parsed row after the changes.
+        inserts: The rows to insert as dicts.
+        updates: A list of (id, dict of changed values).
+        deletes: The ids to delete.
+    """
+    rows = table_rows(session, cls)
+    current = {key(row): row for row in rows}
+    if identity_clause(sqla.inspect(cls)) is None:
+        taken = {row['id'] for row in rows}
+    else:  # Other classes sharing the table hold ids too
+        taken = {row[0] for row in
+                 session.execute(sqla.select([cls.__table__.c.id])).fetchall()}
+    next_id = max(taken | {0}) + 1
+    ids, inserts, updates = {}, [], []
+    for row in parsed:
+        old = current.pop(key(row), None)
+        if old:
+            row['id'] = old['id']
+            if row != old:  # Most rows are unchanged, compare whole rows first
+                updates += [(old['id'], {col: value for col, value in row.items()
+                                         if old[col] != value})]
+        else:
+            if row['id'] is None or row['id'] in taken:
+                row['id'] = next_id
+            taken.add(row['id'])
+            next_id = max(next_id, row['id'] + 1)
+            inserts += [row]
+
+        ids[key(row)] = row['id']
+
+    return ids, inserts, updates, [row['id'] for row in current.values()]
 
 
 class SheetScanner(object):
@@ -416,11 +552,12 @@ class SheetScanner(object):
     Scan a sheet to populate the database with information
     Also provide methods to update the sheet with new data
 
-    Process whole sheets at a time with gsheet.whole_sheet()
+    The first scan fetches the whole sheet with gsheet.whole_sheet(), later scans
+    only the regions parsed within the extent last seen, see fetch_cells.
 
     Important Note:
-        Calls to modify the sheet should be asynchronous.
-        Register them as futures and allow them to finish without waiting on.
+        The *_cells methods only build the cells to modify, they are queued on
+        the cog.jobs.WriteBehind of the sheet, see cog.actions.queue_cells and write_cells.
     """
     def __init__(self, gsheet, user_args, db_classes):
         """
@@ -433,9 +570,14 @@ class SheetScanner(object):
         self.users_args = user_args
         self.db_classes = db_classes
         self.cells = None
+        self.written = {}
         self.user_col = None
         self.user_row = None
         self.system_col = None
+        self.first_col = 'D'
+        self.bounds = None
+        self.fetch_stats = None
+        self.version = None
 
     @property
     def gsheet(self):
@@ -444,27 +586,216 @@ class SheetScanner(object):
         """
         # FIXME: Testing hack, I'm open to suggestions.
         if isinstance(self._gsheet, type({})):
-            paths = cog.util.get_config('paths')
-            self._gsheet = cog.sheets.GSheet(self._gsheet,
-                                             cog.util.rel_to_abs(paths['json']),
-                                             cog.util.rel_to_abs(paths['token']))
+            self._gsheet = self.create_gsheet()
 
         return self._gsheet
 
+    def create_gsheet(self):
+        """
+        Returns: A new GSheet from the sheet config this scanner was created with.
+        """
+        paths = cog.util.get_config('paths')
+        return cog.sheets.GSheet(self._gsheet,
+                                 cog.util.rel_to_abs(paths['json']),
+                                 cog.util.rel_to_abs(paths['token']))
+
+    def unchanged(self):
+        """
+        Check with a metadata request if the sheet is still at the version last scanned.
+        The scanner itself is left as is, it must still pickle for jobs. Blocking.
+
+        Returns: True only if the version matches the SheetRecord, a failed check is False.
+        """
+        gsheet = self.create_gsheet() if isinstance(self._gsheet, type({})) else self._gsheet
+        session = cogdb.Session()
+        try:
+            version = gsheet.version()
+            record = get_sheet_record(session, gsheet.sheet_id, gsheet.page)
+        except Exception as exc:  # pylint: disable=broad-except
+            logging.getLogger('cogdb.query').warning('SCANNER - Version check failed: %s', exc)
+            return False
+        finally:
+            session.close()
+
+        return record is not None and record.version == version
+
+    def record_scan(self, session):
+        """
+        Record the version and bounds of the sheet scanned, caller commits.
+        Nothing is recorded when the version could not be fetched.
+        """
+        if self.version is None:
+            return
+
+        session.merge(SheetRecord(sheet_id=self.gsheet.sheet_id, page=self.gsheet.page,
+                                  version=self.version, cols=self.bounds[0],
+                                  rows=self.bounds[1]))
+
+    def cell_ranges(self):
+        """
+        Returns: The A1 ranges parsed, the cry and user columns, the system headers
+                 and the merit grid within bounds.
+                 Users and headers are open ended, any growth of the sheet shows there.
+        """
+        last_col = cog.sheets.index_to_column(self.bounds[0] - 1)
+        last_row = self.bounds[1]
+        cry_col = cog.sheets.Column(self.user_col).prev()
+
+        return [
+            '!{}{}:{}'.format(cry_col, self.user_row, self.user_col),
+            '!{}1:ZZ{}'.format(self.first_col, self.user_row - 1),
+            '!{}{}:{}{}'.format(self.first_col, self.user_row, last_col, last_row),
+        ]
+
+    def fetch_cells(self):
+        """
+        Fetch the cells to parse, column major like gsheet.whole_sheet().
+
+        The version of the sheet is fetched first, edits made during the scan change it.
+        Once the extent of the sheet is known, only cell_ranges are fetched in one batch_get.
+        Bounds are kept in the SheetRecord, scans run in fresh job processes.
+        Should users or systems reach the bounds the sheet grew, the whole sheet is fetched.
+        The payload size and latency are kept in fetch_stats.
+        The cells written since the last fetch are forgotten, see write_cells.
+        """
+        log = logging.getLogger('cogdb.query')
+        self.written = {}
+        try:
+            self.version = self.gsheet.version()
+        except Exception as exc:  # pylint: disable=broad-except
+            log.warning('SCANNER - Version unavailable, scan not recorded: %s', exc)
+            self.version = None
+
+        if not self.bounds and self.version is not None:
+            session = cogdb.Session()
+            try:
+                record = get_sheet_record(session, self.gsheet.sheet_id, self.gsheet.page)
+            finally:
+                session.close()
+            if record:
+                self.bounds = (record.cols, record.rows)
+
+        start = time.time()
+        fetched = []
+        cells = None
+
+        if self.bounds:
+            cell_ranges = self.cell_ranges()
+            fetched += [self.gsheet.batch_get(cell_ranges, dim='COLUMNS')]
+            cells = cog.sheets.merge_ranges(cell_ranges, fetched[-1])
+            if len(cells) >= self.bounds[0] or \
+                    max([len(col) for col in cells] + [0]) >= self.bounds[1]:
+                log.info('SCANNER - Sheet grew past %s, fetching whole sheet.', self.bounds)
+                cells = None
+
+        if cells is None:
+            cells = self.gsheet.whole_sheet()
+            fetched += [cells]
+
+        self.bounds = (len(cells) + SCAN_MARGIN[0],
+                       max([len(col) for col in cells] + [0]) + SCAN_MARGIN[1])
+        self.fetch_stats = {
+            'calls': len(fetched),
+            'bytes': sum(len(json.dumps(values)) for values in fetched),
+            'seconds': time.time() - start,
+        }
+        log.info('SCANNER - Fetched %d bytes in %d calls, %.2fs.', self.fetch_stats['bytes'],
+                 self.fetch_stats['calls'], self.fetch_stats['seconds'])
+
+        return cells
+
     def drop_entries(self, session):
         """
         Before scan, drop the matching entries in the table.
+        One DELETE per class, caller commits.
         """
         for cls in self.db_classes:
-            for matched in session.query(cls):
-                session.delete(matched)
+            bulk_delete(session, cls)
 
-    def scan(self):
+    def scan(self, diff=False):
         """
         Main function, scan the sheet into the database.
+
+        Args:
+            diff: If True, only write rows that changed. Else drop and reload all entries,
+                  the default as a full reload is as fast, see extras/bench_scan.py.
+
+        Returns: The changes, see diff_entries.
         """
         raise NotImplementedError
 
+    def scanned(self, changes):
+        """
+        Called in the bot process when a worker finished a scan of this sheet.
+        Drop anything cached from before the scan.
+
+        Args:
+            changes: The changes returned by scan.
+        """
+        pass
+
+    def flush_entries(self, systems, users, merits, diff=False):
+        """
+        Write the parsed systems, users and merits to the database.
+
+        Returns: The changes, see diff_entries.
+        """
+        session = cogdb.Session()
+        try:
+            if diff:
+                changes = self.diff_entries(session, systems, users, merits)
+            else:
+                self.drop_entries(session)
+                bulk_insert(session, systems + users)
+                bulk_insert(session, merits)
+                changes = [[cls.__tablename__, len(objs), 0, 0] for cls, objs in
+                           zip(self.db_classes, [merits, systems, users])]
+            self.record_scan(session)
+            session.commit()
+        finally:
+            session.close()
+
+        logging.getLogger('cogdb.query').info('SCANNER - Changes %s', str(changes))
+        return changes
+
+    def diff_entries(self, session, systems, users, merits):
+        """
+        Bring the db in line with the parsed entries, matching rows by natural key.
+        Systems match by name, users by name and merits by their system and user.
+        Only the needed INSERT/UPDATE/DELETE statements are issued, caller commits.
+
+        Returns: [[table, inserted, updated, deleted], ...] for merits, systems and users.
+        """
+        merit_cls, system_cls, user_cls = self.db_classes
+        sys_key = operator.itemgetter('name')
+        user_key = operator.itemgetter('name', 'faction')
+        merit_key = operator.itemgetter('system_id', 'user_id')
+
+        sys_rows = [row_values(obj) for obj in systems]
+        user_rows = [row_values(obj) for obj in users]
+        sys_plan = diff_rows(session, system_cls, sys_rows, sys_key)
+        user_plan = diff_rows(session, user_cls, user_rows, user_key)
+        sys_ids = {obj.id: sys_plan[0][sys_key(row)] for obj, row in zip(systems, sys_rows)}
+        user_ids = {obj.id: user_plan[0][user_key(row)] for obj, row in zip(users, user_rows)}
+        merit_rows = [row_values(obj) for obj in merits]
+        for row in merit_rows:
+            row['system_id'], row['user_id'] = sys_ids[row['system_id']], user_ids[row['user_id']]
+        merit_plan = diff_rows(session, merit_cls, merit_rows, merit_key)
+
+        plans = list(zip(self.db_classes, [merit_plan, sys_plan, user_plan]))
+        for cls, plan in plans:
+            if plan[3]:
+                session.execute(cls.__table__.delete().where(cls.__table__.c.id.in_(plan[3])))
+        for cls, plan in reversed(plans):
+            table = cls.__table__
+            for row_id, values in plan[2]:
+                session.execute(table.update().where(table.c.id == row_id).values(**values))
+            if plan[1]:
+                session.execute(table.insert(), plan[1])
+
+        return [[cls.__tablename__, len(plan[1]), len(plan[2]), len(plan[3])]
+                for cls, plan in plans]
+
     def users(self, cls, faction, first_id=1):
         """
         Scan the users in the sheet and return SUser objects.
@@ -474,33 +805,63 @@ class SheetScanner(object):
             faction: The faction owning the sheet.
         """
         log = logging.getLogger('cogdb.query')
+        debug = log.isEnabledFor(logging.DEBUG)
         row = self.user_row - 1
         user_column = cog.sheets.column_to_index(self.user_col)
-        cry_column = user_column - 1
+        try:
+            crys = self.cells[user_column - 1]
+        except IndexError:
+            crys = []
 
         found = []
+        rows = {}  # All users share cls and faction, the name alone collides
         cnt = first_id
         for user in self.cells[user_column][row:]:
             row += 1
-            log.debug('SCANNER - row %d -> user %s', row, user)
-
             if user == '':  # Users sometimes miss an entry
                 continue
 
-            try:
-                cry = self.cells[cry_column][row - 1]
-            except IndexError:
-                cry = ''
+            if user in rows:
+                sheet_type = 'Fort' if 'Fort' in self.__class__.__name__ else 'Undermining'
+                raise cog.exc.NameCollisionError(sheet_type, user, [rows[user], row])
 
-            sheet_user = cls(id=cnt, name=user, faction=faction, row=row, cry=cry)
+            cry = crys[row - 1] if row <= len(crys) else ''
+            found.append(cls(id=cnt, name=user, faction=faction, row=row, cry=cry))
+            rows[user] = row
             cnt += 1
-            if sheet_user in found:
-                rows = [other.row for other in found if other == sheet_user] + [row]
-                sheet_type = 'Fort' if 'Fort' in self.__class__.__name__ else 'Undermining'
-                raise cog.exc.NameCollisionError(sheet_type, sheet_user.name, rows)
+            if debug:
+                log.debug('SCANNER - ADDING row %d -> user %s, cry: %s', row, user, cry)
+
+        log.info('SCANNER - Found %d users', len(found))
+        return found
+
+    def column_merits(self, sheet_col, users, offset=0):
+        """
+        Parse the merits of users in a column, the whole column is converted at once.
+        Empty cells are skipped, the first user past the end of the column ends the scan.
+
+        Args:
+            sheet_col: The column of the system.
+            users: The SheetRows parsed from sheet.
+            offset: Columns right of sheet_col to parse instead.
+
+        Returns: [(user, amount), ...]
+        """
+        try:
+            column = self.cells[cog.sheets.column_to_index(sheet_col) + offset]
+        except IndexError:
+            return []
+
+        found = []
+        amounts = cogdb.schema.parse_ints(column)
+        for user in users:
+            try:
+                amount = amounts[user.row - 1]
+            except IndexError:
+                break  # No more amounts in column
 
-            found.append(sheet_user)
-            log.info('SCANNER - ADDING row %d -> user %s, cry: %s', row, user, cry)
+            if amount is not None:  # Some rows just placeholders if empty
+                found.append((user, amount))
 
         return found
 
@@ -516,14 +877,33 @@ class SheetScanner(object):
         """
         raise NotImplementedError
 
-    def update_sheet_user(self, row, cry, name):
+    def write_cells(self, cells):
+        """
+        Write a dict of A1 cell -> value to the sheet in one batch update.
+        Cells are merged into rectangles, only gaps the bot wrote since the last scan
+        are filled. See cog.sheets.plan_writes.
+
+        The scanner lives on in its worker between jobs, cells written are kept
+        in written and the cells of the last scan.
+        """
+        cell_ranges, n_vals = cog.sheets.plan_writes(cells, self.written)
+        self.gsheet.batch_update(cell_ranges, n_vals)
+
+        for cell, value in cells.items():
+            col, row = cog.sheets.parse_cell(cell)
+            self.written[(col, row)] = value
+            try:
+                self.cells[col][row] = value
+            except (IndexError, TypeError):
+                pass
+
+    def sheet_user_cells(self, row, cry, name):
         """
-        Update the user cry and name on the given row.
+        Returns: The cells of the user cry and name on the given row.
         """
         col1 = cog.sheets.Column(self.user_col).prev()
-        cell_range = '!{col1}{row}:{col2}{row}'.format(row=row, col1=col1,
-                                                       col2=self.user_col)
-        return self.gsheet.update(cell_range, [[cry, name]])
+        return collections.OrderedDict([('{}{}'.format(col1, row), cry),
+                                        ('{}{}'.format(self.user_col, row), name)])
 
 
 class FortScanner(SheetScanner):
@@ -540,26 +920,30 @@ class FortScanner(SheetScanner):
         self.user_col = 'B'
         self.user_row = 11
 
-    def scan(self):
+    def scan(self, diff=False):
         """
         Main function, scan the sheet into the database.
         """
-        self.cells = self.gsheet.whole_sheet()
+        self.cells = self.fetch_cells()
         self.system_col = self.find_system_column()
 
         systems = self.fort_systems() + self.prep_systems()
         users = self.users(*self.users_args, first_id=1)
         merits = self.merits(systems, users)
 
-        session = cogdb.Session()
-        self.drop_entries(session)
-        session.commit()
-        session.add_all(systems + users)
-        session.commit()
-        session.add_all(merits)
-        session.commit()
+        changes = self.flush_entries(systems, users, merits, diff)
+        cogdb.fort.invalidate()
+
+        return changes
 
-        return True
+    def scanned(self, changes):
+        """
+        The fort state is reloaded and the system names reindexed after a scan
+        that changed anything.
+        """
+        if any(sum(change[1:]) for change in changes or []):
+            cogdb.fort.invalidate()
+            cogdb.session_call(cogdb.Session, cogdb.names.update_sheet, cogdb.names.FORT)
 
     def systems(self):
         return self.fort_systems() + self.prep_systems()
@@ -576,10 +960,10 @@ class FortScanner(SheetScanner):
 
         try:
             for col in self.cells[first_system:]:
-                log.debug('FSYSSCAN - Cells: %s', str(col[0:10]))
+                log.debug('FSYSSCAN - Cells: %s', col[0:10])
                 kwargs = kwargs_fort_system(col, order, str(cell_column))
                 kwargs['id'] = order
-                log.debug('FSYSSCAN - Kwargs: %s', str(kwargs))
+                log.debug('FSYSSCAN - Kwargs: %s', kwargs)
 
                 found.append(System(**kwargs))
                 log.info('FSYSSCAN - System Added: %s', found[-1])
@@ -605,10 +989,10 @@ class FortScanner(SheetScanner):
 
         try:
             for col in self.cells[first_prep:first_system]:
-                log.debug('PSYSSCAN - Cells: %s', str(col[0:10]))
+                log.debug('PSYSSCAN - Cells: %s', col[0:10])
                 kwargs = kwargs_fort_system(col, order, str(cell_column))
                 kwargs['id'] = 1000 + order
-                log.debug('PSYSSCAN - Kwargs: %s', str(kwargs))
+                log.debug('PSYSSCAN - Kwargs: %s', kwargs)
                 order = order + 1
                 cell_column.next()
 
@@ -632,27 +1016,18 @@ class FortScanner(SheetScanner):
             users: The list of Users in order the order entered in the sheet.
         """
         log = logging.getLogger('cogdb.query')
+        debug = log.isEnabledFor(logging.DEBUG)
         found = []
 
         cnt = 1
         for system in systems:
-            sys_ind = cog.sheets.column_to_index(system.sheet_col)
-            try:
-                for user in users:
-                    amount = self.cells[sys_ind][user.row - 1]
-
-                    if isinstance(amount, type('')):
-                        amount = amount.strip()
-                    if amount == '':  # Some rows just placeholders if empty
-                        continue
-
-                    found.append(Drop(id=cnt, user_id=user.id, system_id=system.id,
-                                      amount=cogdb.schema.parse_int(amount)))
-                    cnt += 1
-                    log.info('DROPSCAN - Adding: %s', found[-1])
-            except IndexError:
-                pass  # No more amounts in column
+            for user, amount in self.column_merits(system.sheet_col, users):
+                found.append(Drop(id=cnt, user_id=user.id, system_id=system.id, amount=amount))
+                cnt += 1
+                if debug:
+                    log.debug('DROPSCAN - Adding: %s', found[-1])
 
+        log.info('DROPSCAN - Found %d drops', len(found))
         return found
 
     def find_system_column(self):
@@ -666,31 +1041,24 @@ class FortScanner(SheetScanner):
         if not self.cells:
             raise cog.exc.SheetParsingError("No cells set to parse.")
 
-        col_count = cog.sheets.Column()
-        for column in self.cells:
-            try:
-                if column[9] in HUDSON_CONTROLS:
-                    return str(col_count)
-
-                col_count.next()
-            except IndexError:
-                pass
+        for ind, column in enumerate(self.cells):
+            if len(column) > 9 and column[9] in HUDSON_CONTROLS:
+                return cog.sheets.index_to_column(ind)
 
         raise cog.exc.SheetParsingError("Unable to determine system column.")
 
-    def update_drop(self, system_col, user_row, amount):
+    def drop_cells(self, system_col, user_row, amount):
         """
-        Update a drop to the sheet.
+        Returns: The cell of a drop.
         """
-        cell_range = '!{col}{row}:{col}{row}'.format(col=system_col, row=user_row)
-        self.gsheet.update(cell_range, [[amount]])
+        return {'{}{}'.format(system_col, user_row): amount}
 
-    def update_system(self, col, fort_status, um_status):
+    def system_cells(self, col, fort_status, um_status):
         """
-        Update the system column of the sheet.
+        Returns: The cells of the system status.
         """
-        cell_range = '!{col}{start}:{col}{end}'.format(col=col, start=6, end=7)
-        self.gsheet.update(cell_range, [[fort_status, um_status]], dim='COLUMNS')
+        return collections.OrderedDict([('{}6'.format(col), fort_status),
+                                        ('{}7'.format(col), um_status)])
 
 
 class UMScanner(SheetScanner):
@@ -707,25 +1075,24 @@ class UMScanner(SheetScanner):
         self.user_col = 'B'
         self.user_row = 14
 
-    def scan(self):
+    def scan(self, diff=False):
         """
         Main function, scan the sheet into the database.
         """
-        self.cells = self.gsheet.whole_sheet()
+        self.cells = self.fetch_cells()
 
         systems = self.systems()
         users = self.users(*self.users_args, first_id=1001)
         merits = self.merits(systems, users)
 
-        session = cogdb.Session()
-        self.drop_entries(session)
-        session.commit()
-        session.add_all(systems + users)
-        session.commit()
-        session.add_all(merits)
-        session.commit()
+        return self.flush_entries(systems, users, merits, diff)
 
-        return True
+    def scanned(self, changes):
+        """
+        The system names are reindexed after a scan that changed anything.
+        """
+        if any(sum(change[1:]) for change in changes or []):
+            cogdb.session_call(cogdb.Session, cogdb.names.update_sheet, cogdb.names.UM)
 
     def systems(self):
         """
@@ -740,11 +1107,11 @@ class UMScanner(SheetScanner):
             cnt = 1
             while True:
                 col = cog.sheets.column_to_index(str(cell_column))
-                log.debug('UMSYSSCAN - Cells: %s', str(col))
+                log.debug('UMSYSSCAN - Cells: %s', col)
                 kwargs = kwargs_um_system(self.cells[col:col + 2], str(cell_column))
                 kwargs['id'] = cnt
                 cnt += 1
-                log.debug('UMSYSSCAN - Kwargs: %s', str(kwargs))
+                log.debug('UMSYSSCAN - Kwargs: %s', kwargs)
 
                 cls = kwargs.pop('cls')
                 found.append(cls(**kwargs))
@@ -765,33 +1132,22 @@ class UMScanner(SheetScanner):
             holds: The partially finished Holds.
         """
         log = logging.getLogger('cogdb.query')
+        debug = log.isEnabledFor(logging.DEBUG)
 
         for system in systems:
-            col_ind = cog.sheets.column_to_index(system.sheet_col)
-
-            try:
-                cnt = len(holds) + 1
-                for user in users:
-                    held = self.cells[col_ind][user.row - 1]
-
-                    if isinstance(held, type('')):
-                        held = held.strip()
-                    if held == '':
-                        continue
-
-                    key = '{}_{}'.format(system.id, user.id)
-                    hold = holds.get(key, Hold(id=cnt, user_id=user.id, system_id=system.id,
-                                               held=0, redeemed=0))
-                    if hold.id == cnt:
-                        cnt += 1
-                    hold.held += cogdb.schema.parse_int(held)
-
-                    holds[key] = hold
-                    log.info('HOLDSCAN - Held merits: %s %s', key, hold)
-
-            except IndexError:
-                pass  # No more in column
+            cnt = len(holds) + 1
+            for user, held in self.column_merits(system.sheet_col, users):
+                key = (system.id, user.id)
+                try:
+                    holds[key].held += held
+                except KeyError:
+                    holds[key] = Hold(id=cnt, user_id=user.id, system_id=system.id,
+                                      held=held, redeemed=0)
+                    cnt += 1
+                if debug:
+                    log.debug('HOLDSCAN - Held merits: %s %s', key, holds[key])
 
+        log.info('HOLDSCAN - Found %d holds', len(holds))
         return holds
 
     def redeemed_merits(self, systems, users, holds):
@@ -804,31 +1160,22 @@ class UMScanner(SheetScanner):
             holds: The partially finished Holds.
         """
         log = logging.getLogger('cogdb.query')
-        for system in systems:
-            col_ind = cog.sheets.column_to_index(system.sheet_col) + 1
+        debug = log.isEnabledFor(logging.DEBUG)
 
-            try:
-                cnt = len(holds) + 1
-                for user in users:
-                    redeemed = self.cells[col_ind][user.row - 1]
-
-                    if isinstance(redeemed, type('')):
-                        redeemed = redeemed.strip()
-                    if redeemed == '':
-                        continue
-
-                    key = '{}_{}'.format(system.id, user.id)
-                    hold = holds.get(key, Hold(id=cnt, user_id=user.id, system_id=system.id,
-                                               held=0, redeemed=0))
-                    if hold.id == cnt:
-                        cnt += 1
-                    hold.redeemed += cogdb.schema.parse_int(redeemed)
-
-                    holds[key] = hold
-                    log.info('HOLDSCAN - Redeemed merits: %s %s', key, hold)
-            except IndexError:
-                pass  # No more in column
+        for system in systems:
+            cnt = len(holds) + 1
+            for user, redeemed in self.column_merits(system.sheet_col, users, offset=1):
+                key = (system.id, user.id)
+                try:
+                    holds[key].redeemed += redeemed
+                except KeyError:
+                    holds[key] = Hold(id=cnt, user_id=user.id, system_id=system.id,
+                                      redeemed=redeemed, held=0)
+                    cnt += 1
+                if debug:
+                    log.debug('HOLDSCAN - Redeemed merits: %s %s', key, holds[key])
 
+        log.info('HOLDSCAN - Found %d holds', len(holds))
         return holds
 
     def merits(self, systems, users):
@@ -844,22 +1191,21 @@ class UMScanner(SheetScanner):
         self.redeemed_merits(systems, users, holds)
         return list(holds.values())
 
-    # Calls to modify the sheet All asynchronous, register them as futures and move on.
-    def update_hold(self, system_col, user_row, held, redeemed):
+    def hold_cells(self, system_col, user_row, held, redeemed):
         """
-        Update a hold on the sheet.
+        Returns: The cells of a hold, held and redeemed are side by side.
         """
         col2 = cog.sheets.Column(system_col).next()
-        cell_range = '!{col1}{row1}:{col2}{row2}'.format(col1=system_col, col2=col2,
-                                                         row1=user_row, row2=user_row + 1)
-        self.gsheet.update(cell_range, [[held, redeemed]])
+        return collections.OrderedDict([('{}{}'.format(system_col, user_row), held),
+                                        ('{}{}'.format(col2, user_row), redeemed)])
 
-    def update_system(self, col, progress_us, progress_them, map_offset):
+    def system_cells(self, col, progress_us, progress_them, map_offset):
         """
-        Update the system column of the sheet.
+        Returns: The cells of the system progress.
         """
-        cell_range = '!{col}{start}:{col}{end}'.format(col=col, start=10, end=13)
-        self.gsheet.update(cell_range, [[progress_us, progress_them, 'Hold Merits', map_offset]], dim='COLUMNS')
+        values = [progress_us, progress_them, 'Hold Merits', map_offset]
+        return collections.OrderedDict([('{}{}'.format(col, row), value)
+                                        for row, value in zip(range(10, 14), values)])
 
 
 class KOSScanner(SheetScanner):
@@ -879,7 +1225,7 @@ class KOSScanner(SheetScanner):
         """
         Main function, scan the sheet into the database.
         """
-        self.cells = self.gsheet.whole_sheet(dim='ROWS')
+        self.cells = self.gsheet.get('!A:D', dim='ROWS')
         kos_rows = self.parse_rows()
         no_dupes = {getattr(obj, 'cmdr'): obj for obj in kos_rows}
         dupes = list(set(kos_rows) - set(no_dupes.values()))
@@ -888,12 +1234,14 @@ class KOSScanner(SheetScanner):
             raise cog.exc.SheetParsingError("Duplicate CMDRs in KOS sheet.\n\n" + '\n'.join(cmdrs))
 
         session = cogdb.Session()
-        self.drop_entries(session)
-        session.commit()
-        session.add_all(kos_rows)
-        session.commit()
+        try:
+            self.drop_entries(session)
+            bulk_insert(session, kos_rows)
+            session.commit()
+        finally:
+            session.close()
 
-        return True
+        return [[KOS.__tablename__, len(kos_rows), 0, 0]]
 
     def parse_rows(self):
         rows = []
@@ -949,8 +1297,13 @@ def um_find_system(session, system_name):
     try:
         return session.query(SystemUM).filter_by(name=system_name).one()
     except (sqla_oexc.NoResultFound, sqla_oexc.MultipleResultsFound):
-        systems = session.query(SystemUM).all()
-        return fuzzy_find(system_name, systems, 'name')
+        systems = session.query(SystemUM).order_by(*UM_ORDER).all()
+        try:
+            return fuzzy_find(system_name, systems, 'name')
+        except cog.exc.NoMatch as exc:
+            cogdb.names.ensure_sheet(session, cogdb.names.UM)
+            exc.suggestions = cogdb.names.suggest(system_name, [cogdb.names.UM])
+            raise
 
 
 def um_get_systems(session, exclude_finished=True):
@@ -960,7 +1313,7 @@ def um_get_systems(session, exclude_finished=True):
     kwargs:
         finished: Return just the finished targets.
     """
-    systems = session.query(SystemUM).all()
+    systems = session.query(SystemUM).order_by(*UM_ORDER).all()
     if exclude_finished:
         systems = [system for system in systems if not system.is_undermined]
 
@@ -1037,13 +1390,16 @@ def um_all_held_merits(session):
     ]
     """
     c_dict = {}
-    for merit in session.query(Hold).filter(Hold.held > 0).order_by(Hold.system_id).all():
+    query = session.query(Hold).\
+        options(sqla_orm.joinedload(Hold.user), sqla_orm.joinedload(Hold.system)).\
+        filter(Hold.held > 0).order_by(Hold.system_id)
+    for merit in query:
         try:
             c_dict[merit.user.name][merit.system.name] = merit
         except KeyError:
             c_dict[merit.user.name] = {merit.system.name: merit}
 
-    systems = session.query(SystemUM).order_by(SystemUM.id).all()
+    systems = session.query(SystemUM).order_by(*UM_ORDER).all()
     system_names = [sys.name for sys in systems]
     rows = []
     for cmdr in c_dict:
@@ -1115,14 +1471,13 @@ def remove_role_perm(session, cmd, server_name, role_name):
         raise cog.exc.InvalidCommandArgs("Role permission does not exist.")
 
 
-def check_perms(msg, args):
+def check_perms(session, msg, args):
     """
     Check if a user is authorized to issue this command.
     Checks will be made against channel and user roles.
 
     Raises InvalidPerms if any permission issue.
     """
-    session = cogdb.Session()
     check_channel_perms(session, args.cmd, msg.channel.server.name, msg.channel.name)
     check_role_perms(session, args.cmd, msg.channel.server.name, msg.author.roles)
 
@@ -1135,8 +1490,10 @@ def check_channel_perms(session, cmd, server_name, channel_name):
 
     Raises InvalidPerms if fails permission check.
     """
-    channels = [perm.channel for perm in session.query(ChannelPerm).
-                filter_by(cmd=cmd, server=server_name)]
+    query = cogdb.BAKERY(lambda session: session.query(ChannelPerm.channel))
+    query += lambda q: q.filter(ChannelPerm.cmd == sqla.bindparam('cmd'),
+                                ChannelPerm.server == sqla.bindparam('server'))
+    channels = [perm[0] for perm in query(session).params(cmd=cmd, server=server_name)]
     if channels and channel_name not in channels:
         raise cog.exc.InvalidPerms("The '{}' command is not permitted on this channel.".format(
             cmd.lower()))
@@ -1150,8 +1507,10 @@ def check_role_perms(session, cmd, server_name, member_roles):
 
     Raises InvalidPerms if fails permission check.
     """
-    perm_roles = set([perm.role for perm in session.query(RolePerm).
-                      filter_by(cmd=cmd, server=server_name)])
+    query = cogdb.BAKERY(lambda session: session.query(RolePerm.role))
+    query += lambda q: q.filter(RolePerm.cmd == sqla.bindparam('cmd'),
+                                RolePerm.server == sqla.bindparam('server'))
+    perm_roles = set([perm[0] for perm in query(session).params(cmd=cmd, server=server_name)])
     member_roles = set([role.name for role in member_roles])
     if perm_roles and len(member_roles - perm_roles) == len(member_roles):
         raise cog.exc.InvalidPerms("You do not have the roles for the command.")
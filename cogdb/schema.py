@@ -392,6 +392,29 @@ class KOS(Base):
         return 'FRIENDLY' if self.is_friendly else 'KILL'
 
 
+class SheetRecord(Base):
+    """
+    Record of the last scan of a sheet tab, the version scanned and the extent of its cells.
+    """
+    __tablename__ = 'sheet_records'
+
+    sheet_id = sqla.Column(sqla.String(LEN_NAME), primary_key=True)
+    page = sqla.Column(sqla.String(LEN_NAME), primary_key=True)
+    version = sqla.Column(sqla.BigInteger, nullable=False)
+    cols = sqla.Column(sqla.Integer, default=0)
+    rows = sqla.Column(sqla.Integer, default=0)
+
+    def __repr__(self):
+        keys = ['sheet_id', 'page', 'version', 'cols', 'rows']
+        kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
+
+        return "SheetRecord({})".format(', '.join(kwargs))
+
+    def __eq__(self, other):
+        return isinstance(other, SheetRecord) and (self.sheet_id, self.page) == (
+            other.sheet_id, other.page)
+
+
 class System(Base):
     """
     Represent a single system for fortification.
@@ -452,7 +475,13 @@ class System(Base):
 
     @property
     def cmdr_merits(self):
-        """ Total merits dropped by cmdrs """
+        """
+        Total merits dropped by cmdrs.
+        Systems queried carry the sum in merits_sum, unless merits were loaded since.
+        """
+        if self.merits_sum is not None and 'merits' in sqla.inspect(self).unloaded:
+            return self.merits_sum
+
         total = 0
         for drop in self.merits:
             total += drop.amount
@@ -658,7 +687,13 @@ class SystemUM(Base):
 
     @property
     def cmdr_merits(self):
-        """ Total merits held and redeemed by cmdrs """
+        """
+        Total merits held and redeemed by cmdrs.
+        Systems queried carry the sum in merits_sum, unless merits were loaded since.
+        """
+        if self.merits_sum is not None and 'merits' in sqla.inspect(self).unloaded:
+            return self.merits_sum
+
         total = 0
         for hold in self.merits:
             total += hold.held + hold.redeemed
@@ -869,6 +904,33 @@ def parse_int(word):
         return 0
 
 
+def parse_ints(cells):
+    """
+    Parse a whole column of merit cells at once.
+    Strings are stripped first, empty cells are None, the rest parse like parse_int.
+
+    Returns: A list of the same length as cells.
+    """
+    parsed = []
+    for cell in cells:
+        if cell.__class__ is int:
+            parsed.append(cell)
+            continue
+
+        if isinstance(cell, type('')):
+            cell = cell.strip()
+            if cell == '':
+                parsed.append(None)
+                continue
+
+        try:
+            parsed.append(int(cell))
+        except ValueError:
+            parsed.append(0)
+
+    return parsed
+
+
 def parse_float(word):
     """ Parse into float, on failure return 0.0 """
     try:
@@ -881,7 +943,7 @@ def empty_tables(session, *, perm=False):
     """
     Drop all tables.
     """
-    classes = [Drop, Hold, System, SystemUM, SheetRow]
+    classes = [Drop, Hold, System, SystemUM, SheetRow, SheetRecord]
     if perm:
         classes += [DUser]
 
@@ -939,6 +1001,15 @@ SystemUM.merits = sqla_orm.relationship('Hold',
                                         back_populates='system',
                                         lazy='select')
 
+# Merits summed in the query of the system, listing systems needs no load of merits
+System.merits_sum = sqla_orm.column_property(
+    sqla.select([sqla.cast(sqla.func.coalesce(sqla.func.sum(Drop.amount), 0), sqla.Integer)]).
+    where(Drop.system_id == System.id).correlate_except(Drop).label('merits_sum'))
+SystemUM.merits_sum = sqla_orm.column_property(
+    sqla.select([sqla.cast(sqla.func.coalesce(sqla.func.sum(Hold.held + Hold.redeemed), 0),
+                           sqla.Integer)]).
+    where(Hold.system_id == SystemUM.id).correlate_except(Hold).label('merits_sum'))
+
 
 if cogdb.TEST_DB:
     recreate_tables()
@@ -1,16 +1,21 @@
 """
 Sidewinder's remote database.
 
-These classes map to remote tables.
-When querying from async code, await an executor to thread or process.
+These classes map to remote tables, cogdb.side_sync mirrors them to a local replica.
+When querying from async code, prefer the async_ functions that await the
+aiomysql pool directly. Otherwise await an executor to thread or process.
 """
 from __future__ import absolute_import, print_function
+import asyncio
 import logging
 import datetime
 import math
 import string
 import time
 
+import aiomysql.sa
+import numpy as np
+import pymysql
 import sqlalchemy as sqla
 import sqlalchemy.exc as sqla_exe
 import sqlalchemy.orm as sqla_orm
@@ -22,7 +27,8 @@ import cog.exc
 import cog.tbl
 import cog.util
 import cogdb
-from cogdb.eddb import LEN, TIME_FMT
+import cogdb.timeseries
+from cogdb.eddb import LEN, TIME_FMT, route_points
 
 
 #  http://elite-dangerous.wikia.com/wiki/Category:Power
@@ -66,6 +72,7 @@ HUDSON_BGS = [['Feudal', 'Patronage'], ["Dictatorship"]]
 WINTERS_BGS = [["Corporate"], ["Communism", "Cooperative", "Feudal", "Patronage"]]
 PILOTS_FED_FACTION_ID = 76748  # N.B. 76748 is Useless pilots federation faction ID
 # They are not useful for any faction related predictions/interactions.
+ASYNC_ENGINES = {}  # Every event loop gets a separate aiomysql engine, key is loop.
 Base = sqlalchemy.ext.declarative.declarative_base()
 
 
@@ -499,9 +506,14 @@ def wrap_exceptions(func):
     """
     Wrap all top level queries that get used externally.
     Translate SQLAlchemy exceptions to internal ones.
+    Queries on a session bound to the remote go through cogdb.side_breaker.
     """
     def inner(*args, **kwargs):
         """ Simple inner function wrapper. """
+        session = args[0] if args else None
+        if isinstance(session, sqla_orm.Session) and session.bind is cogdb.side_engine:
+            return cogdb.side_breaker.call(func, *args, on_retry=session.rollback, **kwargs)
+
         try:
             return func(*args, **kwargs)
         except sqla_exe.OperationalError:
@@ -510,6 +522,95 @@ def wrap_exceptions(func):
     return inner
 
 
+async def async_engine():
+    """
+    Return the aiomysql engine for the running loop, creating the pool on first request.
+    Connects to the same db as SideSession, by default the local replica.
+    Pool size can be tuned with optional 'pool_min' and 'pool_max' keys of side db config.
+
+    Raises:
+        RemoteError - Cannot communicate with remote.
+    """
+    loop = asyncio.get_event_loop()
+    if loop not in ASYNC_ENGINES:
+        creds = cog.util.get_config('dbs', 'side')
+        url = cogdb.SideSession.kw['bind'].url
+        ASYNC_ENGINES[loop] = asyncio.ensure_future(aiomysql.sa.create_engine(
+            host=url.host, port=url.port or 3306, user=url.username, password=url.password,
+            db=url.database, charset='utf8mb4', autocommit=True, pool_recycle=3600,
+            minsize=creds.get('pool_min', 1), maxsize=creds.get('pool_max', 10),
+            compiled_cache={}, loop=loop),
+            loop=loop)
+
+    try:
+        return await ASYNC_ENGINES[loop]
+    except pymysql.err.OperationalError:
+        del ASYNC_ENGINES[loop]
+        raise cog.exc.RemoteError("Lost connection to Sidewinder's DB.")
+
+
+async def async_close(loop=None):
+    """
+    Close the aiomysql engine of loop, by default the running loop.
+    """
+    if not loop:
+        loop = asyncio.get_event_loop()
+
+    try:
+        engine = await ASYNC_ENGINES.pop(loop)
+        engine.close()
+        await engine.wait_closed()
+    except (KeyError, cog.exc.RemoteError, pymysql.err.OperationalError):
+        pass
+
+
+async def async_query(query, **params):
+    """
+    Execute a session free ORM query or statement on the async pool, nothing blocks the loop.
+    Any params are values for bound parameters of the query.
+    Compiled statements with bound parameters are cached per engine, reuse the statement.
+
+    Returns: List of rows, rows support index or column name lookup.
+
+    Raises:
+        RemoteError - Cannot communicate with remote.
+    """
+    if isinstance(query, sqla_orm.Query):
+        query = query.statement
+    engine = await async_engine()
+    try:
+        async with engine.acquire() as conn:
+            result = await conn.execute(query, **params)
+            return await result.fetchall()
+    except (pymysql.err.OperationalError, sqla_exe.OperationalError):
+        raise cog.exc.RemoteError("Lost connection to Sidewinder's DB.")
+
+
+def next_bgs_tick_query():
+    """ Query for the first bgs tick after bound parameter now. """
+    return sqla_orm.Query(BGSTick.tick).\
+        filter(BGSTick.tick > sqla.bindparam('now')).\
+        order_by(BGSTick.tick).\
+        limit(1)
+
+
+def format_bgs_tick(now, tick):
+    """
+    Format the message for the next bgs tick, tick is None when no estimates remain.
+
+    Raises:
+        NoMoreTargets - Ran out of ticks.
+    """
+    log = logging.getLogger("cogdb.side")
+    if tick:
+        log.info("BGS_TICK - %s -> %s", str(now), tick)
+        return "BGS Tick in **{}**    (Expected {})".format(tick - now, tick)
+    else:
+        log.warning("BGS_TICK - Remote out of estimates")
+        side = cog.util.BOT.get_member_by_substr("sidewinder40")
+        raise cog.exc.NoMoreTargets("BGS Tick estimate unavailable. No more estimates, " + side.mention)
+
+
 @wrap_exceptions
 def next_bgs_tick(session, now):
     """
@@ -523,16 +624,24 @@ def next_bgs_tick(session, now):
         RemoteError - Cannot communicate with remote.
         NoMoreTargets - Ran out of ticks.
     """
-    log = logging.getLogger("cogdb.side")
-    result = session.query(BGSTick).filter(BGSTick.tick > now).order_by(BGSTick.tick).\
-        limit(1).first()
-    if result:
-        log.info("BGS_TICK - %s -> %s", str(now), result.tick)
-        return "BGS Tick in **{}**    (Expected {})".format(result.tick - now, result.tick)
-    else:
-        log.warning("BGS_TICK - Remote out of estimates")
-        side = cog.util.BOT.get_member_by_substr("sidewinder40")
-        raise cog.exc.NoMoreTargets("BGS Tick estimate unavailable. No more estimates, " + side.mention)
+    query = cogdb.BAKERY(lambda session: next_bgs_tick_query().with_session(session))
+    result = query(session).params(now=now).first()
+    return format_bgs_tick(now, result[0] if result else None)
+
+
+async def async_next_bgs_tick(now):
+    """
+    Async version of next_bgs_tick, see that for details.
+    """
+    rows = await async_query(NEXT_BGS_TICK, now=now)
+    return format_bgs_tick(now, rows[0][0] if rows else None)
+
+
+def exploited_systems_by_age_query():
+    """ Query for all SystemAge around bound parameter control. """
+    return sqla_orm.Query(SystemAge).\
+        filter(SystemAge.control == sqla.bindparam('control')).\
+        order_by(SystemAge.system)
 
 
 @wrap_exceptions
@@ -545,16 +654,39 @@ def exploited_systems_by_age(session, control):
         RemoteError - Cannot communicate with remote.
     """
     log = logging.getLogger("cogdb.side")
-    result = session.query(SystemAge).\
-        filter(SystemAge.control == control).\
-        order_by(SystemAge.system).\
-        all()
-
+    query = cogdb.BAKERY(lambda session: exploited_systems_by_age_query().with_session(session))
+    result = query(session).params(control=control).all()
     log.info("BGS - Received from query: %s", str(result))
 
     return result
 
 
+async def async_exploited_systems_by_age(control):
+    """
+    Async version of exploited_systems_by_age, see that for details.
+    """
+    rows = await async_query(EXPLOITED_SYSTEMS_BY_AGE, control=control)
+    return [SystemAge(**dict(row)) for row in rows]
+
+
+def influence_in_system_query():
+    """ Query for influence of every faction in bound parameter system. """
+    subq = sqla_orm.Query(System.id).filter(System.name == sqla.bindparam('system')).subquery()
+    return sqla_orm.Query([Influence.influence, Influence.updated_at,
+                           Faction.name, Faction.is_player_faction, Government.text]).\
+        filter(Influence.system_id == subq,
+               Faction.id != PILOTS_FED_FACTION_ID).\
+        join(Faction, Influence.faction_id == Faction.id).\
+        join(Government, Faction.government_id == Government.id).\
+        order_by(Influence.influence.desc())
+
+
+def format_influence(infs):
+    """ Format the rows of influence_in_system_query for display. """
+    return [[inf[2], float('{:.2f}'.format(inf[0])), inf[4], 'Y' if inf[3] else 'N',
+             time.strftime(TIME_FMT, time.gmtime(inf[1]))] for inf in infs]
+
+
 @wrap_exceptions
 def influence_in_system(session, system):
     """
@@ -564,18 +696,21 @@ def influence_in_system(session, system):
     Returns a list of lists with the following:
         faction name, influence, is_player_faction, government_type, influence timestamp
     """
-    subq = session.query(System.id).filter(System.name == system).subquery()
-    infs = session.query(Influence.influence, Influence.updated_at,
-                         Faction.name, Faction.is_player_faction, Government.text).\
-        filter(Influence.system_id == subq,
-               Faction.id != PILOTS_FED_FACTION_ID).\
-        join(Faction, Influence.faction_id == Faction.id).\
-        join(Government, Faction.government_id == Government.id).\
-        order_by(Influence.influence.desc()).\
-        all()
+    query = cogdb.BAKERY(lambda session: influence_in_system_query().with_session(session))
+    return format_influence(query(session).params(system=system).all())
 
-    return [[inf[2], float('{:.2f}'.format(inf[0])), inf[4], 'Y' if inf[3] else 'N',
-             time.strftime(TIME_FMT, time.gmtime(inf[1]))] for inf in infs]
+
+async def async_influence_in_system(system):
+    """
+    Async version of influence_in_system, see that for details.
+    """
+    return format_influence(await async_query(INFLUENCE_IN_SYSTEM, system=system))
+
+
+# Statements built once for the async path, their compiled form is cached by the engine
+NEXT_BGS_TICK = next_bgs_tick_query().statement
+EXPLOITED_SYSTEMS_BY_AGE = exploited_systems_by_age_query().statement
+INFLUENCE_IN_SYSTEM = influence_in_system_query().statement
 
 
 @wrap_exceptions
@@ -607,34 +742,24 @@ def stations_in_system(session, system_id):
 @wrap_exceptions
 def influence_history_in_system(session, system_id, fact_ids, time_window=None):
     """
-    Query for historical InfluenceHistory of factions with fact_ids in a system_id.
+    Historical influence of factions with fact_ids in a system_id, one point per day.
 
-    Optionally specify a start_time, query will return all InfluenceHistory after that time.
-    By default return 5 days worth of InfluenceHistory.
+    Optionally specify a start_time, query will return all history after that time.
+    By default return 5 days worth of history.
 
-    Returns: A dict of form d[faction_id] = [InfluenceHistory, InfluenceHistory ...]
+    Returns: A dict of form d[faction_id] = [InfPoint, InfPoint ...], newest first.
 
     Raises:
         RemoteError - Cannot reach the remote host.
     """
-    if not time_window:
-        time_window = time.time() - (60 * 60 * 24 * 5)
-
-    inf_history = session.query(InfluenceHistory).\
-        filter(InfluenceHistory.system_id == system_id,
-               InfluenceHistory.faction_id.in_(fact_ids),
-               InfluenceHistory.updated_at >= time_window).\
-        order_by(InfluenceHistory.faction_id,
-                 InfluenceHistory.updated_at.desc()).\
-        all()
+    store = cogdb.timeseries.STORE
+    store.ensure(session, [(system_id, fact_id) for fact_id in fact_ids])
 
     inf_dict = {}
-    for hist in inf_history:
-        try:
-            if inf_dict[hist.faction_id][-1].short_date != hist.short_date:
-                inf_dict[hist.faction_id] += [hist]
-        except KeyError:
-            inf_dict[hist.faction_id] = [hist]
+    for fact_id in fact_ids:
+        hist = store.history(system_id, fact_id, time_window)
+        if hist:
+            inf_dict[fact_id] = hist
 
     return inf_dict
 
@@ -751,24 +876,18 @@ def inf_history_for_pairs(session, data_pairs):
     That is data_pairs is: [[system_id, faction_id], [system_id, faction_id], ...]
 
     Returns:
-        Oldest historical influence data for each system_id/faction_id pair. Of form:
+        Oldest influence within last 5 days for each system_id/faction_id pair. Of form:
+            d["system_id_faction_id"] = influence
     """
-    look_for = [sqla.and_(InfluenceHistory.system_id == pair[0],
-                          InfluenceHistory.faction_id == pair[1])
-                for pair in data_pairs]
+    store = cogdb.timeseries.STORE
+    store.ensure(session, data_pairs)
 
     time_window = time.time() - (60 * 60 * 24 * 5)
-    inf_history = session.query(InfluenceHistory).\
-        filter(sqla.or_(*look_for)).\
-        filter(InfluenceHistory.updated_at >= time_window).\
-        order_by(InfluenceHistory.system_id, InfluenceHistory.faction_id,
-                 InfluenceHistory.updated_at.desc()).\
-        all()
-
     pair_hist = {}
-    for hist in inf_history:
-        key = "{}_{}".format(hist.system_id, hist.faction_id)
-        pair_hist[key] = hist.influence
+    for system_id, faction_id in data_pairs:
+        influence = store.oldest_since(system_id, faction_id, time_window)
+        if influence is not None:
+            pair_hist["{}_{}".format(system_id, faction_id)] = influence
 
     return pair_hist
 
@@ -793,20 +912,65 @@ def dash_overview(session, control_system):
 
     facts_in_system = count_factions_in_systems(session,
                                                 [faction[0].id for faction in factions])
-    data_pairs = [[faction[0].id, faction[1].id] for faction in factions]
-    hist_for_pairs = inf_history_for_pairs(session, data_pairs)
+    store = cogdb.timeseries.STORE
+    store.ensure(session, [(faction[0].id, faction[1].id) for faction in factions])
 
     net_change = {}
     for system, faction, inf in [[faction[0], faction[1], faction[3]] for faction in factions]:
-        try:
-            net_inf = inf.influence - hist_for_pairs["{}_{}".format(system.id, faction.id)]
-        except KeyError:
-            net_inf = inf.influence
+        net_inf = store.delta(system.id, faction.id, float(inf.influence))
         net_change[system.name] = '{}{:.1f}'.format('+' if net_inf >= 0 else '', net_inf)
 
     return (control, factions, net_change, facts_in_system)
 
 
+@wrap_exceptions
+def trend_overview(session, control_names, days=7):
+    """
+    Influence trends of all factions in the bubbles of control_names.
+    Every system is assigned to its nearest control.
+
+    Returns: List of rows sorted by control, system and influence:
+        [control, system, faction, influence, velocity, acceleration, days_to_crossover]
+    """
+    controls = session.query(System).filter(System.name.in_(control_names)).all()
+    if not controls:
+        return []
+
+    infs = session.query(System.id, System.name, System.x, System.y, System.z,
+                         Faction.id, Faction.name, Influence.influence).\
+        filter(sqla.or_(*[System.dist_to(control) <= 15 for control in controls]),
+               System.power_state_id != 48,
+               Faction.id != PILOTS_FED_FACTION_ID).\
+        join(Influence, System.id == Influence.system_id).\
+        join(Faction, Influence.faction_id == Faction.id).\
+        all()
+    if not infs:
+        return []
+
+    pairs = [(inf[0], inf[5]) for inf in infs]
+    store = cogdb.timeseries.STORE
+    store.ensure(session, pairs)
+
+    matrix, valid = cogdb.timeseries.daily_matrix(store, pairs, days)
+    current = np.array([float(inf[-1]) for inf in infs])
+    matrix[:, -1] = current
+    matrix[~valid] = current[~valid, None]
+    _, velocity, accel = cogdb.timeseries.fit_trends(matrix)
+    crossover = cogdb.timeseries.days_to_crossover(np.array([pair[0] for pair in pairs]),
+                                                   current, velocity)
+
+    coords = np.array([inf[2:5] for inf in infs], dtype=np.float64)
+    control_coords = np.array([[control.x, control.y, control.z] for control in controls],
+                              dtype=np.float64)
+    nearest = np.argmin(((coords[:, None, :] - control_coords[None, :, :]) ** 2).sum(axis=2),
+                        axis=1)
+
+    rows = [[controls[near].name, inf[1], inf[6], float(cur), float(vel), float(acc), float(cross)]
+            for inf, near, cur, vel, acc, cross
+            in zip(infs, nearest, current, velocity, accel, crossover)]
+    return sorted(rows, key=lambda x: (x[0], x[1], -x[3]))
+
+
 @wrap_exceptions
 def find_favorable(session, centre_name, max_dist=None, inc=20):
     """
@@ -905,21 +1069,18 @@ def expansion_candidates(session, centre, faction):
     return result
 
 
-@wrap_exceptions
-def get_systems(session, system_names):
-    """
-    Given a list of names, find all exact matching systems.
+def get_systems_query(system_names):
+    """ Query for all systems with exactly matching names. """
+    return sqla_orm.Query(System).filter(System.name.in_(system_names))
 
-    Returns:
-        [System, System, ...]
+
+def check_systems(systems, system_names):
+    """
+    Check every name in system_names was matched by a System.
 
     Raises:
         InvalidCommandArgs - One or more systems didn't match.
     """
-    systems = session.query(System).\
-        filter(System.name.in_(system_names)).\
-        all()
-
     if len(systems) != len(system_names):
         for system in systems:
             system_names = [s_name for s_name in system_names
@@ -931,6 +1092,30 @@ def get_systems(session, system_names):
     return systems
 
 
+@wrap_exceptions
+def get_systems(session, system_names):
+    """
+    Given a list of names, find all exact matching systems.
+
+    Returns:
+        [System, System, ...]
+
+    Raises:
+        InvalidCommandArgs - One or more systems didn't match.
+    """
+    return check_systems(get_systems_query(system_names).with_session(session).all(),
+                         system_names)
+
+
+async def async_get_systems(system_names):
+    """
+    Async version of get_systems, see that for details.
+    Returned Systems are transient, they are not attached to any session.
+    """
+    rows = await async_query(get_systems_query(system_names))
+    return check_systems([System(**dict(row)) for row in rows], system_names)
+
+
 def get_factions_in_system(session, system_name):
     """
     Get all Factions in the system with name system_name.
@@ -993,22 +1178,13 @@ def expand_to_candidates(session, system_name):
     return lines
 
 
-@wrap_exceptions
-def compute_dists(session, system_names):
+def dists_from_first(systems, system_names):
     """
-    Given a list of systems, compute the distance from the first to all others.
-
-    Returns:
-        Dict of {system: distance, ...}
+    Compute the distance from first of system_names to all others.
 
     Raises:
         InvalidCommandArgs - One or more system could not be matched.
     """
-    system_names = [name.lower() for name in system_names]
-    systems = session.query(System).\
-        filter(System.name.in_(system_names)).\
-        all()
-
     if len(systems) != len(system_names):
         for system in systems:
             system_names.remove(system.name.lower())
@@ -1021,6 +1197,31 @@ def compute_dists(session, system_names):
     return {system.name: centre.dist_to(system) for system in rest}
 
 
+@wrap_exceptions
+def compute_dists(session, system_names):
+    """
+    Given a list of systems, compute the distance from the first to all others.
+
+    Returns:
+        Dict of {system: distance, ...}
+
+    Raises:
+        InvalidCommandArgs - One or more system could not be matched.
+    """
+    system_names = [name.lower() for name in system_names]
+    systems = get_systems_query(system_names).with_session(session).all()
+    return dists_from_first(systems, system_names)
+
+
+async def async_compute_dists(system_names):
+    """
+    Async version of compute_dists, see that for details.
+    """
+    system_names = [name.lower() for name in system_names]
+    rows = await async_query(get_systems_query(system_names))
+    return dists_from_first([System(**dict(row)) for row in rows], system_names)
+
+
 def get_power_hq(substr):
     """
     Loose match substr against keys in powers full names.
@@ -1352,14 +1553,32 @@ def monitor_factions(session, faction_names=None):
 
 
 @wrap_exceptions
-def get_edmc_systems(session, controls):
+def edmc_points(session, controls):
     """
-    Get the list of Systems that have stale EDDN data.
+    Get the Systems with stale EDDN data around every control, in one query.
+    Systems are reduced to points for cogdb.eddb.best_route_points.
+
+    Returns: (control_points, bubbles)
+        control_points: The points of the controls themselves.
+        bubbles: A dict of control name -> points of its stale systems.
+
+    Raises:
+        InvalidCommandArgs - One or more controls didn't match.
     """
-    return session.query(System).\
+    control_systems = check_systems(session.query(System).
+                                    filter(System.name.in_(controls)).
+                                    all(), controls)
+    bubbles = {system.name: [] for system in control_systems}
+    names = {name.lower(): name for name in bubbles}
+
+    stale = session.query(SystemAge.control, System).\
         filter(SystemAge.control.in_(controls),
                SystemAge.system == System.name).\
-        all()
+        order_by(SystemAge.control, System.name)
+    for control, system in stale:
+        bubbles[names[control.lower()]] += route_points([system])
+
+    return route_points(control_systems), bubbles
 
 
 @wrap_exceptions
@@ -1379,8 +1598,23 @@ def get_control_system_names(session, winters=False):
     return [x[0] for x in systems]
 
 
-HUDSON_CONTROLS = get_control_system_names(cogdb.SideSession(), False)
-WINTERS_CONTROLS = get_control_system_names(cogdb.SideSession(), True)
+def init_control_system_names(winters=False):
+    """
+    Get the names of controls, prefer the replica but use remote until first sync completes.
+    """
+    try:
+        controls = get_control_system_names(cogdb.SideSession(), winters)
+    except cog.exc.RemoteError:
+        controls = []
+
+    if not controls:
+        controls = get_control_system_names(cogdb.SideRemoteSession(), winters)
+
+    return controls
+
+
+HUDSON_CONTROLS = init_control_system_names(False)
+WINTERS_CONTROLS = init_control_system_names(True)
 
 
 def main():
@@ -0,0 +1,295 @@
+"""
+Keep a local replica of Sidewinder's remote database current.
+
+Tables with an updated_at column are pulled incrementally, only rows changed since
+the last watermark are copied. The remainder are lookup tables, views or lack
+updated_at, they are refreshed whole once they are older than FULL_INTERVAL.
+Watermarks are tracked per table in the replica itself, see SyncMark.
+
+Rows deleted on remote never show up in an incremental pull. The primary keys of the
+RECONCILE tables are compared with remote every RECONCILE_INTERVAL, keys remote no longer
+has are deleted from the replica, i.e. the influence of a faction that retreated.
+
+Replica tables carry no foreign keys so tables can be refreshed in any order.
+"""
+from __future__ import absolute_import, print_function
+import logging
+import time
+
+import sqlalchemy as sqla
+import sqlalchemy.exc as sqla_exe
+import sqlalchemy.orm as sqla_orm
+import sqlalchemy.ext.declarative
+
+import cogdb
+import cogdb.names
+import cogdb.side
+import cogdb.timeseries
+from cogdb.side import (Allegiance, BGSTick, Faction, FactionState, Government, Influence,
+                        InfluenceHistory, Power, PowerState, Security, SettlementSecurity,
+                        SettlementSize, Station, StationType, System, SystemAge)
+
+
+BATCH = 20000
+FULL_INTERVAL = 60 * 60
+HISTORY_DAYS = 30
+INCREMENTAL = [Faction, Influence, InfluenceHistory, Station]
+# History is append only and windowed, it is never reconciled
+RECONCILE = [Faction, Influence, Station]
+RECONCILE_INTERVAL = 60 * 60
+FULL = [Allegiance, BGSTick, FactionState, Government, Power, PowerState, Security,
+        SettlementSecurity, SettlementSize, StationType, System, SystemAge]
+SyncBase = sqlalchemy.ext.declarative.declarative_base()
+
+
+class SyncMark(SyncBase):
+    """ Track the progress of sync for a single replica table. """
+    __tablename__ = "side_sync"
+
+    name = sqla.Column(sqla.String(30), primary_key=True)  # Name of replica table
+    watermark = sqla.Column(sqla.Integer, default=0)  # Highest updated_at copied
+    synced_at = sqla.Column(sqla.Integer, default=0)  # Unix time of last successful sync
+    rows = sqla.Column(sqla.Integer, default=0)  # Rows copied last sync
+
+    def __repr__(self):
+        keys = ['name', 'watermark', 'synced_at', 'rows']
+        kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
+
+        return "{}({})".format(self.__class__.__name__, ', '.join(kwargs))
+
+    def __eq__(self, other):
+        return isinstance(self, SyncMark) and isinstance(other, SyncMark) and \
+            self.name == other.name
+
+
+def replica_metadata():
+    """
+    Copy the side metadata, minus foreign keys.
+
+    Returns: A MetaData suitable for create_all on the replica.
+    """
+    meta = sqla.MetaData()
+    for table in cogdb.side.Base.metadata.sorted_tables:
+        copy = table.tometadata(meta)
+        for fkey in list(copy.foreign_key_constraints):
+            copy.constraints.discard(fkey)
+        for column in copy.columns:
+            column.foreign_keys.clear()
+        copy.foreign_keys.clear()
+
+    return meta
+
+
+def create_replica(engine):
+    """ Create any missing tables of the replica. """
+    replica_metadata().create_all(engine)
+    SyncBase.metadata.create_all(engine)
+
+
+def get_mark(local, cls):
+    """
+    Get the SyncMark for the table of cls, a new one starts history HISTORY_DAYS back.
+    """
+    try:
+        return local.query(SyncMark).filter(SyncMark.name == cls.__tablename__).one()
+    except sqla_orm.exc.NoResultFound:
+        watermark = 0
+        if cls is InfluenceHistory:
+            watermark = int(time.time()) - HISTORY_DAYS * 24 * 60 * 60
+        mark = SyncMark(name=cls.__tablename__, watermark=watermark, synced_at=0, rows=0)
+        local.add(mark)
+        return mark
+
+
+def get_keys_mark(local, cls):
+    """
+    Get the SyncMark tracking the key reconcile of the table of cls.
+    """
+    name = cls.__tablename__ + '_keys'
+    try:
+        return local.query(SyncMark).filter(SyncMark.name == name).one()
+    except sqla_orm.exc.NoResultFound:
+        mark = SyncMark(name=name, watermark=0, synced_at=0, rows=0)
+        local.add(mark)
+        return mark
+
+
+def delete_rows(local, table, keys):
+    """
+    Delete rows by primary key from the replica, keys are tuples in primary key order.
+    """
+    if not keys:
+        return
+
+    pkeys = table.primary_key.columns
+    delete = table.delete().where(sqla.and_(*[
+        col == sqla.bindparam('pk_' + col.name) for col in pkeys]))
+    local.execute(delete, [{'pk_' + col.name: val for col, val in zip(pkeys, key)}
+                           for key in keys])
+
+
+def replace_rows(local, table, rows):
+    """
+    Replace rows by primary key in the replica, missing rows are inserted.
+    """
+    if not rows:
+        return
+
+    pkeys = table.primary_key.columns
+    delete_rows(local, table, [tuple(row[col.name] for col in pkeys) for row in rows])
+    local.execute(table.insert(), rows)
+
+
+def sync_incremental(remote, local, cls, batch=BATCH):
+    """
+    Copy all rows of cls changed since the watermark into the replica.
+
+    Rows are paged by updated_at. A full page is trimmed to its last updated_at
+    which is then fetched whole, no rows sharing a timestamp can be skipped.
+
+    Returns: The number of rows copied.
+    """
+    table = cls.__table__
+    mark = get_mark(local, cls)
+    copied = 0
+    while True:
+        rows = [dict(row) for row in remote.execute(
+            sqla.select([table]).
+            where(table.c.updated_at > mark.watermark).
+            order_by(table.c.updated_at).
+            limit(batch))]
+        if not rows:
+            break
+
+        last = rows[-1]['updated_at']
+        full_page = len(rows) == batch
+        if full_page:
+            rows = [row for row in rows if row['updated_at'] != last]
+            rows += [dict(row) for row in remote.execute(
+                sqla.select([table]).where(table.c.updated_at == last))]
+
+        replace_rows(local, table, rows)
+        mark.watermark = last
+        copied += len(rows)
+
+        if not full_page:
+            break
+
+    mark.synced_at = int(time.time())
+    mark.rows = copied
+    local.commit()
+
+    return copied
+
+
+def sync_full(remote, local, cls, force=False):
+    """
+    Replace all rows of cls in the replica if older than FULL_INTERVAL or forced.
+
+    Returns: The number of rows copied.
+    """
+    table = cls.__table__
+    mark = get_mark(local, cls)
+    now = int(time.time())
+    if not force and now - mark.synced_at < FULL_INTERVAL:
+        return 0
+
+    rows = [dict(row) for row in remote.execute(sqla.select([table]))]
+    local.execute(table.delete())
+    if rows:
+        local.execute(table.insert(), rows)
+
+    mark.synced_at = now
+    mark.rows = len(rows)
+    local.commit()
+
+    return len(rows)
+
+
+def sync_reconcile(remote, local, cls, force=False):
+    """
+    Delete rows of cls from the replica that remote no longer has,
+    if the last reconcile is older than RECONCILE_INTERVAL or forced.
+    Replica keys are read first, a row added meanwhile on remote is never deleted.
+
+    Returns: The number of rows deleted.
+    """
+    table = cls.__table__
+    mark = get_keys_mark(local, cls)
+    now = int(time.time())
+    if not force and now - mark.synced_at < RECONCILE_INTERVAL:
+        return 0
+
+    pkeys = list(table.primary_key.columns)
+    stale = {tuple(row) for row in local.execute(sqla.select(pkeys))}
+    if stale:
+        stale -= {tuple(row) for row in remote.execute(sqla.select(pkeys))}
+    delete_rows(local, table, list(stale))
+
+    mark.synced_at = now
+    mark.rows = len(stale)
+    local.commit()
+
+    return len(stale)
+
+
+def sync(remote, local, force=False):
+    """
+    Bring the replica up to date with remote.
+
+    Returns: Dict of table name -> number of rows copied.
+
+    Raises:
+        OperationalError - Cannot communicate with remote, replica rolled back.
+    """
+    log = logging.getLogger('cogdb.side_sync')
+    counts = {}
+    try:
+        for cls in FULL:
+            counts[cls.__tablename__] = sync_full(remote, local, cls, force)
+        for cls in INCREMENTAL:
+            counts[cls.__tablename__] = sync_incremental(remote, local, cls)
+        deleted = {cls.__tablename__: sync_reconcile(remote, local, cls, force)
+                   for cls in RECONCILE}
+    except sqla_exe.OperationalError:
+        local.rollback()
+        raise
+
+    log.info('SYNC - Copied rows: %s', str(counts))
+    if any(deleted.values()):
+        log.info('SYNC - Deleted rows: %s', str(deleted))
+    return counts
+
+
+def sync_replica(force=False):
+    """
+    Sync the configured replica with remote, manages sessions.
+    Blocking, intended to be run on an executor.
+
+    Returns: Dict of table name -> number of rows copied.
+
+    Raises:
+        RemoteError - Cannot communicate with remote or breaker open.
+    """
+    create_replica(cogdb.side_local_engine)
+    remote, local = cogdb.SideRemoteSession(), cogdb.SideLocalSession()
+    try:
+        counts = cogdb.side_breaker.call(sync, remote, local, force, retries=0)
+        cogdb.timeseries.STORE.refresh(local, force=True)
+        cogdb.names.update_side(local)
+        return counts
+    finally:
+        remote.close()
+        local.close()
+
+
+def status(local):
+    """
+    Returns: A table summarizing the SyncMarks of the replica.
+    """
+    lines = [['Table', 'Watermark', 'Synced At', 'Rows']]
+    for mark in local.query(SyncMark).order_by(SyncMark.name):
+        lines += [[mark.name, mark.watermark,
+                   time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(mark.synced_at)), mark.rows]]
+
+    return lines
@@ -0,0 +1,160 @@
+"""
+Schedule of estimated BGS ticks, held in memory.
+
+All future ticks are fetched in one query and refreshed in the background,
+the next tick is then found by bisection without a db round trip.
+Subscribers are notified once for every tick that passes, in order.
+A subscriber is any callable taking the tick datetime, coroutine functions are awaited.
+"""
+from __future__ import absolute_import, print_function
+import asyncio
+import bisect
+import datetime
+import logging
+import time
+
+import cogdb.side
+
+
+REFRESH = 60 * 30
+
+
+class TickSchedule(object):
+    """
+    Future BGS ticks, sorted ascending.
+
+    The list of ticks is replaced on load, never modified in place, readers need no lock.
+    """
+    def __init__(self, refresh=REFRESH):
+        self.refresh = refresh
+        self.ticks = []
+        self.loaded_at = 0
+        self.notified = None
+        self.subscribers = []
+
+    def __repr__(self):
+        keys = ['refresh', 'loaded_at', 'notified']
+        kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
+        kwargs += ['ticks={!r}'.format(len(self.ticks))]
+
+        return "{}({})".format(self.__class__.__name__, ', '.join(kwargs))
+
+    def __len__(self):
+        return len(self.ticks)
+
+    @property
+    def loaded(self):
+        """ True once loaded at least once. """
+        return self.loaded_at != 0
+
+    @property
+    def stale(self):
+        """ True if due for a refresh. """
+        return time.time() - self.loaded_at >= self.refresh
+
+    def load(self, session, now=None):
+        """
+        Replace the schedule with all ticks after now, default utcnow.
+        Ticks passed since subscribers were last notified are kept so none are missed.
+        Blocking, intended to be run on an executor.
+
+        Raises:
+            RemoteError - Cannot communicate with remote.
+        """
+        if now is None:
+            now = datetime.datetime.utcnow()
+        if self.notified is None:
+            self.notified = now
+
+        self.ticks = future_ticks(session, min(now, self.notified))
+        self.loaded_at = time.time()
+        logging.getLogger('cogdb.ticks').info('TICKS - Loaded %d ticks, next %s.',
+                                              len(self.ticks), self.next_tick(now))
+
+    def next_tick(self, now):
+        """
+        Returns: The first tick after now, None if out of estimates.
+        """
+        ticks = self.ticks
+        ind = bisect.bisect_right(ticks, now)
+        return ticks[ind] if ind < len(ticks) else None
+
+    def passed(self, now):
+        """
+        Returns: The ticks passed since last notified up to now, oldest first.
+        """
+        ticks = self.ticks
+        if self.notified is None:
+            self.notified = now
+            return []
+
+        passed = ticks[bisect.bisect_right(ticks, self.notified):bisect.bisect_right(ticks, now)]
+        self.notified = max(self.notified, now)
+        return passed
+
+    def subscribe(self, callback):
+        """
+        Notify callback with the tick every time one passes.
+        """
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+        Stop notifying callback.
+        """
+        try:
+            self.subscribers.remove(callback)
+        except ValueError:
+            pass
+
+    async def notify(self, now=None):
+        """
+        Notify subscribers of every tick passed since last called.
+        A failing subscriber is logged, the rest are still notified.
+
+        Returns: The ticks passed.
+        """
+        log = logging.getLogger('cogdb.ticks')
+        if now is None:
+            now = datetime.datetime.utcnow()
+
+        passed = self.passed(now)
+        for tick in passed:
+            log.info('TICKS - Tick passed %s, notifying %d.', tick, len(self.subscribers))
+            for callback in self.subscribers[:]:
+                try:
+                    result = callback(tick)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception:  # pylint: disable=broad-except
+                    log.exception('TICKS - Subscriber %s failed on tick %s.', callback, tick)
+
+        return passed
+
+    def sleep_for(self, now):
+        """
+        Returns: Seconds to sleep until the next tick or refresh, whichever first.
+        """
+        delay = max(self.loaded_at + self.refresh - time.time(), 0)
+        tick = self.next_tick(now)
+        if tick:
+            delay = min(delay, (tick - now).total_seconds())
+
+        return max(delay, 1)
+
+
+@cogdb.side.wrap_exceptions
+def future_ticks(session, now):
+    """
+    Returns: All estimated ticks after now, ascending.
+
+    Raises:
+        RemoteError - Cannot communicate with remote.
+    """
+    return [row[0] for row in session.query(cogdb.side.BGSTick.tick).
+            filter(cogdb.side.BGSTick.tick > now).
+            order_by(cogdb.side.BGSTick.tick)]
+
+
+SCHEDULE = TickSchedule()
@@ -0,0 +1,301 @@
+"""
+Columnar store of faction influence history.
+
+History is held per (system_id, faction_id) pair as a NumPy structured array sorted
+by updated_at with one point per day, the latest of that day. Pairs are loaded on
+first request, afterwards only rows newer than the watermark are fetched.
+The watermark is the newest updated_at held, rows can reach the replica after newer
+ones so every refresh re-reads OVERLAP seconds before it.
+Days are UTC days, matching the BGS tick.
+"""
+from __future__ import absolute_import, print_function
+import collections
+import datetime
+import logging
+import threading
+import time
+
+import numpy as np
+
+import cogdb.side
+
+
+DAY = 60 * 60 * 24
+HISTORY_DAYS = 30
+OVERLAP = 60 * 60
+REFRESH = 60
+POINT_DTYPE = np.dtype([('updated_at', np.int64), ('influence', np.float64),
+                        ('state_id', np.int32)])
+ROW_DTYPE = np.dtype([('system_id', np.int64), ('faction_id', np.int64)] + POINT_DTYPE.descr)
+
+
+class InfPoint(collections.namedtuple('InfPoint', ['system_id', 'faction_id', 'updated_at',
+                                                   'influence', 'state_id'])):
+    """ A single day of influence for a faction in a system. """
+    __slots__ = ()
+
+    @property
+    def date(self):
+        return datetime.datetime.fromtimestamp(self.updated_at)
+
+    @property
+    def short_date(self):
+        return '{}/{}'.format(self.date.day, self.date.month)
+
+
+def compact(points, oldest=0):
+    """
+    Sort points by updated_at, keep only the last point of every day and drop
+    any points before oldest.
+
+    Returns: The compacted array.
+    """
+    points = points[np.argsort(points['updated_at'], kind='mergesort')]
+    points = points[points['updated_at'] >= oldest]
+    days = points['updated_at'] // DAY
+    keep = np.ones(len(points), dtype=bool)
+    keep[:-1] = days[1:] != days[:-1]
+
+    return points[keep]
+
+
+def rows_to_array(rows):
+    """
+    Convert rows of (system_id, faction_id, updated_at, influence, state_id) to ROW_DTYPE.
+    A missing state_id is stored as -1.
+    """
+    return np.array([(row[0], row[1], row[2], float(row[3]),
+                      row[4] if row[4] is not None else -1) for row in rows], dtype=ROW_DTYPE)
+
+
+class InfluenceStore(object):
+    """
+    Influence history of (system_id, faction_id) pairs.
+
+    Arrays are replaced, never modified in place, readers need no lock.
+    """
+    def __init__(self, days=HISTORY_DAYS, refresh=REFRESH):
+        self.days = days
+        self.refresh_interval = refresh
+        self.series = {}
+        self.watermark = 0
+        self.refreshed_at = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        keys = ['days', 'refresh_interval', 'watermark', 'refreshed_at']
+        kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
+        kwargs += ['pairs={!r}'.format(len(self.series))]
+
+        return "{}({})".format(self.__class__.__name__, ', '.join(kwargs))
+
+    def __len__(self):
+        return len(self.series)
+
+    def __contains__(self, pair):
+        return tuple(pair) in self.series
+
+    @property
+    def oldest(self):
+        """ The oldest updated_at retained. """
+        return int(time.time()) - self.days * DAY
+
+    def merge(self, rows):
+        """
+        Merge new rows into the store.
+
+        Args:
+            rows: An array of ROW_DTYPE.
+        """
+        if not len(rows):
+            return
+
+        rows = rows[np.lexsort((rows['updated_at'], rows['faction_id'], rows['system_id']))]
+        changes = (rows['system_id'][1:] != rows['system_id'][:-1]) | \
+            (rows['faction_id'][1:] != rows['faction_id'][:-1])
+        starts = np.concatenate(([0], np.flatnonzero(changes) + 1))
+        ends = np.append(starts[1:], len(rows))
+
+        oldest = self.oldest
+        for start, end in zip(starts, ends):
+            pair = (int(rows['system_id'][start]), int(rows['faction_id'][start]))
+            points = rows[start:end][list(POINT_DTYPE.names)].astype(POINT_DTYPE)
+            try:
+                points = np.concatenate((self.series[pair], points))
+            except KeyError:
+                pass
+            self.series[pair] = compact(points, oldest)
+
+        self.watermark = max(self.watermark, int(rows['updated_at'].max()))
+
+    def load(self, session, pairs):
+        """
+        Load full history of pairs not yet in the store.
+        """
+        missing = [tuple(pair) for pair in pairs if tuple(pair) not in self.series]
+        if not missing:
+            return
+
+        hist = cogdb.side.InfluenceHistory
+        rows = session.query(hist.system_id, hist.faction_id, hist.updated_at,
+                             hist.influence, hist.state_id).\
+            filter(hist.system_id.in_({pair[0] for pair in missing}),
+                   hist.faction_id.in_({pair[1] for pair in missing}),
+                   hist.updated_at >= self.oldest).\
+            all()
+        wanted = set(missing)
+        rows = [row for row in rows if (row[0], row[1]) in wanted]
+
+        for pair in missing:
+            self.series[pair] = np.zeros(0, dtype=POINT_DTYPE)
+        self.merge(rows_to_array(rows))
+
+    def refresh(self, session, force=False):
+        """
+        Fetch rows newer than the watermark, less OVERLAP, for systems in the store.
+        Skipped if refreshed within the refresh interval unless forced.
+
+        Returns: The number of rows fetched.
+        """
+        now = int(time.time())
+        if not self.series or (not force and now - self.refreshed_at < self.refresh_interval):
+            return 0
+
+        hist = cogdb.side.InfluenceHistory
+        with self.lock:
+            system_ids = {pair[0] for pair in self.series}
+            rows = session.query(hist.system_id, hist.faction_id, hist.updated_at,
+                                 hist.influence, hist.state_id).\
+                filter(hist.updated_at > max(self.watermark - OVERLAP, self.oldest),
+                       hist.system_id.in_(system_ids)).\
+                all()
+            rows = [row for row in rows if (row[0], row[1]) in self.series]
+            self.merge(rows_to_array(rows))
+            self.refreshed_at = now
+
+        logging.getLogger('cogdb.timeseries').info('TIMESERIES - Refreshed %d rows.', len(rows))
+        return len(rows)
+
+    def expire(self, *_):
+        """
+        Force a refresh on the next ensure, subscribed to BGS ticks.
+        """
+        self.refreshed_at = 0
+
+    def ensure(self, session, pairs):
+        """
+        Ensure pairs are loaded and the store is current.
+        """
+        with self.lock:
+            self.load(session, pairs)
+        self.refresh(session)
+
+    def points(self, system_id, faction_id, since=0):
+        """
+        Returns: The array of points for the pair at or after since, oldest first.
+        """
+        try:
+            points = self.series[(system_id, faction_id)]
+        except KeyError:
+            return np.zeros(0, dtype=POINT_DTYPE)
+
+        return points[np.searchsorted(points['updated_at'], since):]
+
+    def history(self, system_id, faction_id, since=None):
+        """
+        Returns: A list of InfPoint at or after since, newest first. Default last 5 days.
+        """
+        if since is None:
+            since = time.time() - 5 * DAY
+
+        return [InfPoint(system_id, faction_id, int(point['updated_at']),
+                         float(point['influence']), int(point['state_id']))
+                for point in self.points(system_id, faction_id, since)[::-1]]
+
+    def oldest_since(self, system_id, faction_id, since):
+        """
+        Returns: The influence of the oldest point at or after since, None if no points.
+        """
+        points = self.points(system_id, faction_id, since)
+        return float(points['influence'][0]) if len(points) else None
+
+    def delta(self, system_id, faction_id, current, days=5):
+        """
+        Change of influence over the last days, current if no history.
+        """
+        old = self.oldest_since(system_id, faction_id, time.time() - days * DAY)
+        return current - old if old is not None else current
+
+
+STORE = InfluenceStore()
+
+
+def daily_matrix(store, pairs, days=7, now=None):
+    """
+    Resample the history of pairs onto a grid of the last days, oldest first.
+    Missing days carry the previous value, days before the first point carry the first.
+
+    Returns: (matrix, valid)
+        matrix: Array of shape (len(pairs), days).
+        valid: Boolean array, True if the pair had any points in the window.
+    """
+    if now is None:
+        now = time.time()
+    grid = int(now) // DAY - np.arange(days)[::-1]
+    matrix = np.full((len(pairs), days), np.nan)
+    for ind, (system_id, faction_id) in enumerate(pairs):
+        points = store.points(system_id, faction_id, grid[0] * DAY)
+        matrix[ind, np.searchsorted(grid, points['updated_at'] // DAY)] = points['influence']
+
+    valid = ~np.isnan(matrix).all(axis=1)
+    cols = np.arange(days)
+    last = np.maximum.accumulate(np.where(np.isnan(matrix), 0, cols), axis=1)
+    matrix = matrix[np.arange(len(pairs))[:, None], last]
+    first = np.argmax(~np.isnan(matrix), axis=1)
+    matrix = np.where(np.isnan(matrix), matrix[np.arange(len(pairs)), first][:, None], matrix)
+
+    return np.nan_to_num(matrix), valid
+
+
+def fit_trends(matrix):
+    """
+    Fit a quadratic to every row of matrix, today is the last column.
+
+    Returns: (current, velocity, acceleration), arrays of the fitted influence today,
+             its change per day and change of that per day.
+    """
+    x_days = np.arange(matrix.shape[1]) - (matrix.shape[1] - 1)
+    quad, lin, const = np.polyfit(x_days, matrix.T, 2)
+
+    return const, lin, 2 * quad
+
+
+def days_to_crossover(system_ids, current, velocity):
+    """
+    Project when each faction would cross the leader of its system, assuming constant velocity.
+    For the leader the rival is the runner up.
+
+    Returns: Array of days until crossover, inf if never.
+    """
+    count = len(system_ids)
+    if not count:
+        return np.zeros(0)
+
+    order = np.lexsort((-current, system_ids))
+    sys_ids, cur, vel = system_ids[order], current[order], velocity[order]
+    inds = np.arange(count)
+    leader = np.r_[True, sys_ids[1:] != sys_ids[:-1]]
+    has_next = np.r_[sys_ids[1:] == sys_ids[:-1], False]
+    start = np.maximum.accumulate(np.where(leader, inds, 0))
+    runner = np.where(has_next, np.minimum(inds + 1, count - 1), inds)
+
+    high = np.where(leader, inds, start)
+    low = np.where(leader, runner, inds)
+    gap = cur[high] - cur[low]
+    closing = vel[low] - vel[high]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days = np.where((closing > 0) & (high != low), gap / closing, np.inf)
+
+    result = np.empty(count)
+    result[order] = days
+    return result
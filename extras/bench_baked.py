@@ -0,0 +1,130 @@
+"""
+Micro benchmark of the hot query paths, rebuilt ORM queries versus the baked ones in cogdb.
+
+Runs against in memory SQLite stand-ins so only the ORM overhead is measured.
+Importing cogdb needs the usual config, no databases are queried.
+
+    python extras/bench_baked.py [calls]
+"""
+from __future__ import absolute_import, print_function
+import collections
+import datetime
+import sys
+import time
+
+import sqlalchemy as sqla
+import sqlalchemy.orm as sqla_orm
+
+import cogdb.query
+import cogdb.schema
+import cogdb.side
+from cogdb.schema import ChannelPerm, DUser, RolePerm, System
+from cogdb.side import BGSTick, Faction, Government, Influence, PILOTS_FED_FACTION_ID
+
+NOW = datetime.datetime(2018, 5, 1)
+Role = collections.namedtuple('Role', ['name'])
+
+
+def make_sessions():
+    """ Returns: (main, side) sessions on populated in memory SQLite. """
+    engine = sqla.create_engine('sqlite://')
+    cogdb.schema.Base.metadata.create_all(engine)
+    session = sqla_orm.sessionmaker(bind=engine)()
+    session.add_all([DUser(id=str(ind), display_name='User' + str(ind), pref_name='User' + str(ind))
+                     for ind in range(100)])
+    session.add_all([System(id=ind, name='System' + str(ind), fort_status=0, trigger=5000,
+                            sheet_col='F', sheet_order=ind) for ind in range(50)])
+    session.add_all([ChannelPerm(cmd='Drop', server='Server', channel='ops'),
+                     RolePerm(cmd='Drop', server='Server', role='Member')])
+    session.commit()
+
+    side_engine = sqla.create_engine('sqlite://')
+    cogdb.side.Base.metadata.create_all(side_engine)
+    side_session = sqla_orm.sessionmaker(bind=side_engine)()
+    side_session.add_all([BGSTick(day=(NOW + datetime.timedelta(days=ind)).date(),
+                                  tick=NOW + datetime.timedelta(days=ind, hours=3))
+                          for ind in range(10)])
+    side_session.add_all([
+        cogdb.side.System(id=1, name='Sol', x=0, y=0, z=0),
+        Government(id=1, text='Democracy'),
+    ])
+    side_session.add_all([Faction(id=ind, name='Faction' + str(ind), government_id=1)
+                          for ind in range(1, 8)])
+    side_session.add_all([Influence(system_id=1, faction_id=ind, influence=10 + ind,
+                                    updated_at=1525000000) for ind in range(1, 8)])
+    side_session.commit()
+
+    return session, side_session
+
+
+# Previous implementations, the query is rebuilt and compiled every call
+def old_get_duser(session, discord_id):
+    return session.query(DUser).filter_by(id=discord_id).one()
+
+
+def old_fort_find_system(session, system_name):
+    return session.query(System).filter_by(name=system_name).one()
+
+
+def old_check_channel_perms(session, cmd, server_name, channel_name):
+    return [perm.channel for perm in session.query(ChannelPerm).
+            filter_by(cmd=cmd, server=server_name)]
+
+
+def old_check_role_perms(session, cmd, server_name, member_roles):
+    return set([perm.role for perm in session.query(RolePerm).
+                filter_by(cmd=cmd, server=server_name)])
+
+
+def old_next_bgs_tick(session, now):
+    return session.query(BGSTick.tick).filter(BGSTick.tick > now).\
+        order_by(BGSTick.tick).limit(1).first()
+
+
+def old_influence_in_system(session, system):
+    subq = session.query(cogdb.side.System.id).filter(cogdb.side.System.name == system).subquery()
+    return session.query(Influence.influence, Influence.updated_at, Faction.name,
+                         Faction.is_player_faction, Government.text).\
+        filter(Influence.system_id == subq,
+               Faction.id != PILOTS_FED_FACTION_ID).\
+        join(Faction, Influence.faction_id == Faction.id).\
+        join(Government, Faction.government_id == Government.id).\
+        order_by(Influence.influence.desc()).\
+        all()
+
+
+def per_call(func, calls, *args):
+    """ Returns: Microseconds per call of func. """
+    func(*args)
+    start = time.perf_counter()
+    for _ in range(calls):
+        func(*args)
+
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    session, side_session = make_sessions()
+    cases = [
+        ['get_duser', old_get_duser, cogdb.query.get_duser, session, '42'],
+        ['fort_find_system', old_fort_find_system, cogdb.query.fort_find_system,
+         session, 'System25'],
+        ['check_channel_perms', old_check_channel_perms, cogdb.query.check_channel_perms,
+         session, 'Drop', 'Server', 'ops'],
+        ['check_role_perms', old_check_role_perms, cogdb.query.check_role_perms,
+         session, 'Drop', 'Server', [Role('Member')]],
+        ['next_bgs_tick', old_next_bgs_tick, cogdb.side.next_bgs_tick, side_session, NOW],
+        ['influence_in_system', old_influence_in_system, cogdb.side.influence_in_system,
+         side_session, 'Sol'],
+    ]
+
+    print('{} calls each, microseconds per call'.format(calls))
+    print('{:20} {:>10} {:>10} {:>8}'.format('Function', 'Before', 'After', 'Speedup'))
+    for name, old, new, *args in cases:
+        before, after = per_call(old, calls, *args), per_call(new, calls, *args)
+        print('{:20} {:10.1f} {:10.1f} {:7.2f}x'.format(name, before, after, before / after))
+
+
+if __name__ == "__main__":
+    main()
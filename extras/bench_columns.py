@@ -0,0 +1,58 @@
+"""
+Micro benchmark of A1 column conversion, the old counter walk versus arithmetic.
+
+    python extras/bench_columns.py
+"""
+from __future__ import absolute_import, print_function
+import time
+
+import cog.exc
+import cog.sheets
+
+COLUMNS = ['A', 'Z', 'AZ', 'ZZ', 'ALL']
+
+
+def walk_to_index(col_str):
+    """ Previous conversion, walk a ColCnt based column forward until it matches. """
+    counters = [cog.sheets.ColCnt('A')]
+    cnt = 0
+    while ''.join(str(counter) for counter in reversed(counters)) != col_str:
+        for counter in counters:
+            try:
+                counter.next()
+                break
+            except cog.exc.ColOverflow:
+                pass
+        else:
+            counters.append(cog.sheets.ColCnt('A'))
+        cnt += 1
+
+    return cnt
+
+
+def per_call(func, calls, *args):
+    """ Returns: Microseconds per call of func. """
+    func(*args)
+    start = time.perf_counter()
+    for _ in range(calls):
+        func(*args)
+
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    print('{:8} {:>6} {:>12} {:>12} {:>10}'.format('Column', 'Index', 'Walk', 'Arithmetic',
+                                                   'Speedup'))
+    for col_str in COLUMNS:
+        index = walk_to_index(col_str)
+        assert index == cog.sheets.column_to_index(col_str)
+        before = per_call(walk_to_index, 5, col_str)
+        after = per_call(cog.sheets.column_to_index.__wrapped__, 1000, col_str)
+        print('{:8} {:6d} {:12.1f} {:12.2f} {:9.0f}x'.format(col_str, index, before, after,
+                                                             before / after))
+    cached = per_call(cog.sheets.column_to_index, 1000, COLUMNS[-1])
+    print('Cached lookup {:.2f} us'.format(cached))
+
+
+if __name__ == "__main__":
+    main()
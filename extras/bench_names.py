@@ -0,0 +1,56 @@
+"""
+Micro benchmark of name lookups, the linear substr_match scan versus cogdb.names.
+
+Names are synthetic but shaped like systems, default 20000 of them.
+
+    python extras/bench_names.py [names]
+"""
+from __future__ import absolute_import, print_function
+import sys
+import time
+
+import cog.util
+import cogdb.names
+
+PARTS = ['Alpha', 'Beta', 'Col', 'Delta', 'HIP', 'LHS', 'Wolf', 'Synuefe', 'Praea Euq',
+         'Eol Prou', 'Hyades Sector', 'Pleiades Sector', 'Ross', 'Gliese', 'LTT', 'BD+42']
+NEEDLES = ['Synuefe Ross 19', 'hyades sector 7', 'Pleiades Col 123', 'wolf', 'lhs 3',
+           'euq eol 4441', 'Alpah Beta 17']
+
+
+def linear(names, needle):
+    """ Previous lookup, every name checked with substr_match. """
+    return [name for name in names if cog.util.substr_match(needle, name)]
+
+
+def per_call(func, calls, *args):
+    """ Returns: Microseconds per call of func. """
+    func(*args)
+    start = time.perf_counter()
+    for _ in range(calls):
+        func(*args)
+
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    size = len(PARTS)
+    names = ['{} {} {}'.format(PARTS[num % size], PARTS[num // size % size], num)
+             for num in range(count)]
+
+    start = time.perf_counter()
+    index = cogdb.names.NameIndex(names)
+    print('{} names indexed in {:.0f} ms'.format(count, (time.perf_counter() - start) * 1e3))
+
+    header = ['Needle', 'Matches', 'Linear', 'Index', 'Speedup']
+    print('{:20} {:>8} {:>12} {:>10} {:>8}'.format(*header))
+    for needle in NEEDLES:
+        before = per_call(linear, 3, names, needle)
+        after = per_call(index.suggest, 50, needle)
+        print('{:20} {:8d} {:12.1f} {:10.1f} {:7.1f}x'.format(
+            needle, len(index.find(needle)), before, after, before / after))
+
+
+if __name__ == "__main__":
+    main()
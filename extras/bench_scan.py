@@ -0,0 +1,110 @@
+"""
+Benchmark of persisting sheet scans, the old ORM path versus the bulk and diff paths.
+
+Sheets of the requested users and systems are generated by tests/data,
+then scanned into an in memory SQLite. Importing cogdb needs the usual config,
+cogdb.Session is rebound so no configured database is touched.
+
+    python extras/bench_scan.py [users] [systems]
+"""
+from __future__ import absolute_import, print_function
+import sys
+import time
+
+import sqlalchemy as sqla
+import sqlalchemy.pool
+
+import cog.sheets
+import cogdb
+import cogdb.query
+import cogdb.schema
+from tests.data import synthetic_fort, synthetic_um
+
+REPEAT = 3
+
+
+class BenchSheet(object):
+    """ Stands in for GSheet, serves the cells from memory. """
+    def __init__(self, name, cells):
+        self.sheet_id = name
+        self.page = "'Bench'"
+        self.cells = cells
+
+    def version(self):
+        return 1
+
+    def whole_sheet(self):
+        return self.cells
+
+    def batch_get(self, cell_ranges, dim='COLUMNS'):
+        found = []
+        for cell_range in cell_ranges:
+            col1, row1, col2, row2 = cog.sheets.parse_range(cell_range)
+            row2 = None if row2 is None else row2 + 1
+            found += [[col[row1:row2] for col in self.cells[col1:col2 + 1]]]
+
+        return found
+
+
+def old_scan(scanner):
+    """ Previous persistence, ORM deletes per object and add_all. """
+    scanner.cells = scanner.gsheet.whole_sheet()
+    if isinstance(scanner, cogdb.query.FortScanner):
+        scanner.system_col = scanner.find_system_column()
+        systems = scanner.fort_systems() + scanner.prep_systems()
+        users = scanner.users(*scanner.users_args, first_id=1)
+    else:
+        systems = scanner.systems()
+        users = scanner.users(*scanner.users_args, first_id=1001)
+    merits = scanner.merits(systems, users)
+
+    session = cogdb.Session()
+    for cls in scanner.db_classes:
+        for matched in session.query(cls):
+            session.delete(matched)
+    session.commit()
+    session.add_all(systems + users)
+    session.commit()
+    session.add_all(merits)
+    session.commit()
+    session.close()
+
+
+def timed(func, *args):
+    """ Returns: Milliseconds of the best of REPEAT runs of func, less noise from gc. """
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func(*args)
+        took = (time.perf_counter() - start) * 1e3
+        best = took if best is None else min(best, took)
+
+    return best
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    systems = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    if not cogdb.query.HUDSON_CONTROLS:
+        cogdb.query.HUDSON_CONTROLS.append('Frey')
+
+    engine = sqla.create_engine('sqlite://', poolclass=sqlalchemy.pool.StaticPool,
+                                connect_args={'check_same_thread': False})
+    cogdb.schema.Base.metadata.create_all(engine)
+    cogdb.Session.configure(bind=engine)
+
+    print('{} users x {} systems, milliseconds per scan, best of {}'.format(
+        users, systems, REPEAT))
+    print('{:12} {:>10} {:>10} {:>12}'.format('Scanner', 'Old ORM', 'Bulk', 'Diff steady'))
+    fort = synthetic_fort(users, systems, control=cogdb.query.HUDSON_CONTROLS[0])
+    for name, cls, cells in [('FortScanner', cogdb.query.FortScanner, fort),
+                             ('UMScanner', cogdb.query.UMScanner, synthetic_um(users, systems))]:
+        scanner = cls(BenchSheet(name, cells))
+        old = timed(old_scan, scanner)
+        bulk = timed(scanner.scan, False)
+        diff = timed(scanner.scan, True)
+        print('{:12} {:10.0f} {:10.0f} {:12.0f}'.format(name, old, bulk, diff))
+
+
+if __name__ == "__main__":
+    main()
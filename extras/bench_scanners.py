@@ -0,0 +1,139 @@
+"""
+Benchmark of the sheet scanners by phase on synthetic sheets, see tests/data.py.
+
+Each sheet is served by the local stand-in of tests/fake_sheets.py, fetched,
+parsed and persisted into an in memory SQLite. Every phase is timed and reported
+with its throughput, the peak memory of a whole scan is traced on a second run.
+Importing cogdb needs the usual config, cogdb.Session is rebound so no configured
+database is touched.
+
+    python extras/bench_scanners.py [users] [systems] [kos_rows]
+"""
+from __future__ import absolute_import, print_function
+import sys
+import time
+import tracemalloc
+
+import sqlalchemy as sqla
+import sqlalchemy.pool
+
+import cog.sheets
+import cogdb
+import cogdb.query
+import cogdb.schema
+from tests.data import synthetic_fort, synthetic_kos, synthetic_um
+from tests.fake_sheets import FakeSheets
+
+HEADER = ['Scanner', 'Phase', 'Rows', 'ms', 'Rows/s']
+
+
+def timed(func, *args):
+    """ Returns: (result, milliseconds to run func). """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1e3
+
+
+def reset_db():
+    """ Bind cogdb.Session to a new empty in memory SQLite. """
+    engine = sqla.create_engine('sqlite://', poolclass=sqlalchemy.pool.StaticPool,
+                                connect_args={'check_same_thread': False})
+    cogdb.schema.Base.metadata.create_all(engine)
+    cogdb.Session.configure(bind=engine)
+
+
+def phases_sheet(scanner):
+    """
+    Run a fort or um scan phase by phase.
+
+    Returns: [(phase, rows, ms), ...]
+    """
+    cells, fetch_ms = timed(scanner.fetch_cells)
+    scanner.cells = cells
+    if isinstance(scanner, cogdb.query.FortScanner):
+        scanner.system_col = scanner.find_system_column()
+    systems, systems_ms = timed(scanner.systems)
+    users, users_ms = timed(scanner.users, *scanner.users_args)
+    merits, merits_ms = timed(scanner.merits, systems, users)
+    _, persist_ms = timed(scanner.flush_entries, systems, users, merits, False)
+
+    return [
+        ('fetch', sum(len(col) for col in cells), fetch_ms),
+        ('systems', len(systems), systems_ms),
+        ('users', len(users), users_ms),
+        ('merits', len(merits), merits_ms),
+        ('persist', len(systems) + len(users) + len(merits), persist_ms),
+    ]
+
+
+def phases_kos(scanner):
+    """
+    Run a kos scan phase by phase.
+
+    Returns: [(phase, rows, ms), ...]
+    """
+    scanner.cells, fetch_ms = timed(scanner.gsheet.get, '!A:D', 'ROWS')
+    rows, parse_ms = timed(scanner.parse_rows)
+
+    def persist():
+        session = cogdb.Session()
+        scanner.drop_entries(session)
+        cogdb.query.bulk_insert(session, rows)
+        session.commit()
+        session.close()
+    _, persist_ms = timed(persist)
+
+    return [
+        ('fetch', len(scanner.cells), fetch_ms),
+        ('parse', len(rows), parse_ms),
+        ('persist', len(rows), persist_ms),
+    ]
+
+
+def peak_memory(func, scanner):
+    """ Returns: Peak MiB traced while running func on scanner against an empty db. """
+    reset_db()
+    tracemalloc.start()
+    func(scanner)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return peak / 2 ** 20
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    systems = int(sys.argv[2]) if len(sys.argv) > 2 else 80
+    kos_rows = int(sys.argv[3]) if len(sys.argv) > 3 else 5000
+    if not cogdb.query.HUDSON_CONTROLS:
+        cogdb.query.HUDSON_CONTROLS.append('Frey')
+
+    kos = synthetic_kos(kos_rows)
+    fake = FakeSheets({
+        'fort': {'Bench': synthetic_fort(users, systems, control=cogdb.query.HUDSON_CONTROLS[0])},
+        'um': {'Bench': synthetic_um(users, systems)},
+        'kos': {'Bench': [list(col) for col in zip(*kos)]},
+    })
+    fake.start()
+
+    print('{} users x {} systems, {} kos rows'.format(users, systems, kos_rows))
+    lines = [HEADER]
+    for name, cls, func in [('FortScanner', cogdb.query.FortScanner, phases_sheet),
+                            ('UMScanner', cogdb.query.UMScanner, phases_sheet),
+                            ('KOSScanner', cogdb.query.KOSScanner, phases_kos)]:
+        sheet_id = name[:-7].lower()
+        scanner = cls(cog.sheets.GSheet(fake.sheet_config(sheet_id, 'Bench'), None, None))
+        reset_db()
+        for phase, rows, msecs in func(scanner):
+            lines += [[name, phase, rows, '{:.1f}'.format(msecs),
+                       '{:.0f}'.format(rows / msecs * 1e3 if msecs else 0)]]
+        lines += [[name, 'peak MiB', '', '{:.1f}'.format(peak_memory(func, scanner)), '']]
+
+    fake.stop()
+    widths = [max(len(str(line[ind])) for line in lines) for ind in range(len(HEADER))]
+    for line in lines:
+        print('  '.join(str(val).rjust(width) for val, width in zip(line, widths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark of sheet job latency, a fresh process per job versus a long lived worker.
+
+A local HTTP server stands in for the Sheets API. Like GSheet, a job builds its client
+on first use with a token and a discovery request, then fetches the cells over the
+kept alive connection. Importing cog needs the usual config.
+
+    python extras/bench_workers.py [jobs]
+"""
+from __future__ import absolute_import, print_function
+import http.server
+import json
+import socketserver
+import sys
+import threading
+import time
+
+import httplib2
+import pebble
+
+import cog.jobs
+
+CLIENT = {}
+DISCOVERY = json.dumps({'resources': {'method{}'.format(ind): {'path': 'v4/' + 'x' * 64}
+                                      for ind in range(2000)}}).encode()
+CELLS = json.dumps({'values': [[ind] * 60 for ind in range(300)]}).encode()
+
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    """ Serves a token, a discovery document and cells. """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        body = {'/token': b'{"access_token": "bench"}', '/discovery': DISCOVERY}.get(
+            self.path, CELLS)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+class StandInServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """ Threaded so kept alive connections do not block each other. """
+    daemon_threads = True
+
+
+def fetch_cells(url):
+    """ Executes in the job process, the client is built once per process. """
+    if not CLIENT:
+        http = httplib2.Http()
+        http.request(url + '/token')
+        json.loads(http.request(url + '/discovery')[1].decode())
+        CLIENT['http'] = http
+
+    return len(json.loads(CLIENT['http'].request(url + '/cells')[1].decode())['values'])
+
+
+def timed(pool, url, jobs):
+    """ Returns: Milliseconds per job, from schedule to result. """
+    times = []
+    for _ in range(jobs):
+        start = time.perf_counter()
+        pool.schedule(fetch_cells, args=[url]).result(30)
+        times += [(time.perf_counter() - start) * 1e3]
+
+    return times
+
+
+def main():
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    server = StandInServer(('127.0.0.1', 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+    fresh = pebble.ProcessPool(max_workers=1, max_tasks=1)
+    worker = cog.jobs.Worker('bench')
+    print('{} jobs, milliseconds per job'.format(jobs))
+    print('{:16} {:>8} {:>8} {:>8}'.format('Pool', 'First', 'Median', 'Max'))
+    for name, pool in [('Fresh process', fresh), ('Worker', worker.pool)]:
+        times = timed(pool, url, jobs)
+        rest = sorted(times[1:])
+        print('{:16} {:8.1f} {:8.1f} {:8.1f}'.format(name, times[0], rest[len(rest) // 2],
+                                                     rest[-1]))
+
+    fresh.close()
+    fresh.join()
+    worker.stop()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -263,9 +263,10 @@ SHORT_DESC = 'The Elite Federal Discord Bot'
 MY_NAME = 'Jeremy Pallats / starcraft.man'
 MY_EMAIL = 'N/A'
 # Sanic stuck on 0.6.0, 0.7.0 wants websockets >4.0 but discord.py wants <4.0
-RUN_DEPS = ['aiofiles', 'aiozmq', 'argparse', 'cffi', 'decorator', 'discord.py==0.16.12',
-            'google-api-python-client', 'ijson', 'msgpack-python', 'oauth2client',
-            'pebble', 'pymysql', 'pyyaml', 'pyzmq', 'Sanic==0.6.0', 'SQLalchemy', 'uvloop']
+RUN_DEPS = ['aiofiles', 'aiomysql', 'aiozmq', 'argparse', 'cffi', 'decorator',
+            'discord.py==0.16.12', 'google-api-python-client', 'ijson', 'msgpack-python', 'numpy',
+            'oauth2client', 'pebble', 'pymysql', 'pyyaml', 'pyzmq', 'Sanic==0.6.0', 'SQLalchemy',
+            'uvloop']
 TEST_DEPS = ['coverage', 'flake8', 'aiomock', 'mock', 'pylint', 'pytest', 'pytest-asyncio',
              'pytest-cov', 'sphinx', 'tox']
 setup(
@@ -7,6 +7,7 @@ Important Note Regarding DB:
     After executing an action ALWAYS make a new Session(). The old one will still be stale.
 """
 from __future__ import absolute_import, print_function
+import asyncio
 import re
 
 import aiomock
@@ -45,15 +46,14 @@ def patch_scanners():
     old_scanners = cog.actions.SCANNERS
 
     scanner = aiomock.Mock()
-    scanner.update_system.return_value = None
-    scanner.update_drop.return_value = None
-    scanner.update_hold.return_value = None
-    scanner.update_sheet_user.return_value = None
+    for name in ['drop_cells', 'hold_cells', 'system_cells', 'sheet_user_cells']:
+        getattr(scanner, name).side_effect = lambda *_: {}
     cog.actions.SCANNERS = {'hudson_cattle': scanner, 'hudson_undermine': scanner}
 
     yield
 
     cog.actions.SCANNERS = old_scanners
+    cog.jobs.WRITERS.clear()
 
 
 def action_map(fake_message, fake_bot):
@@ -133,6 +133,18 @@ async def test_cmd_bgs_dash(side_session, f_systems, f_bot):
     assert 'Chelgit' in str(f_bot.send_long_message.call_args).replace("\\n", "\n")
 
 
+@pytest.mark.asyncio
+async def test_cmd_bgs_edmc(side_session, f_bot):
+    msg = fake_msg_gears("!bgs edmc Rana, Frey")
+
+    await action_map(msg, f_bot).execute()
+
+    result = str(f_bot.send_long_message.call_args).replace("\\n", "\n")
+    assert "__Bubbles By Proximity__" in result
+    assert "__Rana__" in result
+    assert "__Frey__" in result
+
+
 @pytest.mark.asyncio
 async def test_cmd_bgs_exp(f_bot):
     msg = fake_msg_gears("!bgs exp rana")
@@ -182,6 +194,19 @@ async def test_cmd_bgs_inf(side_session, f_bot):
     assert "Mother Gaia" in str(f_bot.send_long_message.call_args).replace("\\n", "\n")
 
 
+@pytest.mark.asyncio
+async def test_cmd_bgs_inf_concurrent(side_session, f_bot):
+    """ A burst of !bgs inf is served by the async pool, never the executor. """
+    msgs = [fake_msg_gears("!bgs inf Sol") for _ in range(10)]
+
+    await asyncio.gather(*[action_map(msg, f_bot).execute() for msg in msgs])
+
+    assert not f_bot.loop.run_in_executor.called
+    assert f_bot.send_long_message.call_count == 10
+    for call in f_bot.send_long_message.call_args_list:
+        assert "Mother Gaia" in str(call)
+
+
 @pytest.mark.asyncio
 async def test_cmd_bgs_sys(side_session, f_bot):
     msg = fake_msg_gears("!bgs sys Sol")
@@ -195,6 +220,17 @@ async def test_cmd_bgs_sys(side_session, f_bot):
     assert 'Owns: Abraham Lincoln (L)' in reply
 
 
+@pytest.mark.asyncio
+async def test_cmd_bgs_trend(side_session, f_bot):
+    msg = fake_msg_gears("!bgs trend Othime")
+
+    await action_map(msg, f_bot).execute()
+    reply = str(f_bot.send_long_message.call_args).replace("\\n", "\n")
+
+    assert '**Othime**' in reply
+    assert 'Vel' in reply
+
+
 @pytest.mark.asyncio
 async def test_cmd_feedback(f_bot):
     msg = fake_msg_gears("!feedback Sample bug report.")
@@ -531,6 +567,7 @@ Burr       | 0    | 8000```"""
     hold = session.query(Hold).filter_by(user_id=um.id, system_id=system.id).one()
     assert hold.held == 0
     assert hold.redeemed == 1950
+    cog.actions.get_scanner('hudson_undermine').hold_cells.assert_any_call('J', 18, '', '')
 
 
 @pytest.mark.asyncio
@@ -955,3 +992,27 @@ async def test_cmd_dist_invalid_args(session, f_bot, f_testbed):
     msg = fake_msg_gears("!dist sol, freyyyyy")
     with pytest.raises(cog.exc.InvalidCommandArgs):
         await action_map(msg, f_bot).execute()
+
+
+@pytest.mark.asyncio
+async def test_solve_routes():
+    line = [['A', 0, 0, 0], ['C', 2, 0, 0], ['B', 1, 0, 0]]
+    routes = [line, [], line[:1], [['D', 5, 0, 0]] + line]
+    result = await cog.actions.solve_routes(routes)
+
+    assert result == [
+        [2.0, ['A', 'B', 'C']],
+        [0, []],
+        [0, ['A']],
+        [5.0, ['D', 'C', 'B', 'A']],
+    ]
+
+
+def test_queue_cells():
+    cog.actions.queue_cells('hudson_cattle', {'F11': 400, 'F6': 4000})
+    cog.actions.queue_cells('hudson_cattle', {'F11': 500}, ['bot', 'msg'])
+
+    writer = cog.jobs.WRITERS['hudson_cattle']
+    assert writer.pending == {'F11': 500, 'F6': 4000}
+    assert writer.func.args == ('hudson_cattle', 'write_cells')
+    assert writer.fail_cbs == [['bot', 'msg']]
@@ -58,6 +58,8 @@ def test_no_match():
     assert str(error) == "No matches for 'Cubeo' in Systems."
     error = cog.exc.NoMatch('Person1', 'person')
     assert str(error) == "No matches for 'Person1' in persons."
+    error = cog.exc.NoMatch('Frye', 'system', ['Frey', 'Fry'])
+    assert str(error) == "No matches for 'Frye' in systems.\nDid you mean: Frey, Fry?"
 
 
 def test_name_collision_error():
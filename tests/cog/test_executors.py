@@ -0,0 +1,106 @@
+"""
+Test the named executors.
+"""
+from __future__ import absolute_import, print_function
+import asyncio
+import concurrent.futures
+import time
+
+import pytest
+
+import cog.exc
+import cog.executors
+
+
+@pytest.fixture
+def f_thread_exec():
+    executor = cog.executors.Executor('test', concurrent.futures.ThreadPoolExecutor, 2, 1)
+
+    yield executor
+
+    executor.shutdown()
+
+
+def test_timed_call():
+    start, result, end = cog.executors.timed_call(sum, [1, 2, 3])
+    assert result == 6
+    assert start <= end
+
+
+def test_executor__repr__(f_thread_exec):
+    assert repr(f_thread_exec) == "Executor(name='test', workers=2, queue=1, pending=0, "\
+                                  "peak=0, done=0, failed=0, rejected=0)"
+
+
+@pytest.mark.asyncio
+async def test_executor_run(f_thread_exec):
+    assert await f_thread_exec.run(sum, [1, 2, 3]) == 6
+    assert f_thread_exec.done == 1
+    assert f_thread_exec.pending == 0
+    assert f_thread_exec.run_max >= 0
+
+
+@pytest.mark.asyncio
+async def test_executor_run_fails(f_thread_exec):
+    with pytest.raises(TypeError):
+        await f_thread_exec.run(sum, None)
+    assert f_thread_exec.failed == 1
+    assert f_thread_exec.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_executor_rejects_when_full(f_thread_exec):
+    jobs = [asyncio.ensure_future(f_thread_exec.run(time.sleep, 0.2)) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    assert f_thread_exec.saturation == 1
+    assert f_thread_exec.queued == 1
+
+    with pytest.raises(cog.exc.BotBusy):
+        await f_thread_exec.run(time.sleep, 0.2)
+    assert f_thread_exec.rejected == 1
+
+    await asyncio.gather(*jobs)
+    assert f_thread_exec.done == 3
+    assert f_thread_exec.peak == 3
+    assert f_thread_exec.wait_max >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_executor_isolated(f_thread_exec):
+    """ Saturating one executor does not delay another. """
+    other = cog.executors.Executor('other', concurrent.futures.ThreadPoolExecutor, 1, 0)
+    try:
+        jobs = [asyncio.ensure_future(f_thread_exec.run(time.sleep, 0.5)) for _ in range(3)]
+        start = time.time()
+        assert await other.run(sum, [1, 2]) == 3
+        assert time.time() - start < 0.25
+        await asyncio.gather(*jobs)
+    finally:
+        other.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_executor_process_pool():
+    executor = cog.executors.Executor('cpu', concurrent.futures.ProcessPoolExecutor, 1, 1)
+    try:
+        assert await executor.run(sum, [1, 2, 3]) == 6
+    finally:
+        executor.shutdown()
+
+
+def test_executor_stats(f_thread_exec):
+    f_thread_exec.record(0.5, 1.5)
+    assert f_thread_exec.stats() == ['test', '0/2', '0/1', 0, 1, 0, 0,
+                                     '0.500', '0.500', '1.500', '1.500']
+
+
+def test_get_sizes():
+    assert cog.executors.get_sizes('cpu')[0] > 0
+    assert cog.executors.get_sizes('sheets') == (2, 8)
+
+
+def test_summary():
+    summary = cog.executors.summary()
+    assert summary.startswith("__Executors__")
+    for executor in cog.executors.EXECUTORS:
+        assert executor.name in summary
@@ -4,15 +4,185 @@ Test process based job system.
 TODO: This may be tricky. Have to start async monitor and processes.
 """
 from __future__ import absolute_import, print_function
-# import asyncio
-# import functools
-# import random
-# import time
+import concurrent.futures
+import functools
+import os
 
-# import mock
-# import pytest
+import mock
+import pytest
 
-# import cog.jobs
+import cog.exc
+import cog.jobs
 
-# import logging
-# logging.basicConfig()
+
+@pytest.fixture
+def f_pool():
+    """ Patch the pool, jobs are never run but can be finished by hand. """
+    old_pool = cog.jobs.POOL
+    cog.jobs.POOL = mock.Mock()
+    cog.jobs.POOL.schedule.side_effect = lambda *_: concurrent.futures.Future()
+
+    yield cog.jobs.POOL
+
+    cog.jobs.POOL = old_pool
+    cog.jobs.LIVE_JOBS[:] = []
+
+
+@pytest.fixture
+def f_writer(f_pool):
+    writer = cog.jobs.WriteBehind('hudson_cattle', mock.Mock())
+    cog.jobs.WRITERS[writer.name] = writer
+
+    yield writer
+
+    cog.jobs.WRITERS.clear()
+
+
+@pytest.fixture
+def f_worker():
+    worker = cog.jobs.register_worker('hudson_cattle', {'cells': 400})
+
+    yield worker
+
+    cog.jobs.close_workers()
+
+
+def finish(job, result=None):
+    """ Complete a running job like pool_monitor_task. """
+    job.future.set_result(result)
+    cog.jobs.LIVE_JOBS.remove(job)
+    job.finish()
+
+
+def test_writebehind__repr__(f_writer):
+    assert repr(f_writer) == "WriteBehind(name='hudson_cattle', depth=0, peak=0, writes=0, "\
+                             "flushes=0, flushed=0)"
+
+
+def test_writebehind_put(f_writer):
+    f_writer.put({'F11': 400, 'F6': 4000})
+    f_writer.put({'F11': 500, 'F7': 0}, ['bot', 'msg'])
+
+    assert f_writer.pending == {'F11': 500, 'F6': 4000, 'F7': 0}
+    assert f_writer.depth == 3
+    assert f_writer.peak == 3
+    assert f_writer.writes == 4
+    assert f_writer.fail_cbs == [['bot', 'msg']]
+
+
+@pytest.mark.asyncio
+async def test_writebehind_flush(f_writer):
+    assert await f_writer.flush() is None
+
+    f_writer.put({'F11': 400, 'F6': 4000}, ['bot', 'msg'])
+    job = await f_writer.flush()
+    assert job.func.args == ({'F11': 400, 'F6': 4000},)
+    assert job.fail_cbs == [['bot', 'msg']]
+    assert f_writer.depth == 0
+    assert f_writer.in_flight
+    assert (f_writer.flushes, f_writer.flushed) == (1, 2)
+
+    f_writer.put({'F11': 500})
+    assert await f_writer.flush() is None
+    assert f_writer.depth == 1
+
+    finish(job)
+    assert not f_writer.in_flight
+    assert f_writer.latency_max >= f_writer.latency >= 0
+    job = await f_writer.flush()
+    assert job.func.args == ({'F11': 500},)
+
+
+@pytest.mark.asyncio
+async def test_writebehind_flush_not_started(f_writer):
+    f_writer.put({'F11': 400}, ['bot', 'msg'])
+    cog.jobs.POOL.schedule.side_effect = RuntimeError
+    with mock.patch('cog.jobs.asyncio.sleep', mock.Mock(side_effect=lambda *_: noop())):
+        with pytest.raises(cog.exc.FailedJob):
+            await f_writer.flush()
+
+    assert f_writer.pending == {'F11': 400}
+    assert f_writer.fail_cbs == [['bot', 'msg']]
+    assert f_writer.flushes == 0
+
+
+async def noop():
+    """ Stands in for asyncio.sleep. """
+    pass
+
+
+def test_write_summary(f_writer):
+    f_writer.put({'F11': 400})
+    summary = cog.jobs.write_summary()
+    assert summary.startswith('__Sheet Writes__')
+    assert 'hudson_cattle' in summary
+
+
+def test_worker__repr__(f_worker):
+    assert repr(f_worker) == "Worker(name='hudson_cattle', resident={'cells': 400}, "\
+                             "jobs=0, restarts=0)"
+
+
+def test_worker_schedule(f_worker):
+    pids = [f_worker.schedule(os.getpid).result(10) for _ in range(3)]
+    assert len(set(pids)) == 1
+    assert pids[0] != os.getpid()
+    assert f_worker.schedule(functools.partial(cog.jobs.call_resident, 'hudson_cattle',
+                                               'get', 'cells')).result(10) == 400
+    assert f_worker.jobs == 4
+    assert f_worker.latency_max >= f_worker.latency > 0
+
+
+@pytest.mark.asyncio
+async def test_worker_check(f_worker):
+    assert await f_worker.check()
+
+    old_pool = f_worker.pool
+    f_worker.pool = mock.Mock()
+    f_worker.pool.schedule.side_effect = RuntimeError
+    failed_pool = f_worker.pool
+    assert not await f_worker.check()
+    assert f_worker.restarts == 1
+    assert failed_pool.join.called
+    assert await f_worker.check()
+    old_pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_replace_worker(f_worker):
+    old_pool = f_worker.pool
+    worker = await cog.jobs.replace_worker('hudson_cattle', {'cells': 500})
+    assert cog.jobs.get_pool('hudson_cattle') is worker
+    assert worker.schedule(functools.partial(cog.jobs.call_resident, 'hudson_cattle',
+                                             'get', 'cells')).result(10) == 500
+    with pytest.raises(RuntimeError):
+        old_pool.schedule(os.getpid)
+
+
+@pytest.mark.asyncio
+async def test_check_pools(f_pool):
+    f_pool.schedule.side_effect = RuntimeError
+    old_pool = cog.jobs.POOL
+    with mock.patch('cog.jobs.pebble.ProcessPool') as mock_cls:
+        await cog.jobs.check_pools()
+
+    assert cog.jobs.POOL is mock_cls.return_value
+    assert old_pool.join.called
+
+
+def test_get_pool(f_pool, f_worker):
+    assert cog.jobs.get_pool('hudson_cattle') is f_worker
+    assert cog.jobs.get_pool('hudson_undermine') is f_pool
+    assert cog.jobs.get_pool() is f_pool
+
+
+def test_job_start_worker(f_worker):
+    job = cog.jobs.Job(os.getpid, worker='hudson_cattle')
+    job.start()
+    assert job.future.result(10) == f_worker.schedule(os.getpid).result(10)
+
+
+def test_worker_summary(f_worker):
+    summary = cog.jobs.worker_summary()
+    assert summary.startswith('__Sheet Workers__')
+    assert 'hudson_cattle' in summary
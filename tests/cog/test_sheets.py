@@ -4,13 +4,27 @@ Test sheets api logic
 NOTE: GSheet tests being skipped, they are slow and that code is mostly frozen.
 """
 from __future__ import absolute_import, print_function
-
+import json
+import os
+import shutil
+import string
+import tempfile
+import time
+
+import googleapiclient.errors
+import httplib2
+import mock
 import pytest
 
 import cog.exc
 import cog.sheets
 import cog.util
 from tests.conftest import SHEET_TEST
+from tests.data import CELLS_FORT
+from tests.fake_sheets import FakeSheets
+
+DISCOVERY_DOC = json.dumps({'name': 'sheets', 'version': 'v4', 'resources': {},
+                            'rootUrl': 'https://sheets.googleapis.com/', 'servicePath': ''})
 
 
 @pytest.fixture()
@@ -44,6 +58,43 @@ def fort_sheet_reset():
     f_sheet.batch_update(cell_ranges, n_vals)
 
 
+@pytest.fixture()
+def f_fake_sheets():
+    """
+    Yield a running fake sheets server.
+    """
+    fake = FakeSheets()
+    fake.start()
+
+    yield fake
+
+    fake.stop()
+
+
+@pytest.fixture()
+def f_fake_gsheet(f_fake_sheets):
+    """
+    Yield a GSheet of the fort sheet on the fake server.
+    """
+    yield cog.sheets.GSheet(f_fake_sheets.sheet_config('fort_sheet'), None, None)
+
+
+@pytest.fixture()
+def f_discovery():
+    """
+    Yield a cache dir and an http serving DISCOVERY_DOC, process caches emptied after.
+    """
+    cache_dir = tempfile.mkdtemp()
+    http = mock.Mock()
+    http.request.return_value = (mock.Mock(status=200), DISCOVERY_DOC.encode())
+
+    yield cache_dir, http
+
+    shutil.rmtree(cache_dir)
+    for cache in [cog.sheets.AUTHORIZED, cog.sheets.DOCUMENTS, cog.sheets.SERVICES]:
+        cache.clear()
+
+
 @SHEET_TEST
 def test_gsheet_get(fort_sheet):
     assert fort_sheet.get('!B13:B13') == [['Shepron']]
@@ -134,8 +185,7 @@ def test_column__init__():
 
 def test_column__repr__():
     col1 = cog.sheets.Column('AA')
-    assert repr(col1) == "Column(counters=[ColCnt(char=65, low_bound=64, high_bound=91), "\
-                         "ColCnt(char=65, low_bound=64, high_bound=91)])"
+    assert repr(col1) == "Column(index=26)"
 
 
 def test_column_next():
@@ -164,6 +214,9 @@ def test_column_offset():
     column.offset(-5)
     assert str(column) == 'A'
 
+    column.offset(702)
+    assert str(column) == 'AAA'
+
 
 def test_column_to_index():
     column = cog.sheets.Column('A')
@@ -171,3 +224,194 @@ def test_column_to_index():
 
     column2 = cog.sheets.Column('AA')
     assert cog.sheets.column_to_index(str(column2)) == 26
+    assert cog.sheets.column_to_index('ZZ') == 701
+    assert cog.sheets.column_to_index('AAA') == 702
+
+
+def test_index_to_column():
+    assert cog.sheets.index_to_column(0) == 'A'
+    assert cog.sheets.index_to_column(25) == 'Z'
+    assert cog.sheets.index_to_column(26) == 'AA'
+    assert cog.sheets.index_to_column(701) == 'ZZ'
+
+    letters = string.ascii_uppercase
+    expect = list(letters) + [first + second for first in letters for second in letters]
+    assert [cog.sheets.index_to_column(index) for index in range(len(expect))] == expect
+    assert [cog.sheets.column_to_index(col) for col in expect] == list(range(len(expect)))
+
+
+def test_parse_range():
+    assert cog.sheets.parse_range('!D1:AB10') == (3, 0, 27, 9)
+    assert cog.sheets.parse_range('A11:B11') == (0, 10, 1, 10)
+    assert cog.sheets.parse_range('!A11:B') == (0, 10, 1, None)
+
+    with pytest.raises(ValueError):
+        cog.sheets.parse_range('!A:ZZ')
+
+
+def test_merge_ranges():
+    cell_ranges = ['!A3:B4', '!D1:E2', '!D3:E4']
+    values = [[['cry'], ['user', 'other']], [['Frey', 'head']], [[], [10, 20]]]
+    assert cog.sheets.merge_ranges(cell_ranges, values) == [
+        ['', '', 'cry'],
+        ['', '', 'user', 'other'],
+        [],
+        ['Frey', 'head'],
+        ['', '', 10, 20],
+    ]
+
+
+def test_parse_cell():
+    assert cog.sheets.parse_cell('F11') == (5, 10)
+    assert cog.sheets.parse_cell('AB1') == (27, 0)
+
+    with pytest.raises(ValueError):
+        cog.sheets.parse_cell('!F11:F11')
+
+
+def test_written_cells():
+    written = {(0, 1): 'a2', (1, 1): 'b2', (0, 0): 'a1'}
+    assert cog.sheets.written_cells(written, 1, 0, 2) == ['a2', 'b2']
+    assert cog.sheets.written_cells(written, 1, 2, 2) == []
+    assert cog.sheets.written_cells(written, 1, 1, 3) is None
+    assert cog.sheets.written_cells(written, 0, 0, 2) is None
+    assert cog.sheets.written_cells(None, 0, 0, 1) is None
+
+
+def test_plan_writes():
+    cells = {'F11': 400, 'G11': 50, 'F12': 10, 'G12': 20, 'F6': 4000, 'F7': 10, 'K11': 1}
+    assert cog.sheets.plan_writes(cells) == (
+        ['!F6:F7', '!F11:G12', '!K11:K11'],
+        [[[4000], [10]], [[400, 50], [10, 20]], [[1]]],
+    )
+
+
+def test_plan_writes_fill():
+    written = {(1, 2): 'y', (13, 2): 'n'}
+    cells = {'A3': 1, 'C3': 3, 'O3': 10, 'A4': 2, 'C4': 4}
+    assert cog.sheets.plan_writes(cells, written) == (
+        ['!A3:C3', '!O3:O3', '!A4:A4', '!C4:C4'],
+        [[[1, 'y', 3]], [[10]], [[2]], [[4]]],
+    )
+    assert cog.sheets.plan_writes(cells, written, range_cost=0) == (
+        ['!A3:A4', '!C3:C4', '!O3:O3'],
+        [[[1], [2]], [[3], [4]], [[10]]],
+    )
+
+
+def test_authorize():
+    with mock.patch('cog.sheets.get_credentials') as mock_creds:
+        first = cog.sheets.authorize('secret.json', 'token.json')
+        assert cog.sheets.authorize('secret.json', 'token.json') is first
+        assert mock_creds.call_count == 1
+    cog.sheets.AUTHORIZED.clear()
+
+
+def test_discovery_document(f_discovery):
+    cache_dir, http = f_discovery
+    assert cog.sheets.discovery_document('sheets', 'v4', http, cache_dir) == DISCOVERY_DOC
+    assert os.path.exists(os.path.join(cache_dir, 'discovery_sheets_v4.json'))
+
+    cog.sheets.DOCUMENTS.clear()
+    assert cog.sheets.discovery_document('sheets', 'v4', http, cache_dir) == DISCOVERY_DOC
+    assert http.request.call_count == 1
+
+
+def test_discovery_document_stale(f_discovery):
+    cache_dir, http = f_discovery
+    http.request.side_effect = httplib2.HttpLib2Error
+    with pytest.raises(cog.exc.RemoteError):
+        cog.sheets.discovery_document('sheets', 'v4', http, cache_dir)
+
+    fname = os.path.join(cache_dir, 'discovery_sheets_v4.json')
+    with open(fname, 'w') as fout:
+        fout.write(DISCOVERY_DOC)
+    os.utime(fname, (0, 0))
+    assert cog.sheets.discovery_document('sheets', 'v4', http, cache_dir) == DISCOVERY_DOC
+    assert http.request.call_count == 2
+
+
+def test_read_write_discovery_cache(f_discovery):
+    cache_dir, _ = f_discovery
+    fname = os.path.join(cache_dir, 'discovery_sheets_v4.json')
+    assert cog.sheets.read_discovery_cache(fname) == (None, False)
+
+    cog.sheets.write_discovery_cache(fname, DISCOVERY_DOC)
+    assert cog.sheets.read_discovery_cache(fname) == (DISCOVERY_DOC, True)
+    os.utime(fname, (0, 0))
+    assert cog.sheets.read_discovery_cache(fname) == (DISCOVERY_DOC, False)
+
+
+def test_fetch_discovery(f_discovery):
+    _, http = f_discovery
+    assert cog.sheets.fetch_discovery('sheets', 'v4', http, 'http://localhost:8000/') == \
+        DISCOVERY_DOC
+    http.request.assert_called_with('http://localhost:8000/discovery/sheets/v4')
+
+    http.request.return_value = (mock.Mock(status=404), b'{}')
+    with pytest.raises(ValueError):
+        cog.sheets.fetch_discovery('sheets', 'v4', http)
+
+
+def test_build_service(f_discovery):
+    cache_dir, http = f_discovery
+    service = cog.sheets.build_service('sheets', 'v4', http, cache_dir)
+    assert cog.sheets.build_service('sheets', 'v4', http, cache_dir) is service
+    assert cog.sheets.build_service('sheets', 'v4', mock.Mock(), cache_dir) is not service
+    assert http.request.call_count == 1
+
+
+def test_fake_gsheet_get(f_fake_gsheet):
+    assert f_fake_gsheet.get('!B13:B13') == [['TiddyMun']]
+    assert f_fake_gsheet.get('!F6:G7', dim='COLUMNS') == [[4910, 0], [4350]]
+    assert f_fake_gsheet.whole_sheet() == CELLS_FORT
+
+
+def test_fake_gsheet_batch_get(f_fake_gsheet):
+    assert f_fake_gsheet.batch_get(['!B13:B13', '!F6:G6']) == [[['TiddyMun']], [[4910, 4350]]]
+
+
+def test_fake_gsheet_update(f_fake_sheets, f_fake_gsheet):
+    assert f_fake_gsheet.version() == 1
+    f_fake_gsheet.update('!B13:B13', [['NotShepron']])
+    assert f_fake_gsheet.get('!B13:B13') == [['NotShepron']]
+    assert f_fake_gsheet.version() == 2
+
+
+def test_fake_gsheet_batch_update(f_fake_sheets, f_fake_gsheet):
+    cell_ranges = ['!B13:B14', '!F6:G6']
+    n_vals = [[['NotShepron'], ['Grimbald']], [[2222, 3333]]]
+    f_fake_gsheet.batch_update(cell_ranges, n_vals)
+
+    assert f_fake_gsheet.batch_get(cell_ranges) == n_vals
+    assert f_fake_gsheet.version() == 2
+    assert f_fake_sheets.requests['batch_update'] == 1
+
+
+def test_fake_gsheet_get_with_formatting(f_fake_sheets, f_fake_gsheet):
+    color = {'red': 0.42745098, 'blue': 0.92156863, 'green': 0.61960787}
+    f_fake_sheets.formats[('fort_sheet', 'Cycle 1', 5, 9)] = {'backgroundColor': color}
+    fmt_cells = f_fake_gsheet.get_with_formatting('!F10:G10')
+
+    values = fmt_cells['sheets'][0]['data'][0]['rowData'][0]['values']
+    assert values[0] == {'effectiveValue': {'stringValue': 'Frey'},
+                         'effectiveFormat': {'backgroundColor': color}}
+    assert values[1] == {'effectiveValue': {'stringValue': 'Nurundere'}}
+
+
+def test_fake_gsheet_quota(f_fake_sheets, f_fake_gsheet):
+    f_fake_sheets.quota = (2, 60)
+    f_fake_gsheet.get('!B13:B13')
+    f_fake_gsheet.get('!B13:B13')
+    with pytest.raises(googleapiclient.errors.HttpError) as exc:
+        f_fake_gsheet.get('!B13:B13')
+
+    assert exc.value.resp.status == 429
+    assert f_fake_sheets.requests['refused'] == 1
+
+
+def test_fake_gsheet_latency(f_fake_sheets, f_fake_gsheet):
+    f_fake_sheets.latency = 0.05
+    start = time.time()
+    f_fake_gsheet.get('!B13:B13')
+    assert time.time() - start >= 0.05
@@ -0,0 +1,131 @@
+"""
+Test the circuit breaker.
+"""
+from __future__ import absolute_import, print_function
+import time
+
+import mock
+import pytest
+import sqlalchemy.exc as sqla_exe
+
+import cog.exc
+import cogdb.breaker
+from cogdb.breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def op_error():
+    return sqla_exe.OperationalError('SELECT 1', {}, Exception('down'))
+
+
+@pytest.fixture
+def f_breaker():
+    breaker = CircuitBreaker('test', mock.Mock(), threshold=2, reset=0.1, retries=1, backoff=0)
+    yield breaker
+    cogdb.breaker.BREAKERS.remove(breaker)
+
+
+def test_breaker__repr__(f_breaker):
+    assert repr(f_breaker) == "CircuitBreaker(name='test', state='closed', failures=0, "\
+        "threshold=2, reset=0.1, retries=1, backoff=0)"
+
+
+def test_breaker_call(f_breaker):
+    assert f_breaker.call(lambda x, y=1: x + y, 1, y=2) == 3
+    assert f_breaker.state == CLOSED
+    assert f_breaker.calls == 1
+
+
+def test_breaker_retry(f_breaker):
+    func = mock.Mock(side_effect=[op_error(), 42])
+    on_retry = mock.Mock()
+
+    assert f_breaker.call(func, on_retry=on_retry) == 42
+    assert func.call_count == 2
+    assert on_retry.call_count == 1
+    assert f_breaker.retried == 1
+    assert f_breaker.failures == 0
+
+
+def test_breaker_other_errors_pass(f_breaker):
+    with pytest.raises(ValueError):
+        f_breaker.call(mock.Mock(side_effect=ValueError))
+    assert f_breaker.failures == 0
+
+
+def test_breaker_opens(f_breaker):
+    func = mock.Mock(side_effect=op_error())
+    for _ in range(2):
+        with pytest.raises(cog.exc.RemoteError):
+            f_breaker.call(func)
+
+    assert f_breaker.state == OPEN
+    assert func.call_count == 4
+
+    with pytest.raises(cog.exc.RemoteError):
+        f_breaker.call(func)
+    assert func.call_count == 4
+    assert f_breaker.rejected == 1
+    assert f_breaker.trips == 1
+
+
+def test_breaker_half_open_recovers(f_breaker):
+    f_breaker.failures = 2
+    f_breaker.trip()
+    time.sleep(0.15)
+
+    assert f_breaker.call(lambda: 42) == 42
+    assert f_breaker.probe.called
+    assert f_breaker.state == CLOSED
+
+
+def test_breaker_half_open_probe_fails(f_breaker):
+    f_breaker.probe.side_effect = op_error()
+    f_breaker.failures = 2
+    f_breaker.trip()
+    time.sleep(0.15)
+
+    func = mock.Mock()
+    with pytest.raises(cog.exc.RemoteError):
+        f_breaker.call(func)
+    assert not func.called
+    assert f_breaker.state == OPEN
+
+
+def test_breaker_half_open_probe_other_error(f_breaker):
+    """ A probe failing with a non transient error reopens, then recovers after reset. """
+    f_breaker.probe.side_effect = sqla_exe.InterfaceError('SELECT 1', {}, Exception('gone'))
+    f_breaker.failures = 2
+    f_breaker.trip()
+    time.sleep(0.15)
+
+    with pytest.raises(cog.exc.RemoteError):
+        f_breaker.call(mock.Mock())
+    assert f_breaker.state == OPEN
+
+    f_breaker.probe.side_effect = None
+    time.sleep(0.15)
+    assert f_breaker.call(lambda: 42) == 42
+    assert f_breaker.state == CLOSED
+
+
+def test_breaker_half_open_single_probe(f_breaker):
+    f_breaker.state = HALF_OPEN
+    with pytest.raises(cog.exc.RemoteError):
+        f_breaker.call(mock.Mock())
+
+
+def test_breaker_delay(f_breaker):
+    f_breaker.backoff = 0.5
+    for attempt in range(4):
+        assert 0 <= f_breaker.delay(attempt) <= 0.5 * 2 ** attempt
+
+
+def test_breaker_stats(f_breaker):
+    assert f_breaker.stats() == ['test', CLOSED, '0/2', 0, 0, 0, 0]
+
+
+def test_summary(f_breaker):
+    summary = cogdb.breaker.summary()
+    assert summary.startswith('__Breakers__')
+    assert 'test' in summary
+    assert 'side' in summary
@@ -57,3 +57,22 @@ def test_find_best_route(eddb_session):
     result = cogdb.eddb.find_best_route(eddb_session, system_names)
     assert int(result[0]) == 246
     assert [x.name for x in result[1]] == ['Arnemil', 'Nanomam', 'Sol', 'Rana', 'Frey']
+
+
+def test_route_points(eddb_session):
+    systems = cogdb.eddb.get_systems(eddb_session, ["Sol"])
+    assert cogdb.eddb.route_points(systems) == [['Sol', 0.0, 0.0, 0.0]]
+
+
+def test_best_route_points(eddb_session):
+    system_names = ["Arnemil", "Rana", "Sol", "Frey", "Nanomam"]
+    systems = cogdb.eddb.get_systems(eddb_session, system_names)
+    result = cogdb.eddb.best_route_points(cogdb.eddb.route_points(systems))
+    assert int(result[0]) == 246
+    assert result[1] == ['Arnemil', 'Nanomam', 'Sol', 'Rana', 'Frey']
+
+
+def test_best_routes_points():
+    line = [['A', 0, 0, 0], ['C', 2, 0, 0], ['B', 1, 0, 0]]
+    result = cogdb.eddb.best_routes_points([line, []])
+    assert result == [[2.0, ['A', 'B', 'C']], [0, []]]
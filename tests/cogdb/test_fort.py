@@ -0,0 +1,95 @@
+"""
+Test the in memory fort state.
+"""
+from __future__ import absolute_import, print_function
+
+import mock
+import sqlalchemy as sqla
+
+import cogdb
+import cogdb.fort
+import cogdb.names
+import cogdb.query
+from cogdb.schema import FortOrder, System
+
+
+def test_fortstate_repr(f_systems, f_prepsystem, f_fortorders):
+    assert repr(cogdb.fort.get()) == \
+        "FortState(order=['Sol', 'LPM 229', 'Othime'], systems=10, preps=1)"
+
+
+def test_fortstate_targets(f_systems, f_prepsystem):
+    state = cogdb.fort.get()
+    assert [sys.name for sys in state.targets()] == ['Nurundere', 'Othime', 'Rhea']
+    assert [sys.name for sys in state.next_targets(2)] == ['LHS 3749', 'Alpha Fornacis']
+    assert [sys.name for sys in state.deferred()] == ['Dongkum']
+    assert [sys.name for sys in state.missing(4200)] == ['Nurundere', 'LHS 3749', 'Dongkum']
+    assert [sys.name for sys in state.by_state()['fortified']] == ['Frey']
+
+
+def test_fortstate_ordered(f_systems, f_fortorders):
+    state = cogdb.fort.get().replace(order=['Frey', 'Sol', 'Missing', 'Dongkum', 'Othime'])
+    systems, finished = state.ordered()
+    assert [sys.name for sys in systems] == ['Sol', 'Othime']
+    assert finished == ['Frey', 'Dongkum']
+    assert state.targets() == [systems[0]]
+
+
+def test_get(session, f_dusers, f_sheets, f_systems, f_drops):
+    state = cogdb.fort.get()
+    assert cogdb.fort.get() is state
+
+    frey = state.by_name['Frey']
+    assert sqla.inspect(frey).detached
+    assert frey.cmdr_merits == 3700
+
+
+def test_invalidate(f_systems):
+    state = cogdb.fort.get()
+    cogdb.fort.invalidate()
+    assert cogdb.fort.get() is not state
+
+
+def test_refresh_systems(session, f_systems):
+    state = cogdb.fort.get()
+    sol = session.query(System).filter_by(name='Sol').one()
+    sol.fort_status = 5000
+    session.commit()
+
+    cogdb.fort.refresh_systems(['Sol'])
+    new_state = cogdb.fort.get()
+    assert new_state is not state
+    assert new_state.by_name['Sol'].fort_status == 5000
+    assert state.by_name['Sol'].fort_status == 2500
+    assert new_state.by_name['Frey'] is state.by_name['Frey']
+
+
+def test_refresh_systems_unknown(session, f_systems, f_prepsystem):
+    state = cogdb.fort.get()
+    session.delete(session.query(System).filter_by(name='Rhea').one())
+    session.commit()
+
+    cogdb.fort.refresh_systems(['Rhea'])
+    assert cogdb.fort.get() is not state
+    assert cogdb.fort.get().preps == []
+
+
+def test_refresh_order(session, f_systems, f_fortorders):
+    cogdb.fort.get()
+    session.delete(session.query(FortOrder).filter_by(system_name='Sol').one())
+    session.commit()
+
+    cogdb.fort.refresh_order()
+    assert cogdb.fort.get().order == ['LPM 229', 'Othime']
+
+
+def test_fortscanner_scanned(f_systems):
+    scanner = cogdb.query.FortScanner(mock.Mock())
+    state = cogdb.fort.get()
+    scanner.scanned([['merits', 0, 0, 0], ['systems', 0, 0, 0], ['sheet_users', 0, 0, 0]])
+    assert cogdb.fort.get() is state
+    assert cogdb.names.get(cogdb.names.FORT) is None
+
+    scanner.scanned([['merits', 0, 1, 0], ['systems', 0, 0, 0], ['sheet_users', 0, 0, 0]])
+    assert cogdb.fort.get() is not state
+    assert cogdb.names.get(cogdb.names.FORT).find('alpha') == ['Alpha Fornacis']
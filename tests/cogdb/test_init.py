@@ -0,0 +1,95 @@
+"""
+Test the engine and session helpers of cogdb.
+"""
+from __future__ import absolute_import, print_function
+import threading
+
+import mock
+import pytest
+import sqlalchemy
+import sqlalchemy.exc
+
+import cogdb
+
+
+@pytest.fixture
+def f_pool_engine():
+    engine = sqlalchemy.create_engine('sqlite:///:memory:', poolclass=cogdb.MeteredQueuePool,
+                                      pool_size=1, max_overflow=0, pool_timeout=0.1,
+                                      connect_args={'check_same_thread': False})
+    yield engine
+    engine.dispose()
+
+
+def test_metered_pool_checkouts(f_pool_engine):
+    for _ in range(3):
+        with f_pool_engine.connect() as conn:
+            conn.execute('SELECT 1')
+
+    pool = f_pool_engine.pool
+    assert pool.checkouts == 3
+    assert pool.timeouts == 0
+    assert pool.wait_max >= 0
+    assert pool.stats('test')[:6] == ['test', 1, 0, 0, 3, 0]
+
+
+def test_metered_pool_timeout(f_pool_engine):
+    conn = f_pool_engine.connect()
+    assert f_pool_engine.pool.stats('test')[2] == 1
+
+    with pytest.raises(sqlalchemy.exc.TimeoutError):
+        f_pool_engine.connect()
+    conn.close()
+
+    assert f_pool_engine.pool.timeouts == 1
+
+
+def test_metered_pool_wait(f_pool_engine):
+    conn = f_pool_engine.connect()
+    timer = threading.Timer(0.05, conn.close)
+    timer.start()
+    f_pool_engine.connect().close()
+    timer.join()
+
+    assert f_pool_engine.pool.wait_max >= 0.04
+
+
+def test_get_pool_config():
+    kwargs = cogdb.get_pool_config('side')
+    assert kwargs['pool_size'] == cogdb.POOL_DEFAULTS['side']['pool_size']
+    assert 'pool_timeout' in kwargs
+
+
+def test_session_scope():
+    session = mock.Mock()
+    with cogdb.session_scope(mock.Mock(return_value=session)) as scoped:
+        assert scoped is session
+
+    assert session.close.called
+    assert not session.rollback.called
+
+
+def test_session_scope_rollback():
+    session = mock.Mock()
+    with pytest.raises(ValueError):
+        with cogdb.session_scope(mock.Mock(return_value=session)):
+            raise ValueError
+
+    assert session.rollback.called
+    assert session.close.called
+
+
+def test_session_call():
+    session = mock.Mock()
+    func = mock.Mock(return_value=42)
+
+    assert cogdb.session_call(mock.Mock(return_value=session), func, 1, 2) == 42
+    func.assert_called_with(session, 1, 2)
+    assert session.close.called
+
+
+def test_pool_summary():
+    summary = cogdb.pool_summary()
+    assert '__DB Pools__' in summary
+    assert 'main' in summary
+    assert 'side' in summary
@@ -0,0 +1,160 @@
+"""
+Test the name index.
+"""
+from __future__ import absolute_import, print_function
+import time
+
+import pytest
+import sqlalchemy as sqla
+import sqlalchemy.orm as sqla_orm
+
+import cog.exc
+import cog.util
+import cogdb.names
+import cogdb.side
+from cogdb.names import NameIndex
+
+from tests.data import SYSTEMS
+
+PARTS = ['Alpha', 'Beta', 'Col', 'Delta', 'HIP', 'LHS', 'Wolf', 'Synuefe', 'Praea Euq',
+         'Eol Prou', 'Hyades Sector', 'Pleiades Sector', 'Ross', 'Gliese', 'LTT', 'BD+42']
+
+
+def synthetic_names(count):
+    """ Returns: count unique names resembling systems. """
+    size = len(PARTS)
+    return ['{} {} {}'.format(PARTS[num % size], PARTS[num // size % size], num)
+            for num in range(count)]
+
+
+@pytest.fixture
+def f_index():
+    yield NameIndex(SYSTEMS + ['Tunga', 'Tun Sector'], 'system')
+
+
+@pytest.fixture
+def f_side_session():
+    engine = sqla.create_engine('sqlite://')
+    cogdb.side.System.__table__.create(engine)
+    cogdb.side.Faction.__table__.create(engine)
+    session = sqla_orm.sessionmaker(bind=engine)()
+    session.add_all([cogdb.side.System(id=1, name='Frey'), cogdb.side.System(id=2, name='Rana'),
+                     cogdb.side.Faction(id=1, name='Frey Federal Industry')])
+    session.commit()
+    old_indexes = dict(cogdb.names.INDEXES)
+    cogdb.names.INDEXES.clear()
+
+    yield session
+
+    session.close()
+    cogdb.names.INDEXES.clear()
+    cogdb.names.INDEXES.update(old_indexes)
+
+
+def test_normalize():
+    assert cogdb.names.normalize('WW Piscis Austrini') == 'wwpiscisaustrini'
+
+
+def test_grams():
+    assert cogdb.names.grams('sol') == {'sol'}
+    assert cogdb.names.grams('so') == {'so'}
+    assert cogdb.names.grams('frey') == {'fre', 'rey'}
+
+
+def test_nameindex__repr__(f_index):
+    assert repr(f_index) == "NameIndex(kind='system', names=58)"
+
+
+def test_nameindex_find(f_index):
+    assert f_index.find('WW p') == ['WW Piscis Austrini']
+    assert f_index.find('tun') == ['Tun', 'Tunga', 'Tun Sector']
+    assert f_index.find('om') == ['Groombridge 1618']
+    assert f_index.find('lhs 3') == ['LHS 3447', 'LHS 3577', 'LHS 3749', 'LHS 3885']
+    assert f_index.find('zzzz') == []
+    assert f_index.find('') == []
+
+
+def test_nameindex_similar(f_index):
+    assert f_index.similar('Nurundree')[0] == 'Nurundere'
+    assert f_index.similar('qqqq') == []
+
+
+def test_nameindex_suggest(f_index):
+    assert f_index.suggest('tun', 2) == ['Tun', 'Tunga']
+    assert f_index.suggest('Aornumm')[0] == 'Aornum'
+
+
+def test_nameindex_resolve(f_index):
+    assert f_index.resolve('tun') == 'Tun'
+    assert f_index.resolve('wwp') == 'WW Piscis Austrini'
+    assert f_index.resolve('tung a') == 'Tunga'
+
+    with pytest.raises(cog.exc.MoreThanOneMatch):
+        f_index.resolve('tu')
+    with pytest.raises(cog.exc.MoreThanOneMatch):
+        f_index.resolve('lhs')
+    with pytest.raises(cog.exc.NoMatch) as exc:
+        f_index.resolve('Nurundree')
+    assert exc.value.suggestions == ['Nurundere']
+
+
+def test_nameindex_matches_linear():
+    names = synthetic_names(20000)
+    index = NameIndex(names)
+    for needle in ['hip 1', 'sector 1999', 'col', 'a b', 'euq eol', 'BD+42 Ross 1']:
+        expect = [name for name in names
+                  if cogdb.names.normalize(needle) in cogdb.names.normalize(name)]
+        assert sorted(index.find(needle)) == sorted(expect)
+
+
+def test_nameindex_faster_than_linear():
+    names = synthetic_names(20000)
+    index = NameIndex(names)
+    needles = ['Synuefe Ross 19', 'hyades sector 7', 'Pleiades Col 123']
+
+    start = time.perf_counter()
+    for needle in needles:
+        [name for name in names if cog.util.substr_match(needle, name)]
+    linear = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for needle in needles:
+        index.find(needle)
+    indexed = time.perf_counter() - start
+
+    assert indexed * 10 < linear
+
+
+def test_update_get():
+    old_indexes = dict(cogdb.names.INDEXES)
+    try:
+        cogdb.names.update(cogdb.names.FORT, ['Frey', 'Rana'])
+        assert cogdb.names.get(cogdb.names.FORT).find('fr') == ['Frey']
+        assert cogdb.names.get('missing') is None
+    finally:
+        cogdb.names.INDEXES.clear()
+        cogdb.names.INDEXES.update(old_indexes)
+
+
+def test_ensure_side(f_side_session):
+    cogdb.names.ensure_side(f_side_session)
+    assert cogdb.names.get(cogdb.names.SYSTEM).names == ['Frey', 'Rana']
+    assert cogdb.names.get(cogdb.names.FACTION).resolve('frey') == 'Frey Federal Industry'
+
+
+def test_suggest(f_side_session):
+    cogdb.names.update_side(f_side_session)
+    assert cogdb.names.suggest('frey') == ['Frey Federal Industry', 'Frey']
+    assert cogdb.names.suggest('frey', [cogdb.names.SYSTEM]) == ['Frey']
+    assert cogdb.names.suggest('zzzz') == []
+
+
+def test_ensure_sheet(session, f_systems):
+    cogdb.names.ensure_sheet(session, cogdb.names.FORT)
+    index = cogdb.names.get(cogdb.names.FORT)
+    assert index.resolve('frey') == 'Frey'
+
+    cogdb.names.ensure_sheet(session, cogdb.names.FORT)
+    assert cogdb.names.get(cogdb.names.FORT) is index
+    cogdb.names.update_sheet(session, cogdb.names.FORT)
+    assert cogdb.names.get(cogdb.names.FORT) is not index
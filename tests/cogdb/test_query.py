@@ -2,18 +2,28 @@
 Test cogdb.query module.
 """
 from __future__ import absolute_import, print_function
+import copy
+import functools
+import json
+import operator
+import random
+
+import sqlalchemy as sqla
 import sqlalchemy.orm.exc
 import mock
 import pytest
 
 import cog.exc
 import cogdb
+import cogdb.fort
+import cogdb.names
 from cogdb.schema import (DUser, System, SheetRow, SheetCattle, SheetUM,
-                          Hold, UMExpand, EFaction, ESheetType, Admin,
+                          Drop, Hold, UMExpand, EFaction, ESheetType, Admin,
                           ChannelPerm, RolePerm, FortOrder)
 import cogdb.query
 
-from tests.data import SYSTEMS, USERS
+from tests.data import (CELLS_FORT, SYSTEMS, USERS, synthetic_fort, synthetic_kos,
+                        synthetic_um)
 from tests.conftest import Channel, Member, Message, Role, Server
 
 
@@ -29,6 +39,7 @@ def test_fuzzy_find():
     with pytest.raises(cog.exc.MoreThanOneMatch):
         cogdb.query.fuzzy_find('LHS', SYSTEMS)
     assert cogdb.query.fuzzy_find('tun', SYSTEMS) == 'Tun'
+    assert cogdb.query.fuzzy_find('om', SYSTEMS) == 'Groombridge 1618'
 
 
 def test_get_duser(session, f_dusers):
@@ -126,6 +137,23 @@ def test_add_sheet(session, f_dusers, f_sheets):
     assert latest.type == ESheetType.undermine
 
 
+@pytest.fixture
+def f_queries():
+    """
+    Record the statements executed on the main engine.
+    """
+    queries = []
+
+    def record(_conn, _cursor, statement, *_):
+        queries.append(statement)
+
+    sqla.event.listen(cogdb.engine, 'before_cursor_execute', record)
+
+    yield queries
+
+    sqla.event.remove(cogdb.engine, 'before_cursor_execute', record)
+
+
 def test_fort_get_medium_systems(session, f_systems):
     mediums = cogdb.query.fort_get_medium_systems(session)
     assert mediums
@@ -152,11 +180,12 @@ def test_fort_get_systems_no_mediums(session, f_systems):
 
 
 def test_fort_get_systems_by_state(session, f_systems):
-    systems = cogdb.query.fort_get_systems(session)
+    systems = session.query(System).order_by(System.sheet_order).all()
     systems[1].fort_status = 8425
     systems[1].undermine = 1.0
     systems[4].undermine = 1.9
     session.commit()
+    cogdb.fort.refresh_systems([systems[1].name, systems[4].name])
 
     systems = cogdb.query.fort_get_systems_by_state(session)
     assert [sys.name for sys in systems['cancelled']] == ["Nurundere"]
@@ -178,6 +207,13 @@ def test_fort_find_system(session, f_systems):
 
     sys = cogdb.query.fort_find_system(session, 'alp')
     assert sys.name == 'Alpha Fornacis'
+    assert sys in session
+
+
+def test_fort_find_system_suggestions(session, f_systems):
+    with pytest.raises(cog.exc.NoMatch) as exc_info:
+        cogdb.query.fort_find_system(session, 'Nurundre')
+    assert exc_info.value.suggestions == ['Nurundere']
 
 
 def test_fort_get_targets(session, f_systems, f_prepsystem):
@@ -193,6 +229,51 @@ def test_fort_get_next_targets(session, f_systems):
     assert [sys.name for sys in targets] == ["LHS 3749", "Alpha Fornacis"]
 
 
+def test_fort_get_missing(session, f_systems):
+    systems = cogdb.query.fort_get_missing(session, 2000)
+    assert [sys.name for sys in systems] == ['Dongkum']
+
+
+def test_fort_get_drops(session, f_dusers, f_sheets, f_systems, f_drops, f_queries):
+    system = session.query(System).filter_by(name='Frey').one()
+    del f_queries[:]
+
+    drops = cogdb.query.fort_get_drops(session, system)
+    assert [drop.amount for drop in drops] == [1800, 1200, 700]
+    assert all(drop.user.name for drop in drops)
+    assert len(f_queries) == 1
+
+
+def test_fort_queries_constant(session, f_dusers, f_sheets, f_systems, f_prepsystem, f_drops,
+                               f_queries):
+    def fort_command():
+        cogdb.fort.invalidate()
+        del f_queries[:]
+        systems = cogdb.query.fort_order_get(session)
+        systems += cogdb.query.fort_get_targets(session)
+        systems += cogdb.query.fort_get_next_targets(session, count=3)
+        systems += cogdb.query.fort_get_deferred_targets(session)
+        systems += cogdb.query.fort_get_systems(session)
+        assert all(system.display() for system in systems)
+        return len(f_queries)
+
+    assert fort_command() == 2
+    session.add_all([Drop(user_id=user.id, system_id=system.id, amount=10)
+                     for user in f_sheets[3:] for system in f_systems])
+    session.commit()
+    assert fort_command() == 2
+
+
+def test_um_queries_constant(session, f_dusers, f_sheets, f_systemsum, f_holds, f_queries):
+    del f_queries[:]
+    assert all(system.display() for system in cogdb.query.um_get_systems(session))
+    assert len(f_queries) == 1
+
+    del f_queries[:]
+    cogdb.query.um_all_held_merits(session)
+    assert len(f_queries) == 2
+
+
 def test_fort_add_drop(session, f_dusers, f_sheets, f_systems, db_cleanup):
     system = session.query(System).filter(System.name == 'Sol').one()
     user = f_sheets[4]
@@ -208,6 +289,7 @@ def test_fort_add_drop(session, f_dusers, f_sheets, f_systems, db_cleanup):
     assert drop.amount == 400
     assert system.fort_status == old_fort + 400
     assert session.query(cogdb.schema.Drop).filter_by(user_id=user.id, system_id=system.id).one()
+    assert cogdb.query.fort_find_system(session, 'Sol') is system
 
 
 def test_fort_order_get(session, f_systems, f_fortorders):
@@ -243,7 +325,10 @@ def test_fort_order_drop(session, f_systems, f_fortorders):
 def test_fortscanner_find_system_column(mock_fortsheet):
     scanner = cogdb.query.FortScanner(mock_fortsheet)
     scanner.cells = mock_fortsheet.whole_sheet()
-    scanner.find_system_column() == 'F'
+    assert scanner.find_system_column() == 'F'
+
+    scanner.cells = [[]] + mock_fortsheet.whole_sheet()[1:]
+    assert scanner.find_system_column() == 'F'
 
     with pytest.raises(cog.exc.SheetParsingError):
         scanner.cells = [[''], ['CMDR Name']]
@@ -261,6 +346,134 @@ def test_fortscanner_merits(mock_fortsheet):
     assert fort1.user.name == 'Toliman'
 
 
+def test_fortscanner_scan_diff(mock_fortsheet):
+    cells = copy.deepcopy(CELLS_FORT)
+    mock_fortsheet.whole_sheet.return_value = cells
+    scanner = cogdb.query.FortScanner(mock_fortsheet)
+
+    assert scanner.scan(diff=True) == [['merits', 13, 0, 0], ['systems', 7, 0, 0],
+                                       ['sheet_users', 15, 0, 0]]
+    assert scanner.scan(diff=True) == [['merits', 0, 0, 0], ['systems', 0, 0, 0],
+                                       ['sheet_users', 0, 0, 0]]
+
+    frey = [col for col in cells if len(col) > 9 and col[9] == 'Frey'][0]
+    frey[10] = 9999
+    nurundere = [col for col in cells if len(col) > 9 and col[9] == 'Nurundere'][0]
+    nurundere[9] = 'Nurundere2'
+    changes = scanner.scan(diff=True)
+    assert changes[1] == ['systems', 1, 0, 1]
+
+    session = cogdb.Session()
+    systems = cogdb.query.fort_get_systems(session)
+    assert [system.name for system in systems[:3]] == ['Frey', 'Nurundere2', 'LHS 3749']
+    assert scanner.scan() == [['merits', 14, 0, 0], ['systems', 7, 0, 0],
+                              ['sheet_users', 15, 0, 0]]
+
+
+def test_sheetscanner_fetch_cells(mock_fortsheet):
+    scanner = cogdb.query.FortScanner(mock_fortsheet)
+    assert scanner.fetch_cells() == CELLS_FORT
+    assert scanner.bounds == (16, 75)
+    assert scanner.fetch_stats['calls'] == 1
+
+    cells = scanner.fetch_cells()
+    mock_fortsheet.batch_get.assert_called_with(['!A11:B', '!D1:ZZ10', '!D11:P75'],
+                                                dim='COLUMNS')
+    assert mock_fortsheet.whole_sheet.call_count == 1
+    assert cells[1][10:] == CELLS_FORT[1][10:]
+    assert cells[3:] == CELLS_FORT[3:]
+    assert scanner.fetch_stats['bytes'] < len(json.dumps(CELLS_FORT))
+
+
+def test_sheetscanner_fetch_cells_grown(mock_fortsheet):
+    scanner = cogdb.query.FortScanner(mock_fortsheet)
+    scanner.fetch_cells()
+    cells = copy.deepcopy(CELLS_FORT)
+    cells[1] += [''] * 60 + ['New User']
+    mock_fortsheet.whole_sheet.return_value = cells
+
+    assert scanner.fetch_cells() == cells
+    assert scanner.fetch_stats['calls'] == 2
+    assert scanner.bounds == (16, 136)
+
+
+def test_sheetscanner_record_scan(mock_fortsheet):
+    cogdb.query.FortScanner(mock_fortsheet).scan()
+
+    session = cogdb.Session()
+    record = cogdb.query.get_sheet_record(session, 'fort_sheet', "'Cycle 1'")
+    assert (record.version, record.cols, record.rows) == (1, 16, 75)
+
+    scanner = cogdb.query.FortScanner(mock_fortsheet)
+    scanner.fetch_cells()
+    assert scanner.fetch_stats['calls'] == 1
+    assert mock_fortsheet.whole_sheet.call_count == 1
+    assert mock_fortsheet.batch_get.call_count == 1
+
+
+def test_sheetscanner_unchanged(mock_fortsheet):
+    scanner = cogdb.query.FortScanner(mock_fortsheet)
+    assert not scanner.unchanged()
+
+    scanner.scan()
+    assert scanner.unchanged()
+
+    mock_fortsheet.version.return_value = 2
+    assert not scanner.unchanged()
+
+    mock_fortsheet.version.side_effect = cog.exc.RemoteError('No drive access.')
+    assert not scanner.unchanged()
+    scanner.scan()
+    assert scanner.version is None
+
+
+def test_diff_rows(session, f_systems):
+    parsed = [System(id=1, name='Frey', sheet_col='F', sheet_order=1, fort_status=100,
+                     trigger=4910, undermine=0.0),
+              System(id=2, name='New One', sheet_col='Z', sheet_order=2, fort_status=0,
+                     trigger=5000, undermine=0.0)]
+    parsed = [cogdb.query.row_values(system) for system in parsed]
+    ids, inserts, updates, deletes = cogdb.query.diff_rows(session, System, parsed,
+                                                           operator.itemgetter('name'))
+
+    frey = [system for system in f_systems if system.name == 'Frey'][0]
+    assert ids['Frey'] == frey.id
+    assert ids['New One'] == max([system.id for system in f_systems]) + 1
+    assert [row['name'] for row in inserts] == ['New One']
+    assert updates and updates[0][0] == frey.id
+    assert 'name' not in updates[0][1]
+    assert sorted(deletes) == sorted([system.id for system in f_systems if system is not frey])
+
+
+def test_row_values():
+    values = cogdb.query.row_values(SheetCattle(id=1, name='Toliman', row=11, cry=650))
+    assert values['cry'] == '650'
+    assert values['type'] == 'SheetCattle'
+
+    values = cogdb.query.row_values(System(id=1, name='Frey'))
+    assert values['um_status'] == 0
+    assert values['notes'] == ''
+
+
+def test_bulk_delete(session, f_dusers, f_sheets):
+    cogdb.query.bulk_delete(session, SheetCattle)
+    session.commit()
+
+    assert session.query(SheetCattle).all() == []
+    assert [sheet.id for sheet in session.query(SheetUM)] == [2, 4]
+
+
+def test_bulk_insert(session, f_dusers, f_sheets):
+    cogdb.query.bulk_delete(session, SheetRow)
+    cogdb.query.bulk_insert(session, [SheetCattle(id=7, name='Toliman', row=11, cry=650),
+                                      SheetUM(id=8, name='Toliman', row=12)])
+    session.commit()
+
+    sheets = session.query(SheetRow).order_by(SheetRow.id).all()
+    assert [(type(sheet), sheet.id, sheet.cry) for sheet in sheets] == [
+        (SheetCattle, 7, '650'), (SheetUM, 8, '')]
+
+
 def test_fortscanner_systems(mock_fortsheet):
     scanner = cogdb.query.FortScanner(mock_fortsheet)
     scanner.scan()
@@ -275,6 +488,55 @@ def test_fortscanner_users(mock_fortsheet):
     assert result == USERS
 
 
+def test_fortscanner_cells(mock_fortsheet):
+    scanner = cogdb.query.FortScanner(mock_fortsheet)
+    assert scanner.drop_cells('F', 11, 400) == {'F11': 400}
+    assert scanner.system_cells('F', 4000, 10) == {'F6': 4000, 'F7': 10}
+    assert scanner.sheet_user_cells(11, 'Cry', 'Name') == {'A11': 'Cry', 'B11': 'Name'}
+
+
+def test_sheetscanner_write_cells(mock_fortsheet):
+    scanner = cogdb.query.FortScanner(mock_fortsheet)
+    scanner.write_cells(scanner.system_cells('F', 4000, 10))
+    mock_fortsheet.batch_update.assert_called_with(['!F6:F7'], [[[4000], [10]]])
+
+    scanner.cells = [[]] * 5 + [['', '', '', '', '', 0, 0]]
+    scanner.write_cells({'F6': 4000, 'F20': 1})
+    assert scanner.cells[5] == ['', '', '', '', '', 4000, 0]
+
+
+def test_sheetscanner_write_cells_gaps(mock_fortsheet):
+    """ Only gaps the bot wrote are filled, never cells from the scan. """
+    scanner = cogdb.query.FortScanner(mock_fortsheet)
+    scanner.cells = [[''] * 12 for _ in range(8)]
+    scanner.write_cells({'D11': 1, 'F11': 3})
+    mock_fortsheet.batch_update.assert_called_with(['!D11:D11', '!F11:F11'], [[[1]], [[3]]])
+
+    scanner.write_cells({'E11': 2})
+    scanner.write_cells({'D11': 5, 'F11': 6})
+    mock_fortsheet.batch_update.assert_called_with(['!D11:F11'], [[[5, 2, 6]]])
+
+    scanner.fetch_cells()
+    assert scanner.written == {}
+
+
+def test_umscanner_write_cells(mock_umsheet):
+    scanner = cogdb.query.UMScanner(mock_umsheet)
+    cells = scanner.hold_cells('D', 14, 0, 1000)
+    cells.update(scanner.hold_cells('F', 14, 0, 200))
+    cells.update(scanner.hold_cells('D', 15, 0, 50))
+    scanner.write_cells(cells)
+    mock_umsheet.batch_update.assert_called_with(['!D14:G14', '!D15:E15'],
+                                                 [[[0, 1000, 0, 200]], [[0, 50]]])
+
+
+def test_umscanner_cells(mock_umsheet):
+    scanner = cogdb.query.UMScanner(mock_umsheet)
+    assert scanner.hold_cells('D', 14, 100, 50) == {'D14': 100, 'E14': 50}
+    assert scanner.system_cells('D', 1000, 500, 0) == {'D10': 1000, 'D11': 500,
+                                                       'D12': 'Hold Merits', 'D13': 0}
+
+
 def test_umscanner_systems(mock_umsheet):
     scanner = cogdb.query.UMScanner(mock_umsheet)
     scanner.cells = scanner.gsheet.whole_sheet()
@@ -299,6 +561,172 @@ def test_umscanner_users(mock_umsheet):
     assert isinstance(users[0], SheetUM)
 
 
+def test_scanners_synthetic():
+    scanner = cogdb.query.FortScanner(mock.Mock())
+    scanner.cells = synthetic_fort(20, 5, control=cogdb.query.HUDSON_CONTROLS[0])
+    scanner.system_col = scanner.find_system_column()
+    assert scanner.system_col == 'F'
+    assert len(scanner.fort_systems()) == 5
+    assert len(scanner.prep_systems()) == 2
+    assert [user.name for user in scanner.users(*scanner.users_args)][-1] == 'CMDR 19'
+
+    scanner = cogdb.query.UMScanner(mock.Mock())
+    scanner.cells = synthetic_um(20, 5)
+    expect = ['Burr {}'.format(ind) for ind in range(5)]
+    assert [system.name for system in scanner.systems()] == expect
+    assert len(scanner.users(*scanner.users_args)) == 20
+
+    scanner = cogdb.query.KOSScanner(mock.Mock())
+    scanner.cells = synthetic_kos(30)
+    assert len(scanner.parse_rows()) == 30
+
+
+def legacy_users(scanner, cls, faction, first_id=1):
+    """ The SheetScanner.users before the fast path, the oracle of the differential tests. """
+    row = scanner.user_row - 1
+    user_column = cog.sheets.column_to_index(scanner.user_col)
+    cry_column = user_column - 1
+
+    found = []
+    cnt = first_id
+    for user in scanner.cells[user_column][row:]:
+        row += 1
+        if user == '':
+            continue
+
+        try:
+            cry = scanner.cells[cry_column][row - 1]
+        except IndexError:
+            cry = ''
+
+        sheet_user = cls(id=cnt, name=user, faction=faction, row=row, cry=cry)
+        cnt += 1
+        if sheet_user in found:
+            rows = [other.row for other in found if other == sheet_user] + [row]
+            sheet_type = 'Fort' if 'Fort' in scanner.__class__.__name__ else 'Undermining'
+            raise cog.exc.NameCollisionError(sheet_type, sheet_user.name, rows)
+
+        found.append(sheet_user)
+
+    return found
+
+
+def legacy_fort_merits(scanner, systems, users):
+    """ The FortScanner.merits before the fast path. """
+    found = []
+    cnt = 1
+    for system in systems:
+        sys_ind = cog.sheets.column_to_index(system.sheet_col)
+        try:
+            for user in users:
+                amount = scanner.cells[sys_ind][user.row - 1]
+                if isinstance(amount, type('')):
+                    amount = amount.strip()
+                if amount == '':
+                    continue
+
+                found.append(Drop(id=cnt, user_id=user.id, system_id=system.id,
+                                  amount=cogdb.schema.parse_int(amount)))
+                cnt += 1
+        except IndexError:
+            pass
+
+    return found
+
+
+def legacy_um_merits(scanner, systems, users):
+    """ The UMScanner.merits before the fast path, held then redeemed. """
+    holds = {}
+    for offset, attr in [(0, 'held'), (1, 'redeemed')]:
+        for system in systems:
+            col_ind = cog.sheets.column_to_index(system.sheet_col) + offset
+            try:
+                cnt = len(holds) + 1
+                for user in users:
+                    value = scanner.cells[col_ind][user.row - 1]
+                    if isinstance(value, type('')):
+                        value = value.strip()
+                    if value == '':
+                        continue
+
+                    key = '{}_{}'.format(system.id, user.id)
+                    hold = holds.get(key, Hold(id=cnt, user_id=user.id, system_id=system.id,
+                                               held=0, redeemed=0))
+                    if hold.id == cnt:
+                        cnt += 1
+                    setattr(hold, attr, getattr(hold, attr) + cogdb.schema.parse_int(value))
+                    holds[key] = hold
+            except IndexError:
+                pass
+
+    return list(holds.values())
+
+
+def noisy_cells(cells, first_row, seed):
+    """
+    Sprinkle the user rows of cells with the odd values people type into sheets
+    and cut some columns short.
+    """
+    rand = random.Random(seed)
+    noise = ['', ' ', ' 120 ', '\t75', '1,000', 'n/a', 3.7, -40, True, '0', '12.5']
+    cells = copy.deepcopy(cells)
+    for col in cells[3:]:
+        for row in range(first_row, len(col)):
+            if rand.random() < 0.2:
+                col[row] = rand.choice(noise)
+        if len(col) > first_row and rand.random() < 0.2:
+            del col[rand.randint(first_row, len(col)):]
+
+    return cells
+
+
+def rows_of(objs):
+    """ Returns: The class and column values of every object, in order. """
+    return [(obj.__class__, cogdb.query.row_values(obj)) for obj in objs]
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_fortscanner_parse_differential(seed):
+    scanner = cogdb.query.FortScanner(mock.Mock())
+    scanner.cells = noisy_cells(synthetic_fort(60, 8, control=cogdb.query.HUDSON_CONTROLS[0],
+                                               seed=seed), 10, seed)
+    scanner.system_col = scanner.find_system_column()
+    systems = scanner.systems()
+
+    users = scanner.users(*scanner.users_args)
+    assert rows_of(users) == rows_of(legacy_users(scanner, *scanner.users_args))
+    merits = scanner.merits(systems, users)
+    assert merits
+    assert rows_of(merits) == rows_of(legacy_fort_merits(scanner, systems, users))
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_umscanner_parse_differential(seed):
+    scanner = cogdb.query.UMScanner(mock.Mock())
+    scanner.cells = noisy_cells(synthetic_um(60, 7, seed=seed), 13, seed)
+    systems = scanner.systems()
+
+    users = scanner.users(*scanner.users_args, first_id=1001)
+    assert rows_of(users) == rows_of(legacy_users(scanner, *scanner.users_args, first_id=1001))
+    merits = scanner.merits(systems, users)
+    assert merits
+    assert rows_of(merits) == rows_of(legacy_um_merits(scanner, systems, users))
+
+
+def test_sheetscanner_users_differential(mock_fortsheet):
+    scanner = cogdb.query.FortScanner(mock_fortsheet)
+    scanner.cells = copy.deepcopy(scanner.gsheet.whole_sheet())
+    users = scanner.users(*scanner.users_args)
+    assert rows_of(users) == rows_of(legacy_users(scanner, *scanner.users_args))
+
+    scanner.cells[1][-1] = scanner.cells[1][12]
+    for func in (scanner.users, functools.partial(legacy_users, scanner)):
+        with pytest.raises(cog.exc.NameCollisionError) as exc_info:
+            func(*scanner.users_args)
+        exc = exc_info.value
+        assert (exc.sheet, exc.name, exc.rows) == ('Fort', USERS[2], [13, len(scanner.cells[1])])
+
+
 def test_umscanner_merits(session, mock_umsheet):
     scanner = cogdb.query.UMScanner(gsheet=mock_umsheet)
     scanner.scan()
@@ -325,6 +753,21 @@ def test_um_find_system(session, f_systemsum):
         cogdb.query.um_find_system(session, 'r')
 
 
+def test_um_find_system_suggestions(session, f_systemsum):
+    with pytest.raises(cog.exc.NoMatch) as exc_info:
+        cogdb.query.um_find_system(session, 'Cemplangap')
+    assert exc_info.value.suggestions == ['Cemplangpa']
+
+
+def test_umscanner_scanned(f_systemsum):
+    scanner = cogdb.query.UMScanner(mock.Mock())
+    scanner.scanned([['merits', 0, 0, 0], ['systems', 0, 0, 0], ['sheet_users', 0, 0, 0]])
+    assert cogdb.names.get(cogdb.names.UM) is None
+
+    scanner.scanned([['merits', 0, 0, 0], ['systems', 1, 0, 0], ['sheet_users', 0, 0, 0]])
+    assert 'Cemplangpa' in cogdb.names.get(cogdb.names.UM).names
+
+
 def test_um_get_systems(session, f_systemsum):
     systems = [system.name for system in cogdb.query.um_get_systems(session)]
     assert 'Cemplangpa' not in systems
@@ -441,16 +884,16 @@ def test_check_perms(session, f_cperms, f_rperms):
     author = Member('Gears', roles)
     msg = Message('!drop', author, server, ops_channel, None)
 
-    cogdb.query.check_perms(msg, mock.Mock(cmd='Drop'))  # Silent pass
+    cogdb.query.check_perms(session, msg, mock.Mock(cmd='Drop'))  # Silent pass
 
     with pytest.raises(cog.exc.InvalidPerms):
         msg.author.roles = [Role('Winters')]
-        cogdb.query.check_perms(msg, mock.Mock(cmd='Drop'))
+        cogdb.query.check_perms(session, msg, mock.Mock(cmd='Drop'))
 
     with pytest.raises(cog.exc.InvalidPerms):
         msg.author.roles = roles
         msg.channel.name = 'not_pperations'
-        cogdb.query.check_perms(msg, mock.Mock(cmd='Drop'))
+        cogdb.query.check_perms(session, msg, mock.Mock(cmd='Drop'))
 
 
 def test_check_channel_perms(session, f_cperms):
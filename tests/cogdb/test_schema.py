@@ -5,6 +5,7 @@ from __future__ import absolute_import, print_function
 import copy
 
 import pytest
+import sqlalchemy as sqla
 
 import cog.exc
 import cogdb
@@ -13,7 +14,7 @@ from cogdb.schema import (DUser, System, Drop, Hold,
                           SheetRow, SheetCattle, SheetUM,
                           SystemUM, UMControl, UMExpand, UMOppose,
                           EFaction, ESheetType, kwargs_um_system, kwargs_fort_system,
-                          Admin, ChannelPerm, RolePerm, FortOrder)
+                          Admin, ChannelPerm, RolePerm, FortOrder, SheetRecord)
 
 from tests.data import SYSTEMS_DATA, SYSTEMSUM_DATA, SYSTEMUM_EXPAND
 
@@ -238,6 +239,17 @@ def test_system__str__(f_systems):
                           "notes='', sheet_col='G', sheet_order=1)"
 
 
+def test_system_merits_sum(session, f_dusers, f_sheets, f_systems, f_drops):
+    system = session.query(System).filter_by(name='Frey').one()
+    assert system.merits_sum == 3700
+    assert 'merits' in sqla.inspect(system).unloaded
+    assert system.cmdr_merits == 3700
+
+    system.merits[0].amount += 100
+    assert system.cmdr_merits == 3800
+    assert System(name='New', merits=[Drop(amount=50)]).cmdr_merits == 50
+
+
 def test_system_display(f_systems):
     system = f_systems[0]
     assert system.display() == '**Frey** 4910/4910 :Fortified:'
@@ -390,6 +402,13 @@ def test_hold__str__(f_dusers, f_sheets, f_systemsum, f_holds):
                         "Hold(system_id=1, user_id=2, held=0, redeemed=4000)"
 
 
+def test_sheetrecord__repr__():
+    record = SheetRecord(sheet_id='sheet', page="'Cycle 1'", version=4, cols=16, rows=75)
+    assert repr(record) == "SheetRecord(sheet_id='sheet', page=\"'Cycle 1'\", version=4, "\
+                           "cols=16, rows=75)"
+    assert record == SheetRecord(sheet_id='sheet', page="'Cycle 1'", version=5)
+
+
 def test_kos__repr__(f_kos):
     assert repr(f_kos[0]) == "KOS(cmdr='good_guy', faction='Hudson', danger=1, is_friendly=True)"
 
@@ -452,6 +471,17 @@ def test_systemum_cmdr_merits(session, f_dusers, f_sheets, f_systemsum, f_holds)
     assert system.cmdr_merits == 6450
 
 
+def test_systemum_merits_sum(session, f_dusers, f_sheets, f_systemsum, f_holds):
+    system = session.query(SystemUM).filter_by(name='Cemplangpa').one()
+    assert system.merits_sum == 6450
+    assert 'merits' in sqla.inspect(system).unloaded
+    assert system.cmdr_merits == 6450
+
+    system.merits[0].held += 50
+    assert system.cmdr_merits == 6500
+    assert SystemUM(name='New').cmdr_merits == 0
+
+
 def test_systemum_missing(f_dusers, f_sheets, f_systemsum, f_holds):
     system = f_systemsum[0]
 
@@ -573,6 +603,12 @@ def test_parse_int():
     assert cogdb.schema.parse_int(5) == 5
 
 
+def test_parse_ints():
+    cells = ['', ' 12 ', '  ', 5, 3.7, 'n/a', True, '1,000', '\t40']
+    assert cogdb.schema.parse_ints(cells) == [None, 12, None, 5, 3, 0, 1, 0, 40]
+    assert cogdb.schema.parse_ints([]) == []
+
+
 def test_parse_float():
     assert cogdb.schema.parse_float('') == 0.0
     assert cogdb.schema.parse_float('2') == 2.0
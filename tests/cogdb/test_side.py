@@ -2,14 +2,20 @@
 Test remote queries to sidewinder's db.
 """
 from __future__ import absolute_import, print_function
+import asyncio
 import datetime
-import pytest
+import time
 
+import pytest
+import sqlalchemy as sqla
+import sqlalchemy.orm as sqla_orm
 from sqlalchemy.sql import text as sql_text
 
 import cog.exc
 import cog.util
+import cogdb
 import cogdb.side
+import cogdb.timeseries
 from cogdb.side import BGSTick, SystemAge, System, Faction
 
 
@@ -37,6 +43,33 @@ def test_next_bgs_tick(side_session, f_bot):
         msg = cogdb.side.next_bgs_tick(side_session, after_last)
 
 
+@pytest.mark.asyncio
+async def test_async_next_bgs_tick(side_session, f_bot):
+    cog.util.BOT = f_bot
+    query = sql_text("SELECT tick FROM bgs_tick ORDER BY tick desc LIMIT 1")
+    last_tick = side_session.execute(query).fetchone()[0]
+
+    before_last = last_tick - datetime.timedelta(hours=4)
+    msg = await cogdb.side.async_next_bgs_tick(before_last)
+    assert "BGS Tick in **4:00:00**" in msg
+
+    after_last = last_tick + datetime.timedelta(hours=4)
+    with pytest.raises(cog.exc.NoMoreTargets):
+        msg = await cogdb.side.async_next_bgs_tick(after_last)
+
+
+@pytest.mark.asyncio
+async def test_async_query_concurrent():
+    """ Queries on the async pool overlap instead of queueing behind each other. """
+    query = sqla_orm.Query(sqla.func.sleep(0.5))
+    await cogdb.side.async_engine()
+
+    start = time.time()
+    results = await asyncio.gather(*[cogdb.side.async_query(query) for _ in range(8)])
+    assert len(results) == 8
+    assert time.time() - start < 2
+
+
 def test_exploited_systems_by_age(side_session):
     query = sql_text("SELECT control, system FROM v_age ORDER BY system asc LIMIT 1")
     control, system = side_session.execute(query).fetchone()
@@ -47,10 +80,24 @@ def test_exploited_systems_by_age(side_session):
     assert (result[0].control, result[0].system) == (control, system)
 
 
+@pytest.mark.asyncio
+async def test_async_exploited_systems_by_age(side_session):
+    control = side_session.query(SystemAge.control).limit(1).scalar()
+    expect = cogdb.side.exploited_systems_by_age(side_session, control)
+
+    assert await cogdb.side.async_exploited_systems_by_age(control) == expect
+
+
 def test_influence_in_system(side_session):
     assert "Mother Gaia" in [ent[0] for ent in cogdb.side.influence_in_system(side_session, 'Sol')]
 
 
+@pytest.mark.asyncio
+async def test_async_influence_in_system(side_session):
+    expect = cogdb.side.influence_in_system(side_session, 'Sol')
+    assert await cogdb.side.async_influence_in_system('Sol') == expect
+
+
 def test_station_suffix():
     assert cogdb.side.station_suffix('default not found') == ' (No Dock)'
     assert cogdb.side.station_suffix('Planetary Outpost') == ' (P)'
@@ -76,7 +123,7 @@ def test_influence_history_in_system(side_session):
         assert key in fact_ids
         for inf in inf_history[key]:
             assert inf.faction_id == key
-            assert isinstance(inf, cogdb.side.InfluenceHistory)
+            assert isinstance(inf, cogdb.timeseries.InfPoint)
 
 
 def test_system_overview(side_session):
@@ -112,6 +159,20 @@ def test_dash_overview(side_session):
     assert sol_control.id in [588, 589, 591, 592, 593]
 
 
+def test_wrap_exceptions_breaker(side_session):
+    calls = cogdb.side_breaker.calls
+    cogdb.side.get_systems(side_session, ['Sol'])
+    assert cogdb.side_breaker.calls == calls + 1
+
+
+def test_trend_overview(side_session):
+    rows = cogdb.side.trend_overview(side_session, ['Sol'])
+
+    assert rows[0][0] == 'Sol'
+    assert 'Sol' in [row[1] for row in rows]
+    assert len(rows[0]) == 7
+
+
 def test_find_favorable(side_session):
     matches = cogdb.side.find_favorable(side_session, 'Nurundere')
     assert matches[1][-1] == "Monarchy of Orisala"
@@ -144,6 +205,26 @@ def test_get_systems(side_session):
     assert 'Rana' in systems
 
 
+def test_edmc_points(side_session):
+    control_points, bubbles = cogdb.side.edmc_points(side_session, ['Rana', 'Frey'])
+    assert sorted([point[0] for point in control_points]) == ['Frey', 'Rana']
+    assert sorted(bubbles) == ['Frey', 'Rana']
+    for points in bubbles.values():
+        assert all([len(point) == 4 for point in points])
+
+    with pytest.raises(cog.exc.InvalidCommandArgs):
+        cogdb.side.edmc_points(side_session, ['Frey', 'Not A System'])
+
+
+@pytest.mark.asyncio
+async def test_async_get_systems():
+    systems = await cogdb.side.async_get_systems(['Sol', 'Rana'])
+    assert sorted([x.name for x in systems]) == ['Rana', 'Sol']
+
+    with pytest.raises(cog.exc.InvalidCommandArgs):
+        await cogdb.side.async_get_systems(['Sol', 'Ranazzz'])
+
+
 def test_expand_to_candidates(side_session):
     matches = cogdb.side.expand_to_candidates(side_session, 'Rana')
     assert len(matches) > 1
@@ -164,6 +245,13 @@ def test_compute_dists_incomplete(side_session):
         cogdb.side.compute_dists(side_session, ['Nanomam', 'Sol', 'Rana', 'Othimezzz'])
 
 
+@pytest.mark.asyncio
+async def test_async_compute_dists(side_session):
+    expect = cogdb.side.compute_dists(side_session, ['Nanomam', 'Sol', 'Rana', 'Othime'])
+    actual = await cogdb.side.async_compute_dists(['Nanomam', 'Sol', 'Rana', 'Othime'])
+    assert actual == expect
+
+
 def test_get_power_hq():
     assert cogdb.side.get_power_hq("hudson") == ["Zachary Hudson", "Nanomam"]
 
@@ -0,0 +1,160 @@
+"""
+Test syncing of the local side replica, sqlite stands in for remote and replica.
+"""
+from __future__ import absolute_import, print_function
+import time
+
+import pytest
+import sqlalchemy as sqla
+import sqlalchemy.orm as sqla_orm
+
+import cogdb.side
+import cogdb.side_sync
+from cogdb.side import Faction, Influence, InfluenceHistory, System, SystemAge
+from cogdb.side_sync import SyncMark
+
+
+@pytest.fixture
+def f_remote():
+    engine = sqla.create_engine('sqlite://')
+    cogdb.side.Base.metadata.create_all(engine)
+    session = sqla_orm.sessionmaker(bind=engine)()
+    session.add_all([
+        System(id=1, name='Sol', x=0, y=0, z=0),
+        System(id=2, name='Frey', x=10, y=0, z=0),
+        Faction(id=1, name='Mother Gaia', updated_at=100),
+        Faction(id=2, name='Sol Workers', updated_at=200),
+        Influence(system_id=1, faction_id=1, influence=60, updated_at=100),
+        Influence(system_id=1, faction_id=2, influence=40, updated_at=200),
+        SystemAge(control='Sol', system='Frey', age=2),
+    ])
+    session.commit()
+
+    yield session
+
+    session.close()
+
+
+@pytest.fixture
+def f_local():
+    engine = sqla.create_engine('sqlite://')
+    cogdb.side_sync.create_replica(engine)
+    session = sqla_orm.sessionmaker(bind=engine)()
+
+    yield session
+
+    session.close()
+
+
+def test_syncmark__repr__():
+    mark = SyncMark(name='influence', watermark=10, synced_at=20, rows=5)
+    assert repr(mark) == "SyncMark(name='influence', watermark=10, synced_at=20, rows=5)"
+
+
+def test_syncmark__eq__():
+    assert SyncMark(name='influence') == SyncMark(name='influence', rows=5)
+    assert SyncMark(name='influence') != SyncMark(name='factions')
+
+
+def test_replica_metadata():
+    meta = cogdb.side_sync.replica_metadata()
+    assert 'influence' in meta.tables
+    for table in meta.tables.values():
+        assert not table.foreign_key_constraints
+
+
+def test_get_mark_history_window(f_local):
+    mark = cogdb.side_sync.get_mark(f_local, InfluenceHistory)
+    expect = time.time() - cogdb.side_sync.HISTORY_DAYS * 24 * 60 * 60
+    assert abs(mark.watermark - expect) < 5
+    assert cogdb.side_sync.get_mark(f_local, Influence).watermark == 0
+
+
+def test_sync_initial(f_remote, f_local):
+    counts = cogdb.side_sync.sync(f_remote, f_local)
+
+    assert counts['systems'] == 2
+    assert counts['influence'] == 2
+    assert counts['factions'] == 2
+    assert f_local.query(Influence).count() == 2
+    assert [x.name for x in f_local.query(System).order_by(System.id)] == ['Sol', 'Frey']
+    assert cogdb.side_sync.get_mark(f_local, Influence).watermark == 200
+
+
+def test_sync_incremental_only_changed(f_remote, f_local):
+    cogdb.side_sync.sync(f_remote, f_local)
+
+    inf = f_remote.query(Influence).filter(Influence.faction_id == 2).one()
+    inf.influence, inf.updated_at = 45, 300
+    f_remote.add(Influence(system_id=2, faction_id=1, influence=100, updated_at=300))
+    f_remote.commit()
+
+    counts = cogdb.side_sync.sync(f_remote, f_local)
+    assert counts['influence'] == 2
+    assert counts['factions'] == 0
+    assert counts['systems'] == 0  # Not yet stale
+    assert f_local.query(Influence).count() == 3
+    inf = f_local.query(Influence.influence).filter(Influence.faction_id == 2).scalar()
+    assert float(inf) == 45
+    assert cogdb.side_sync.get_mark(f_local, Influence).watermark == 300
+
+
+def test_sync_incremental_page_boundary(f_remote, f_local):
+    """ Rows sharing updated_at across a page boundary are not skipped. """
+    f_remote.add_all([Faction(id=ind, name='Faction ' + str(ind), updated_at=500)
+                      for ind in range(10, 15)])
+    f_remote.commit()
+
+    copied = cogdb.side_sync.sync_incremental(f_remote, f_local, Faction, batch=3)
+    assert copied == 7
+    assert f_local.query(Faction).count() == 7
+
+
+def test_sync_full_force(f_remote, f_local):
+    cogdb.side_sync.sync(f_remote, f_local)
+    f_remote.query(SystemAge).delete()
+    f_remote.commit()
+
+    assert cogdb.side_sync.sync_full(f_remote, f_local, SystemAge) == 0
+    assert f_local.query(SystemAge).count() == 1
+    cogdb.side_sync.sync_full(f_remote, f_local, SystemAge, force=True)
+    assert f_local.query(SystemAge).count() == 0
+
+
+def test_sync_replica_queries(f_remote, f_local):
+    """ Side query functions work unchanged against the replica. """
+    cogdb.side_sync.sync(f_remote, f_local)
+
+    names = [x.name for x in cogdb.side.get_systems(f_local, ['Sol', 'Frey'])]
+    assert sorted(names) == ['Frey', 'Sol']
+
+
+def test_status(f_remote, f_local):
+    cogdb.side_sync.sync(f_remote, f_local)
+
+    lines = cogdb.side_sync.status(f_local)
+    assert lines[0] == ['Table', 'Watermark', 'Synced At', 'Rows']
+    assert 'influence' in [line[0] for line in lines]
+
+
+def test_sync_reconcile(f_remote, f_local):
+    """ Rows deleted on remote leave the replica on reconcile. """
+    cogdb.side_sync.sync(f_remote, f_local)
+    f_remote.query(Influence).filter(Influence.faction_id == 2).delete()
+    f_remote.commit()
+
+    cogdb.side_sync.sync(f_remote, f_local)
+    assert f_local.query(Influence).count() == 2  # Not yet stale
+
+    assert cogdb.side_sync.sync_reconcile(f_remote, f_local, Influence, force=True) == 1
+    assert [x.faction_id for x in f_local.query(Influence)] == [1]
+    assert f_local.query(Faction).count() == 2
+    assert cogdb.side_sync.get_keys_mark(f_local, Influence).rows == 1
+
+
+def test_delete_rows(f_remote, f_local):
+    cogdb.side_sync.sync(f_remote, f_local)
+    table = Influence.__table__
+    cogdb.side_sync.delete_rows(f_local, table, [(1, 1), (1, 3)])
+    cogdb.side_sync.delete_rows(f_local, table, [])
+    assert [x.faction_id for x in f_local.query(Influence)] == [2]
@@ -0,0 +1,122 @@
+"""
+Test the BGS tick schedule, sqlite stands in for side.
+"""
+from __future__ import absolute_import, print_function
+import datetime
+
+import mock
+import pytest
+import sqlalchemy as sqla
+import sqlalchemy.orm as sqla_orm
+
+import cogdb.side
+import cogdb.ticks
+from cogdb.side import BGSTick
+from cogdb.ticks import TickSchedule
+
+NOW = datetime.datetime(2018, 5, 1, 12)
+TICKS = [NOW + datetime.timedelta(days=day, hours=3) for day in range(-2, 5)]
+
+
+@pytest.fixture
+def f_tick_session():
+    engine = sqla.create_engine('sqlite://')
+    BGSTick.__table__.create(engine)
+    session = sqla_orm.sessionmaker(bind=engine)()
+    session.add_all([BGSTick(day=tick.date(), tick=tick) for tick in TICKS])
+    session.commit()
+
+    yield session
+
+    session.close()
+
+
+def test_tickschedule__repr__():
+    schedule = TickSchedule()
+    assert repr(schedule) == "TickSchedule(refresh=1800, loaded_at=0, notified=None, ticks=0)"
+
+
+def test_tickschedule_load(f_tick_session):
+    schedule = TickSchedule()
+    assert not schedule.loaded
+    assert schedule.stale
+
+    schedule.load(f_tick_session, NOW)
+    assert schedule.ticks == TICKS[2:]
+    assert schedule.loaded
+    assert not schedule.stale
+    assert schedule.notified == NOW
+
+
+def test_tickschedule_load_keeps_unnotified(f_tick_session):
+    schedule = TickSchedule()
+    schedule.load(f_tick_session, NOW)
+    schedule.load(f_tick_session, NOW + datetime.timedelta(days=1))
+    assert schedule.ticks == TICKS[2:]
+
+
+def test_tickschedule_next_tick(f_tick_session):
+    schedule = TickSchedule()
+    assert schedule.next_tick(NOW) is None
+
+    schedule.load(f_tick_session, NOW)
+    assert schedule.next_tick(NOW) == TICKS[2]
+    assert schedule.next_tick(TICKS[2]) == TICKS[3]
+    assert schedule.next_tick(TICKS[-1]) is None
+
+
+def test_tickschedule_passed(f_tick_session):
+    schedule = TickSchedule()
+    assert schedule.passed(NOW) == []
+
+    schedule.load(f_tick_session, NOW)
+    assert schedule.passed(NOW) == []
+    assert schedule.passed(TICKS[3]) == TICKS[2:4]
+    assert schedule.passed(TICKS[3]) == []
+    assert schedule.passed(TICKS[-1] + datetime.timedelta(hours=1)) == TICKS[4:]
+
+
+def test_tickschedule_subscribe():
+    schedule = TickSchedule()
+    callback = mock.Mock()
+    schedule.subscribe(callback)
+    schedule.subscribe(callback)
+    assert schedule.subscribers == [callback]
+
+    schedule.unsubscribe(callback)
+    schedule.unsubscribe(callback)
+    assert schedule.subscribers == []
+
+
+@pytest.mark.asyncio
+async def test_tickschedule_notify(f_tick_session):
+    schedule = TickSchedule()
+    schedule.load(f_tick_session, NOW)
+    seen = []
+
+    async def async_callback(tick):
+        seen.append(tick)
+
+    failing = mock.Mock(side_effect=ValueError)
+    callback = mock.Mock()
+    for func in [failing, async_callback, callback]:
+        schedule.subscribe(func)
+
+    assert await schedule.notify(NOW) == []
+    assert await schedule.notify(TICKS[3]) == TICKS[2:4]
+    assert seen == TICKS[2:4]
+    assert failing.call_count == 2
+    callback.assert_called_with(TICKS[3])
+
+
+def test_tickschedule_sleep_for(f_tick_session):
+    schedule = TickSchedule()
+    assert schedule.sleep_for(NOW) == 1
+
+    schedule.load(f_tick_session, NOW)
+    assert 1790 < schedule.sleep_for(NOW) <= 1800
+    assert schedule.sleep_for(TICKS[2] - datetime.timedelta(minutes=10)) == 600
+
+
+def test_future_ticks(f_tick_session):
+    assert cogdb.ticks.future_ticks(f_tick_session, TICKS[-2]) == TICKS[-1:]
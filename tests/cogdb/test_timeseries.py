@@ -0,0 +1,220 @@
+"""
+Test the influence time-series store, sqlite stands in for side.
+"""
+from __future__ import absolute_import, print_function
+import time
+
+import numpy as np
+import pytest
+import sqlalchemy as sqla
+import sqlalchemy.orm as sqla_orm
+
+import cogdb.side
+import cogdb.timeseries
+from cogdb.side import InfluenceHistory
+from cogdb.timeseries import DAY, InfPoint, InfluenceStore
+
+NOW = int(time.time()) // DAY * DAY + DAY // 2
+
+
+@pytest.fixture
+def f_hist_session():
+    engine = sqla.create_engine('sqlite://')
+    InfluenceHistory.__table__.create(engine)
+    session = sqla_orm.sessionmaker(bind=engine)()
+    rows = []
+    for day in range(8):
+        # Two points a day, the later one should win
+        rows += [
+            InfluenceHistory(system_id=1, faction_id=10, updated_at=NOW - day * DAY - 60,
+                             influence=50 - day, state_id=80),
+            InfluenceHistory(system_id=1, faction_id=10, updated_at=NOW - day * DAY,
+                             influence=50 + day, state_id=None),
+            InfluenceHistory(system_id=1, faction_id=11, updated_at=NOW - day * DAY,
+                             influence=20, state_id=80),
+        ]
+    session.add_all(rows)
+    session.commit()
+
+    yield session
+
+    session.close()
+
+
+def make_points(times):
+    points = np.zeros(len(times), dtype=cogdb.timeseries.POINT_DTYPE)
+    points['updated_at'] = times
+    points['influence'] = range(len(times))
+    return points
+
+
+def test_infpoint_short_date():
+    point = InfPoint(1, 10, 1525000000, 50.0, 80)
+    assert point.short_date == '{}/{}'.format(point.date.day, point.date.month)
+
+
+def test_compact():
+    points = make_points([NOW, NOW - DAY, NOW - 60, NOW - 3 * DAY])
+    result = cogdb.timeseries.compact(points, NOW - 2 * DAY)
+
+    assert list(result['updated_at']) == [NOW - DAY, NOW]
+    assert list(result['influence']) == [1, 0]
+
+
+def test_compact_empty():
+    assert len(cogdb.timeseries.compact(make_points([]))) == 0
+
+
+def test_rows_to_array():
+    result = cogdb.timeseries.rows_to_array([(1, 10, NOW, 50.5, None)])
+    assert result[0]['state_id'] == -1
+    assert result[0]['influence'] == 50.5
+
+
+def test_store__repr__():
+    store = InfluenceStore(days=10, refresh=5)
+    assert repr(store) == "InfluenceStore(days=10, refresh_interval=5, watermark=0, "\
+        "refreshed_at=0, pairs=0)"
+
+
+def test_store_load(f_hist_session):
+    store = InfluenceStore()
+    store.load(f_hist_session, [(1, 10), (1, 11), (2, 10)])
+
+    assert len(store) == 3
+    assert (2, 10) in store
+    assert len(store.points(1, 10)) == 8
+    assert len(store.points(2, 10)) == 0
+    assert store.watermark == NOW
+
+
+def test_store_history(f_hist_session):
+    store = InfluenceStore()
+    store.ensure(f_hist_session, [(1, 10)])
+
+    hist = store.history(1, 10, NOW - 2 * DAY)
+    assert [x.updated_at for x in hist] == [NOW, NOW - DAY, NOW - 2 * DAY]
+    assert [x.influence for x in hist] == [50, 51, 52]
+    assert hist[0].state_id == -1
+    assert store.history(3, 3) == []
+
+
+def test_store_oldest_since_delta(f_hist_session):
+    store = InfluenceStore()
+    store.ensure(f_hist_session, [(1, 10), (1, 11)])
+
+    assert store.oldest_since(1, 10, NOW - 2 * DAY) == 52
+    assert store.oldest_since(1, 10, NOW + DAY) is None
+    assert store.delta(1, 11, 25.0) == 5
+    assert store.delta(5, 5, 25.0) == 25
+
+
+def test_store_refresh(f_hist_session):
+    store = InfluenceStore()
+    store.ensure(f_hist_session, [(1, 10)])
+    f_hist_session.add_all([
+        InfluenceHistory(system_id=1, faction_id=10, updated_at=NOW + DAY, influence=70),
+        InfluenceHistory(system_id=1, faction_id=11, updated_at=NOW + DAY, influence=70),
+    ])
+    f_hist_session.commit()
+
+    assert store.refresh(f_hist_session) == 0  # Inside interval
+    # The two points of NOW are re-read, inside OVERLAP
+    assert store.refresh(f_hist_session, force=True) == 3
+    assert store.history(1, 10, NOW)[0].influence == 70
+    assert (1, 11) not in store
+    assert store.watermark == NOW + DAY
+
+
+def test_store_refresh_late_rows(f_hist_session):
+    """ Rows reaching the replica after newer ones are not lost. """
+    store = InfluenceStore()
+    store.ensure(f_hist_session, [(1, 10), (1, 11)])
+    f_hist_session.add(InfluenceHistory(system_id=1, faction_id=10, updated_at=NOW + 60,
+                                        influence=45))
+    f_hist_session.add(InfluenceHistory(system_id=1, faction_id=11, updated_at=NOW + DAY,
+                                        influence=25))
+    f_hist_session.commit()
+    store.refresh(f_hist_session, force=True)
+    assert store.watermark == NOW + DAY
+    assert store.history(1, 10, NOW)[0].influence == 45
+
+    f_hist_session.add(InfluenceHistory(system_id=1, faction_id=10, updated_at=NOW + DAY - 60,
+                                        influence=48))
+    f_hist_session.commit()
+    store.refresh(f_hist_session, force=True)
+    assert [x.influence for x in store.history(1, 10, NOW)] == [48, 45]
+
+
+def test_store_expire(f_hist_session):
+    store = InfluenceStore()
+    store.ensure(f_hist_session, [(1, 10)])
+    f_hist_session.add(InfluenceHistory(system_id=1, faction_id=10, updated_at=NOW + DAY,
+                                        influence=70))
+    f_hist_session.commit()
+
+    store.expire(NOW)
+    assert store.refresh(f_hist_session) == 3
+
+
+def test_store_days(f_hist_session):
+    store = InfluenceStore(days=3)
+    store.ensure(f_hist_session, [(1, 10)])
+
+    assert len(store.points(1, 10)) <= 4
+
+
+def test_daily_matrix(f_hist_session):
+    store = InfluenceStore()
+    store.ensure(f_hist_session, [(1, 10), (1, 11)])
+    f_hist_session.add(InfluenceHistory(system_id=2, faction_id=10, updated_at=NOW - 3 * DAY,
+                                        influence=30))
+    f_hist_session.commit()
+    store.ensure(f_hist_session, [(2, 10)])
+
+    matrix, valid = cogdb.timeseries.daily_matrix(store, [(1, 10), (2, 10), (3, 3)], 5, NOW)
+    assert list(matrix[0]) == [54, 53, 52, 51, 50]
+    assert list(matrix[1]) == [30, 30, 30, 30, 30]
+    assert list(matrix[2]) == [0, 0, 0, 0, 0]
+    assert list(valid) == [True, True, False]
+
+
+def test_fit_trends():
+    matrix = np.array([
+        [10.0, 12, 14, 16, 18],
+        [10.0, 11, 14, 19, 26],
+        [5.0, 5, 5, 5, 5],
+    ])
+    current, velocity, accel = cogdb.timeseries.fit_trends(matrix)
+
+    assert np.allclose(current, [18, 26, 5])
+    assert np.allclose(velocity, [2, 8, 0])
+    assert np.allclose(accel, [0, 2, 0])
+
+
+def test_days_to_crossover():
+    system_ids = np.array([1, 1, 1, 2])
+    current = np.array([40.0, 50, 10, 90])
+    velocity = np.array([2.0, -3, 0, 1])
+    result = cogdb.timeseries.days_to_crossover(system_ids, current, velocity)
+
+    assert np.allclose(result[:3], [2, 2, 40 / 3])
+    assert np.isinf(result[3])
+
+
+def test_trends_watch_bubbles_fast():
+    """ Synthetic load about the size of all WATCH_BUBBLES. """
+    store = InfluenceStore()
+    rows = []
+    for system_id in range(16 * 30):
+        for faction_id in range(7):
+            rows += [(system_id, faction_id, NOW - day * DAY, 10 + faction_id + day, 80)
+                     for day in range(10)]
+    store.merge(cogdb.timeseries.rows_to_array(rows))
+    pairs = sorted(store.series)
+
+    start = time.time()
+    matrix, _ = cogdb.timeseries.daily_matrix(store, pairs, 7, NOW)
+    current, velocity, _ = cogdb.timeseries.fit_trends(matrix)
+    cogdb.timeseries.days_to_crossover(np.array([pair[0] for pair in pairs]), current, velocity)
+    assert time.time() - start < 2
@@ -4,6 +4,7 @@ Used for pytest fixtures and anything else test setup/teardown related.
 from __future__ import absolute_import, print_function
 import copy
 import datetime
+import functools
 import os
 import sys
 
@@ -21,9 +22,13 @@ except ImportError:
     print("Missing: uvloop")
     sys.exit(1)
 
+import cog.sheets
 import cog.util
 import cogdb
+import cogdb.fort
+import cogdb.names
 import cogdb.query
+import cogdb.side
 from cogdb.schema import (DUser, PrepSystem, System, SystemUM, Drop, Hold,
                           UMExpand, UMOppose, UMControl,
                           SheetRow, SheetCattle, SheetUM,
@@ -47,6 +52,33 @@ from tests.data import CELLS_FORT, CELLS_FORT_FMT, CELLS_UM
         # assert not session.query(cls).all()
 
 
+@pytest.fixture(autouse=True)
+def fort_state():
+    """
+    The fort state caches the database across calls, every test starts and ends without one.
+    """
+    cogdb.fort.invalidate()
+
+    yield
+
+    cogdb.fort.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def sheet_names():
+    """
+    The fort and undermining name indexes are built from the database, every test starts
+    and ends without them.
+    """
+    for kind in cogdb.names.SHEET_SYSTEMS:
+        cogdb.names.INDEXES.pop(kind, None)
+
+    yield
+
+    for kind in cogdb.names.SHEET_SYSTEMS:
+        cogdb.names.INDEXES.pop(kind, None)
+
+
 REASON_SLOW = 'Slow as blocking to sheet. To enable, ensure os.environ ALL_TESTS=True'
 SHEET_TEST = pytest.mark.skipif(not os.environ.get('ALL_TESTS'), reason=REASON_SLOW)
 PROC_TEST = SHEET_TEST
@@ -67,6 +99,7 @@ def event_loop():
 
     yield loop
 
+    loop.run_until_complete(cogdb.side.async_close(loop))
     loop.close()
 
 
@@ -370,10 +403,36 @@ def f_testbed(f_dusers, f_sheets, f_systems, f_prepsystem, f_systemsum, f_drops,
     yield [f_dusers, f_sheets, f_systems, f_prepsystem, f_systemsum, f_drops, f_holds]
 
 
+def fake_batch_get(fake_sheet, cell_ranges, dim='COLUMNS'):
+    """
+    Cut the cell_ranges out of fake_sheet.whole_sheet, like GSheet.batch_get.
+    Only column major, trailing empty cells are trimmed as the api does.
+    """
+    assert dim == 'COLUMNS'
+    cells = fake_sheet.whole_sheet.return_value
+    found = []
+    for cell_range in cell_ranges:
+        col1, row1, col2, row2 = cog.sheets.parse_range(cell_range)
+        row2 = None if row2 is None else row2 + 1
+        cols = [col[row1:row2] for col in cells[col1:col2 + 1]]
+        for col in cols:
+            while col and col[-1] == '':
+                col.pop()
+        while cols and not cols[-1]:
+            cols.pop()
+        found += [cols]
+
+    return found
+
+
 @pytest.fixture()
 def mock_fortsheet(db_cleanup):
     fake_sheet = mock.Mock()
+    fake_sheet.sheet_id = 'fort_sheet'
+    fake_sheet.page = "'Cycle 1'"
+    fake_sheet.version.return_value = 1
     fake_sheet.whole_sheet.return_value = CELLS_FORT
+    fake_sheet.batch_get.side_effect = functools.partial(fake_batch_get, fake_sheet)
     fake_sheet.get_with_formatting.return_value = copy.deepcopy(CELLS_FORT_FMT)
 
     yield fake_sheet
@@ -382,7 +441,11 @@ def mock_fortsheet(db_cleanup):
 @pytest.fixture()
 def mock_umsheet(db_cleanup):
     fake_sheet = mock.Mock()
+    fake_sheet.sheet_id = 'um_sheet'
+    fake_sheet.page = "'Cycle 1'"
+    fake_sheet.version.return_value = 1
     fake_sheet.whole_sheet.return_value = CELLS_UM
+    fake_sheet.batch_get.side_effect = functools.partial(fake_batch_get, fake_sheet)
 
     return fake_sheet
 
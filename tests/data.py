@@ -1,7 +1,10 @@
 """
 Store all test data here.
+
+The synthetic_* functions generate sheets of any size in the same layouts, for benchmarks.
 """
 import json
+import random
 
 SYSTEMS = [
     "Frey", "Nurundere", "LHS 3749", "Sol", "Dongkum", "Alpha Fornacis",
@@ -704,3 +707,82 @@ SYSTEMUM_CONTROL = [
     ['', 0, 0, 14878, 13950, -452, 'Sec: Medium', 'Unknown', 'Cemplangpa', 13830, 1, 0, 1380],
     [0, 0, 0, 0, 0, 0, ''],
 ]
+
+
+def synthetic_fort(users, systems, preps=2, control='Frey', seed=0):
+    """
+    Generate fort sheet cells of any size, column major like CELLS_FORT.
+    The first fort system is the control, it must be in cogdb.query.HUDSON_CONTROLS.
+
+    Args:
+        users: The number of CMDRs, one per row.
+        systems: The number of fort systems, one per column after the preps.
+        preps: The number of prep systems, between the user columns and the fort systems.
+        seed: Seed of the drops and system values, same seed same sheet.
+    """
+    rand = random.Random(seed)
+    cells = [col[:10] for col in CELLS_FORT[:3]]
+    cells[0] += ['Cry {}'.format(ind) if ind % 3 else '' for ind in range(users)]
+    cells[1] += ['CMDR {}'.format(ind) for ind in range(users)]
+    cells[2] += [''] * users
+
+    names = ['Prep {}'.format(ind) for ind in range(preps)]
+    names += [control] + ['System {}'.format(ind) for ind in range(1, systems)]
+    for name in names:
+        trigger = rand.randint(4000, 12000)
+        status = rand.randint(0, trigger)
+        col = ['', round(status / trigger, 4), trigger, trigger - status, status, status,
+               rand.choice(['', 0, 500]), round(rand.uniform(20, 180), 2), '', name]
+        col += [rand.choice(['', '', '', 100, 350, 800]) for _ in range(users)]
+        cells += [col]
+
+    return cells
+
+
+def synthetic_um(users, systems, seed=0):
+    """
+    Generate undermining sheet cells of any size, column major like CELLS_UM.
+    Systems cycle through expansion, opposition and control, two columns each.
+
+    Args:
+        users: The number of CMDRs, one per row.
+        systems: The number of undermining systems.
+        seed: Seed of the merits and system values, same seed same sheet.
+    """
+    rand = random.Random(seed)
+    cells = [col[:13] for col in CELLS_UM[:3]]
+    cells[0] += [''] * users
+    cells[1] += ['CMDR {}'.format(ind) for ind in range(users)]
+    cells[2] += [''] * users
+
+    kinds = ['Exp. trigger', 'Opp. trigger', '']
+    for ind in range(systems):
+        goal = rand.randint(10000, 400000)
+        progress = rand.randint(0, goal)
+        main = [kinds[ind % 3], rand.randint(5000, 9000), 'behind by -50%', goal, progress,
+                goal - progress, 'Sec: Low', 'Control {}'.format(ind % 7), 'Burr {}'.format(ind),
+                progress, round(rand.uniform(0, 100), 2), 'Held merits', rand.randint(0, 80000)]
+        main += [rand.choice(['', '', 0, 250, 1200]) for _ in range(users)]
+        sec = ['% safety margin', 0.5, '', '', '', '', '', '', '', '<- Exp Progress',
+               '<- Opp %', 'Redeemed merits', '']
+        sec += [rand.choice(['', '', 400, 2000]) for _ in range(users)]
+        cells += [main, sec]
+
+    return cells + [col[:13] for col in CELLS_UM[5:]]
+
+
+def synthetic_kos(rows, seed=0):
+    """
+    Generate KOS sheet cells of any size, row major with a header like the KOS sheet.
+
+    Args:
+        rows: The number of CMDRs listed.
+        seed: Seed of the factions and danger, same seed same sheet.
+    """
+    rand = random.Random(seed)
+    cells = [['CMDR', 'Faction', 'Danger', 'Friend or Foe']]
+    for ind in range(rows):
+        cells += [['CMDR {}'.format(ind), rand.choice(['Hudson', 'Winters', 'Indie']),
+                   rand.randint(0, 5), rand.choice(['FRIENDLY', 'KILL'])]]
+
+    return cells
@@ -0,0 +1,450 @@
+"""
+A local stand-in for the Google Sheets and Drive APIs, just the subset GSheet uses.
+
+    - values: get, update, batchGet, batchUpdate
+    - spreadsheets.get with grid data
+    - drive files.get of the version, it increases on every update
+
+Sheets are in memory grids, column major like the cells in tests.data.
+Every request can be delayed by a latency and limited by a quota, exceeding it
+responds 429 like the real API. GSheet points here with an endpoint in its sheet config:
+
+    sheet = {'id': 'fort_sheet', 'page': 'Cycle 1', 'endpoint': server.endpoint}
+
+Run standalone serving the fort and um sheets of tests.data:
+
+    python -m tests.fake_sheets [port] [latency]
+"""
+from __future__ import absolute_import, print_function
+import collections
+import copy
+import http.server
+import json
+import re
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+
+import cog.sheets
+from tests.data import CELLS_FORT, CELLS_UM
+
+FULL_RANGE_RE = re.compile(r"(?:'?(.*?)'?!)?([A-Z]+)([0-9]*)(?::([A-Z]+)([0-9]*))?$")
+SCHEMAS = {name: {'id': name, 'type': 'object'}
+           for name in ['BatchUpdateValuesRequest', 'Response', 'ValueRange']}
+SHEETS = {
+    'fort_sheet': {'Cycle 1': CELLS_FORT},
+    'um_sheet': {'Cycle 1': CELLS_UM},
+}
+
+
+def param(location, ptype='string', repeated=False, required=False):
+    """ Returns: A parameter of a discovery method. """
+    desc = {'location': location, 'type': ptype}
+    if repeated:
+        desc['repeated'] = True
+    if required:
+        desc['required'] = True
+
+    return desc
+
+
+def method(mid, http_method, path, params, body=None):
+    """ Returns: A method of a discovery document, responses are parsed as json. """
+    desc = {
+        'id': mid,
+        'httpMethod': http_method,
+        'path': path,
+        'parameters': params,
+        'parameterOrder': [key for key, val in params.items() if val.get('required')],
+        'response': {'$ref': 'Response'},
+    }
+    if body:
+        desc['request'] = {'$ref': body}
+
+    return desc
+
+
+def sheets_discovery(root_url):
+    """ Returns: The discovery document of the Sheets v4 subset served. """
+    sheet_id = {'spreadsheetId': param('path', required=True)}
+    values_range = dict(sheet_id, range=param('path', required=True))
+    values_params = {
+        'majorDimension': param('query'),
+        'valueRenderOption': param('query'),
+    }
+    update_params = {'valueInputOption': param('query')}
+
+    path = 'v4/spreadsheets/{spreadsheetId}'
+    values = {
+        'get': method('sheets.spreadsheets.values.get', 'GET', path + '/values/{range}',
+                      dict(values_range, **values_params)),
+        'update': method('sheets.spreadsheets.values.update', 'PUT', path + '/values/{range}',
+                         dict(values_range, **update_params), 'ValueRange'),
+        'batchGet': method('sheets.spreadsheets.values.batchGet', 'GET', path + '/values:batchGet',
+                           dict(sheet_id, ranges=param('query', repeated=True), **values_params)),
+        'batchUpdate': method('sheets.spreadsheets.values.batchUpdate', 'POST',
+                              path + '/values:batchUpdate', sheet_id, 'BatchUpdateValuesRequest'),
+    }
+
+    return {
+        'kind': 'discovery#restDescription',
+        'name': 'sheets',
+        'version': 'v4',
+        'rootUrl': root_url,
+        'servicePath': '',
+        'schemas': SCHEMAS,
+        'resources': {
+            'spreadsheets': {
+                'methods': {
+                    'get': method('sheets.spreadsheets.get', 'GET', path,
+                                  dict(sheet_id, ranges=param('query', repeated=True),
+                                       includeGridData=param('query', 'boolean'))),
+                },
+                'resources': {'values': {'methods': values}},
+            },
+        },
+    }
+
+
+def drive_discovery(root_url):
+    """ Returns: The discovery document of the Drive v3 subset served. """
+    return {
+        'kind': 'discovery#restDescription',
+        'name': 'drive',
+        'version': 'v3',
+        'rootUrl': root_url,
+        'servicePath': 'drive/v3/',
+        'schemas': SCHEMAS,
+        'resources': {
+            'files': {
+                'methods': {
+                    'get': method('drive.files.get', 'GET', 'files/{fileId}',
+                                  {'fileId': param('path', required=True),
+                                   'fields': param('query')}),
+                },
+            },
+        },
+    }
+
+
+def parse_full_range(full_range):
+    """
+    Parse a range as sent by GSheet, i.e. "'Cycle 1'!A11:B" or "'Cycle 1'!A:ZZ".
+
+    Returns: (page, first_col, first_row, last_col, last_row) as inclusive zero based indices,
+             last_row is None when the range runs to the end of the sheet.
+    """
+    match = FULL_RANGE_RE.match(full_range)
+    if not match:
+        raise ValueError('Bad range: ' + full_range)
+    page, col1, row1, col2, row2 = match.groups()
+    if col2 is None:
+        col2, row2 = col1, row1
+
+    return (page, cog.sheets.column_to_index(col1), int(row1 or 1) - 1,
+            cog.sheets.column_to_index(col2), int(row2) - 1 if row2 else None)
+
+
+def trim(lines):
+    """ Drop trailing empty cells and lines like the API. """
+    lines = [list(line) for line in lines]
+    for line in lines:
+        while line and line[-1] in ('', None):
+            line.pop()
+    while lines and not lines[-1]:
+        lines.pop()
+
+    return lines
+
+
+class FakeSheets(object):
+    """
+    The state of the stand-in, the sheets and the request accounting.
+
+    Args:
+        sheets: A dict of spreadsheet id -> page -> column major cells, copied.
+        latency: Seconds to delay every request.
+        quota: (requests, seconds), more requests within seconds are refused with 429.
+    """
+    def __init__(self, sheets=None, latency=0.0, quota=None):
+        self.sheets = copy.deepcopy(SHEETS if sheets is None else sheets)
+        self.formats = {}
+        self.versions = collections.defaultdict(lambda: 1)
+        self.latency = latency
+        self.quota = quota
+        self.requests = collections.Counter()
+        self.times = collections.deque()
+        self.lock = threading.Lock()
+        self.server = None
+        self.endpoint = None
+
+    def __repr__(self):
+        keys = ['endpoint', 'latency', 'quota', 'requests']
+        kwargs = ['{}={!r}'.format(key, getattr(self, key)) for key in keys]
+
+        return "{}({})".format(self.__class__.__name__, ', '.join(kwargs))
+
+    def start(self, port=0):
+        """
+        Serve on localhost in a daemon thread, port 0 picks a free port.
+
+        Returns: The endpoint url to put in the sheet config.
+        """
+        self.server = FakeServer(('127.0.0.1', port), FakeHandler)
+        self.server.fake = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.endpoint = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+
+        return self.endpoint
+
+    def stop(self):
+        """ Stop serving. """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def sheet_config(self, sheet_id, page='Cycle 1'):
+        """ Returns: A sheet config for GSheet pointing at this server. """
+        return {'id': sheet_id, 'page': page, 'endpoint': self.endpoint}
+
+    def admit(self, name):
+        """
+        Account for a request, apply latency and quota.
+
+        Returns: False if the quota refuses it.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.requests[name] += 1
+            if not self.quota:
+                return True
+
+            limit, seconds = self.quota
+            now = time.time()
+            while self.times and now - self.times[0] >= seconds:
+                self.times.popleft()
+            if len(self.times) >= limit:
+                self.requests['refused'] += 1
+                return False
+            self.times.append(now)
+
+            return True
+
+    def cells(self, sheet_id, page):
+        """ Returns: The column major cells of the page, KeyError if unknown. """
+        return self.sheets[sheet_id][page]
+
+    def get(self, sheet_id, full_range, dim='ROWS'):
+        """ Returns: A ValueRange of the cells in the range. """
+        page, col1, row1, col2, row2 = parse_full_range(full_range)
+        with self.lock:
+            cells = self.cells(sheet_id, page)
+            if col2 >= len(cells):
+                col2 = len(cells) - 1
+            cols = [cells[col][row1:None if row2 is None else row2 + 1]
+                    for col in range(col1, col2 + 1)]
+
+        if dim == 'ROWS':
+            width = max([len(col) for col in cols] + [0])
+            cols = [col + [''] * (width - len(col)) for col in cols]
+            lines = [list(line) for line in zip(*cols)]
+        else:
+            lines = cols
+
+        value_range = {'range': full_range, 'majorDimension': dim}
+        lines = trim(lines)
+        if lines:
+            value_range['values'] = lines
+
+        return value_range
+
+    def update(self, sheet_id, data):
+        """
+        Write values into ranges, the sheet grows as needed.
+        The version increases once for all the ranges.
+
+        Args:
+            data: A list of ValueRange dicts, the range, majorDimension and values.
+        """
+        with self.lock:
+            for value_range in data:
+                page, col1, row1 = parse_full_range(value_range['range'])[:3]
+                values = value_range.get('values', [])
+                if value_range.get('majorDimension', 'ROWS') == 'ROWS':
+                    width = max([len(line) for line in values] + [0])
+                    values = [[line[ind] if ind < len(line) else None for line in values]
+                              for ind in range(width)]
+
+                cells = self.cells(sheet_id, page)
+                for col_ind, col in enumerate(values, col1):
+                    while len(cells) <= col_ind:
+                        cells.append([])
+                    column = cells[col_ind]
+                    for row_ind, value in enumerate(col, row1):
+                        if value is None:
+                            continue
+                        column.extend([''] * (row_ind + 1 - len(column)))
+                        column[row_ind] = value
+            self.versions[sheet_id] += 1
+
+    def grid_data(self, sheet_id, full_range):
+        """ Returns: A Spreadsheet with the grid data of the range. """
+        rows = self.get(sheet_id, full_range, 'ROWS').get('values', [])
+        page = parse_full_range(full_range)[0]
+        col1, row1 = parse_full_range(full_range)[1:3]
+        row_data = []
+        for row_ind, row in enumerate(rows, row1):
+            values = []
+            for col_ind, value in enumerate(row, col1):
+                cell = {'effectiveValue': effective_value(value)}
+                fmt = self.formats.get((sheet_id, page, col_ind, row_ind))
+                if fmt:
+                    cell['effectiveFormat'] = fmt
+                values.append(cell)
+            row_data.append({'values': values})
+
+        return {'spreadsheetId': sheet_id, 'sheets': [{'data': [{'rowData': row_data}]}]}
+
+
+def effective_value(value):
+    """ Returns: The typed effectiveValue of a cell. """
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, (int, float)):
+        return {'numberValue': value}
+
+    return {'stringValue': value}
+
+
+class FakeServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """ Threaded so kept alive connections do not block each other. """
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeHandler(http.server.BaseHTTPRequestHandler):
+    """ Route the requests of the API subset to the FakeSheets of the server. """
+    protocol_version = 'HTTP/1.1'
+    routes = [
+        ('GET', re.compile(r'/discovery/(sheets|drive)/(v4|v3)$'), 'discovery'),
+        ('GET', re.compile(r'/drive/v3/files/([^/]+)$'), 'version'),
+        ('GET', re.compile(r'/v4/spreadsheets/([^/]+)/values:batchGet$'), 'batch_get'),
+        ('POST', re.compile(r'/v4/spreadsheets/([^/]+)/values:batchUpdate$'), 'batch_update'),
+        ('GET', re.compile(r'/v4/spreadsheets/([^/]+)/values/(.+)$'), 'get'),
+        ('PUT', re.compile(r'/v4/spreadsheets/([^/]+)/values/(.+)$'), 'update'),
+        ('GET', re.compile(r'/v4/spreadsheets/([^/]+)$'), 'grid_data'),
+    ]
+
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.route('GET')
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.route('POST')
+
+    def do_PUT(self):  # pylint: disable=invalid-name
+        self.route('PUT')
+
+    def respond(self, status, body):
+        """ Send a json body. """
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def error(self, status, message, reason):
+        """ Send an error shaped like the API's. """
+        self.respond(status, {'error': {'code': status, 'message': message, 'status': reason}})
+
+    def route(self, http_method):
+        """ Dispatch the request to the matching handler. """
+        url = urllib.parse.urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length).decode()) if length else {}
+        query = urllib.parse.parse_qs(url.query)
+        path = urllib.parse.unquote(url.path)
+
+        for route_method, pattern, name in self.routes:
+            match = pattern.match(path)
+            if route_method != http_method or not match:
+                continue
+
+            fake = self.server.fake
+            if name != 'discovery' and not fake.admit(name):
+                return self.error(429, 'Quota exceeded for quota metric Read/Write requests.',
+                                  'RESOURCE_EXHAUSTED')
+            try:
+                return self.respond(200, getattr(self, 'handle_' + name)(fake, query, body,
+                                                                         *match.groups()))
+            except KeyError as exc:
+                return self.error(404, 'Requested entity was not found: {}'.format(exc),
+                                  'NOT_FOUND')
+            except ValueError as exc:
+                return self.error(400, str(exc), 'INVALID_ARGUMENT')
+
+        return self.error(404, 'No such method: {} {}'.format(http_method, path), 'NOT_FOUND')
+
+    def handle_discovery(self, fake, _, __, api, ___):
+        """ The discovery documents, rooted at this server. """
+        return sheets_discovery(fake.endpoint) if api == 'sheets' else \
+            drive_discovery(fake.endpoint)
+
+    def handle_version(self, fake, *args):
+        """ The version of the spreadsheet. """
+        sheet_id = args[-1]
+        if sheet_id not in fake.sheets:
+            raise KeyError(sheet_id)
+        return {'version': str(fake.versions[sheet_id])}
+
+    def handle_get(self, fake, query, _, sheet_id, full_range):
+        """ values.get """
+        return fake.get(sheet_id, full_range, query.get('majorDimension', ['ROWS'])[0])
+
+    def handle_batch_get(self, fake, query, _, sheet_id):
+        """ values.batchGet """
+        dim = query.get('majorDimension', ['ROWS'])[0]
+        return {'spreadsheetId': sheet_id,
+                'valueRanges': [fake.get(sheet_id, full_range, dim)
+                                for full_range in query.get('ranges', [])]}
+
+    def handle_update(self, fake, _, body, sheet_id, full_range):
+        """ values.update """
+        fake.update(sheet_id, [dict(body, range=full_range)])
+        return {'spreadsheetId': sheet_id, 'updatedRange': full_range}
+
+    def handle_batch_update(self, fake, _, body, sheet_id):
+        """ values.batchUpdate """
+        fake.update(sheet_id, body.get('data', []))
+        return {'spreadsheetId': sheet_id, 'totalUpdatedSheets': len(body.get('data', []))}
+
+    def handle_grid_data(self, fake, query, _, sheet_id):
+        """ spreadsheets.get, only the first range with grid data is served. """
+        return fake.grid_data(sheet_id, query['ranges'][0])
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    fake = FakeSheets(latency=latency)
+    endpoint = fake.start(port)
+    print('Serving fake sheets at', endpoint)
+    for sheet_id, pages in fake.sheets.items():
+        for page in pages:
+            print('  ', fake.sheet_config(sheet_id, page))
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()